@@ -0,0 +1,57 @@
+# benchmarks/conftest.py
+
+import copy
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tests.fake_sheets import FakeBackend, installed  # noqa: E402
+from tests.synthetic import populate  # noqa: E402
+from utils import sheets_api  # noqa: E402
+
+# School sizes to run every benchmark against, e.g. BENCH_STUDENTS=500,2000,5000
+SIZES = [int(n) for n in os.environ.get("BENCH_STUDENTS", "500,5000").split(",")]
+
+_schools = {}
+
+@pytest.fixture(autouse=True)
+def _repo_root(monkeypatch):
+    # Seed CSV and data/ paths are relative to the repository root, as in the app
+    monkeypatch.chdir(ROOT)
+
+@pytest.fixture(autouse=True)
+def _grade_history(tmp_path, monkeypatch):
+    # Saves made by benchmarks are logged to a throwaway history, not the app's
+    from utils import grade_history
+    monkeypatch.setattr(grade_history, "DB_PATH", str(tmp_path / "grade_history.db"))
+    monkeypatch.setattr(grade_history, "CHECKPOINT_DIR", str(tmp_path / "grade_history"))
+
+@pytest.fixture(params=SIZES, ids=lambda n: f"{n}students")
+def students(request):
+    return request.param
+
+@pytest.fixture
+def backend(students):
+    """Fake Sheets holding a synthetic school, installed behind utils.sheets_api."""
+    if students not in _schools:
+        seeded = FakeBackend()
+        df = populate(seeded, students, rev=True)
+        _schools[students] = (seeded.spreadsheets, df)
+    spreadsheets, _ = _schools[students]
+    fake = FakeBackend()
+    fake.spreadsheets = copy.deepcopy(spreadsheets)  # benchmarks write to their copy
+    with installed(fake):
+        yield fake
+
+@pytest.fixture
+def school(backend, students):
+    return _schools[students][1]
+
+@pytest.fixture
+def student_df(backend):
+    """The student sheet as the dashboards load it."""
+    return sheets_api.load_sheet_df("Grades3", "Sheet2")
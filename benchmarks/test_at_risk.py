@@ -0,0 +1,17 @@
+# benchmarks/test_at_risk.py
+
+from utils import at_risk, sheets_api
+
+def test_at_risk_incremental(benchmark, student_df, tmp_path, monkeypatch):
+    # One grade saved: only that student's flags are recomputed
+    monkeypatch.setattr(at_risk, "SETTINGS_FILE", str(tmp_path / "at_risk.json"))
+    monkeypatch.setattr(at_risk, "_state", dict(at_risk._state, table=None))
+    at_risk.refresh()
+    grade = student_df.columns.get_loc("Grade") + 1
+    values = iter(range(10, 100))  # a new value every round, or the save is a no-op
+
+    def save():
+        sheets_api.update_cells_checked("Grades3", "Sheet2", sheets_api.load_sheet_df("Grades3", "Sheet2").copy(),
+                                        [(0, "Grade", 2, grade, next(values))])
+
+    assert benchmark.pedantic(at_risk.refresh, setup=save, rounds=5) == 1
@@ -0,0 +1,20 @@
+# benchmarks/test_chart.py
+
+from utils import sheets_api
+from utils.analytics import grade_styles
+from utils.charts import grade_bar_spec
+
+def _student_grades(df):
+    student = df[(df["NAME"] == df["NAME"].iloc[0]) & (df["Assessment Type"] == "Exam")]
+    return student[["Subject", "Grade"]].dropna()
+
+def test_bar_spec(benchmark, backend):
+    df = sheets_api.load_sheet_df("Grades2", numeric=True)
+    grades = _student_grades(df).set_index("Subject")["Grade"]
+    spec = benchmark(grade_bar_spec, grades, "Exam grades")
+    assert spec["layer"]
+
+def test_styled_table(benchmark, backend):
+    grades = _student_grades(sheets_api.load_sheet_df("Grades2", numeric=True))
+    html = benchmark(lambda: grades.style.apply(grade_styles, subset=["Grade"]).format({"Grade": "{:.1f}"}).to_html())
+    assert "color" in html
@@ -0,0 +1,29 @@
+# benchmarks/test_filter.py
+
+from utils.analytics import school_analytics
+from utils.grade_index import GradeIndex
+from utils.grid import _search_blob, _sort_order
+
+TEACHER_KEYS = ["Teacher_Responsible_Email", "Subject", "Term", "Assessment Type"]
+
+def test_build_index(benchmark, student_df):
+    benchmark(GradeIndex, student_df, TEACHER_KEYS, normalize=["Teacher_Responsible_Email"])
+
+def test_teacher_slice(benchmark, student_df):
+    # The teacher dashboard's sidebar selection
+    index = GradeIndex(student_df, TEACHER_KEYS, normalize=["Teacher_Responsible_Email"])
+    email, subject, term, assessment = student_df[TEACHER_KEYS].iloc[0]
+    rows = benchmark(index.rows, email, subject, term, assessment)
+    assert len(rows) == (student_df["NAME"].nunique())
+
+def test_school_analytics(benchmark, student_df):
+    # A fresh source every round, so the memo never answers
+    stats = benchmark(lambda: school_analytics(student_df, object()))
+    assert 0 < stats["rows"] <= len(student_df)
+
+def test_grid_search(benchmark, student_df):
+    def search():
+        blob = _search_blob(student_df)
+        order = _sort_order(student_df, "Grade")
+        return blob.iloc[order].str.contains("mathematics", regex=False).sum()
+    assert benchmark(search) > 0
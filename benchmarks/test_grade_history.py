@@ -0,0 +1,35 @@
+# benchmarks/test_grade_history.py
+
+import time
+
+import pytest
+
+from utils import grade_history
+
+FIELDS = ["Grade", "Subject Teacher Conduct Code", "Subject Teacher Comment Code"]  # index.py's HISTORY_FIELDS
+
+@pytest.fixture
+def logged(student_df):
+    # 2,000 logged edits to Term 1 grades, all folded into a checkpoint
+    term = grade_history.gradebook_cells(student_df, ["Grade"], term="Term 1")
+    edits = term.sample(min(len(term), 2000), replace=True, random_state=0)
+    changes = [{"key": key, "field": "Grade", "old": value, "new": "0"}
+               for *key, _, value in edits.itertuples(index=False, name=None)]
+    grade_history.record_changes("Grades3/Sheet2", changes, actor="bench")
+    grade_history.checkpoint("Grades3/Sheet2", "Term 1")
+    return term[grade_history.KEY].drop_duplicates().shape[0]
+
+def test_grade_history_as_of(benchmark, student_df, logged):
+    # Opening the view: the live term is read from the frame every round (a new source)
+    def open_view():
+        return grade_history.as_of("Grades3/Sheet2", "Term 1", time.time(),
+                                   live=student_df, fields=FIELDS, source=object())
+    wide, info = benchmark(open_view)
+    assert len(wide) == logged and info["replayed"] == 0
+
+def test_grade_history_as_of_rerun(benchmark, student_df, logged):
+    # Another rerun at the same data version: the live cells come from the memo
+    source = ("Sheet2", object())
+    wide, info = benchmark(grade_history.as_of, "Grades3/Sheet2", "Term 1", time.time(),
+                           live=student_df, fields=FIELDS, source=source)
+    assert len(wide) == logged
@@ -0,0 +1,72 @@
+# benchmarks/test_load.py
+
+import random
+
+import pandas as pd
+
+from utils import sheets_api, snapshot_store
+from tests.fake_sheets import FakeBackend, installed
+from tests.synthetic import populate
+
+def test_full_load(benchmark, backend):
+    df = benchmark(sheets_api.reload, "Grades3", "Sheet2")
+    assert len(df) == len(backend.values("Grades3", "Sheet2")) - 1
+
+def test_numeric_load(benchmark, backend):
+    # The admin dashboard's path: gspread_dataframe parses numbers
+    def load():
+        sheets_api.invalidate("Grades2")
+        return sheets_api.load_sheet_df("Grades2", numeric=True)
+    assert benchmark(load)["Grade"].dtype == "float64"
+
+def test_incremental_refresh(benchmark, backend):
+    # 20 hand edits between refreshes; only the Row Version column and the edited rows come down
+    sheets_api.load_sheet_df("Grades3", "Sheet2")
+    rows = backend.values("Grades3", "Sheet2")
+    header = rows[0]
+    grade, rev = header.index("Grade"), header.index(sheets_api.REV_COLUMN)
+
+    def edit():
+        for row in random.sample(range(1, len(rows)), 20):
+            rows[row][grade] = str(random.randint(0, 100))
+            rows[row][rev] = f"{random.getrandbits(48):012x}"
+        with sheets_api._frames_lock:
+            sheets_api._frames.clear()  # as if DATA_TTL had passed
+
+    benchmark.pedantic(sheets_api.load_sheet_df, args=("Grades3", "Sheet2"), setup=edit, rounds=10)
+    expected = pd.to_numeric(pd.Series([r[grade] for r in rows[1:]]).replace("", None))
+    assert sheets_api.load_sheet_df("Grades3", "Sheet2")["Grade"].astype(float).equals(expected.astype(float))
+
+def test_snapshot_read(benchmark, backend, tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_store, "SNAPSHOT_DIR", str(tmp_path))
+    df = sheets_api.load_sheet_df("Grades3", "Sheet2")
+    name = snapshot_store.snapshot_name("Grades3", "Sheet2")
+    snapshot_store.write_snapshot(name, df, {"spreadsheet": "Grades3", "worksheet": "Sheet2"})
+    assert len(benchmark(snapshot_store.read_snapshot, name)) == len(df)
+
+def test_load_under_quota(benchmark, monkeypatch):
+    # One request per 100 ms and a burst just used it up: every load meets a 429 first
+    monkeypatch.setattr(sheets_api, "BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(sheets_api.random, "uniform", lambda a, b: 0.0)
+    backend = FakeBackend(quota=1, window=0.1)
+    populate(backend, 500)
+    with installed(backend):
+        df = benchmark.pedantic(
+            sheets_api.reload, args=("Grades3", "Sheet2"), setup=lambda: backend.request("burst"), rounds=5
+        )
+    assert len(df) and backend.quota_errors >= 5
+
+def test_cold_multi_sheet_load(benchmark, backend):
+    # index.py's cold start: teachers, grades and roster in one batched request
+    backend.latency = 0.05
+    names = ["Sheet7", "Sheet2", "Students"]
+
+    def load():
+        with sheets_api._frames_lock:
+            sheets_api._frames.clear()
+            sheets_api._last.clear()
+        return sheets_api.load_sheet_dfs("Grades3", names)
+
+    frames = benchmark.pedantic(load, rounds=3)
+    assert list(frames) == names and backend.calls["values_batch_get"] >= 1
+    assert len(frames["Sheet2"]) == len(backend.values("Grades3", "Sheet2")) - 1
@@ -0,0 +1,11 @@
+# benchmarks/test_moodle_reconcile.py
+
+from utils.moodle_api import SHEET_KEY, reconcile
+
+def test_moodle_reconcile(benchmark, student_df, school):
+    # One term of Moodle grades against the whole sheet, 1% of them changed in Moodle
+    moodle = school.loc[school["Term"] == "Term 1", SHEET_KEY + ["Grade"]].copy()
+    changed = moodle.index[::100]
+    moodle.loc[changed, "Grade"] = "101"
+    changelog = benchmark(reconcile, student_df, moodle)
+    assert (changelog["kind"] == "update").sum() == len(changed)
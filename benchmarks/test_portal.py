@@ -0,0 +1,14 @@
+# benchmarks/test_portal.py
+
+from utils import portal, sheets_api, snapshot_store
+
+def test_portal_report(benchmark, backend, tmp_path, monkeypatch):
+    # A parent opening one child's report: index lookup plus that student's rows only
+    monkeypatch.setattr(snapshot_store, "SNAPSHOT_DIR", str(tmp_path))
+    df = sheets_api.load_sheet_df("Grades3", "Sheet2")
+    students = iter(df["NAME"].unique())
+
+    def report():
+        return portal.student_report(next(students))
+    result = benchmark.pedantic(report, rounds=20)
+    assert 0 < len(result["rows"]) < len(df)
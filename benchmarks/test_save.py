@@ -0,0 +1,52 @@
+# benchmarks/test_save.py
+
+import random
+
+from utils import sheets_api, write_queue
+from utils.grade_index import GradeIndex
+from tests.synthetic import synthetic_school
+
+COLS = ["Grade", "Subject Teacher Conduct Code", "Subject Teacher Comment Code"]
+
+def _teacher_slice(df):
+    keys = ["Teacher_Responsible_Email", "Subject", "Term", "Assessment Type"]
+    return GradeIndex(df, keys).rows(*df[keys].iloc[0])
+
+def _edit(view, count=30):
+    edited = view.copy()
+    for idx in random.sample(list(edited.index), min(count, len(edited))):
+        edited.at[idx, "Grade"] = float(random.randint(0, 100))
+    return edited
+
+def test_diff_cells(benchmark, backend):
+    df = sheets_api.load_sheet_df("Grades3", "Sheet2")
+    view = _teacher_slice(df)
+    edited = _edit(view)
+    changes = benchmark(sheets_api.diff_cells, view, edited, COLS, df.columns)
+    assert 0 < len(changes) <= 30
+
+def test_save_checked(benchmark, backend):
+    # The teacher Save button: key lookup, version check and one batch_update
+    def setup():
+        df = sheets_api.load_sheet_df("Grades3", "Sheet2")
+        view = _teacher_slice(df).copy()
+        changes = sheets_api.diff_cells(view, _edit(view), COLS, df.columns)
+        return ("Grades3", "Sheet2", view, changes), {}
+
+    statuses, error, conflicts = benchmark.pedantic(sheets_api.update_cells_checked, setup=setup, rounds=10)
+    assert error is None and not conflicts and all(statuses.values())
+    assert backend.calls["batch_update"] >= 1
+
+def test_append_flush(benchmark, backend, tmp_path, monkeypatch):
+    # Student submissions: 50 queued rows sent in one append_rows call
+    monkeypatch.setattr(write_queue, "QUEUE_PATH", str(tmp_path / "queue.db"))
+    monkeypatch.setattr(write_queue, "_local", type(write_queue._local)())
+    monkeypatch.setattr(write_queue, "ensure_flusher", lambda: None)
+    rows = synthetic_school(2).astype(str).to_numpy().tolist()
+
+    def setup():
+        for row in rows[:50]:
+            write_queue.enqueue_row("Grades3", "Sheet1", row)
+
+    committed = benchmark.pedantic(write_queue.flush, setup=setup, rounds=10)
+    assert committed == 50 and backend.calls["append_rows"] >= 1
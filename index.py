@@ -1,10 +1,22 @@
 import streamlit as st
-import gspread
-from google.oauth2.service_account import Credentials
 import pandas as pd
-import json
+
+from utils.analytics import BAND_LABELS, school_analytics
+from utils.at_risk import ASSESSMENTS, at_risk_table, ensure_job, load_settings, save_settings
+from utils.grade_history import as_of, cell_history
+from utils.grade_index import get_grade_index
+from utils.grid import paged_grid
+from utils.live import mark_rendered, watch_changes
+from utils.metrics import begin_page, end_page, first_render
+from utils.portal import portal
+from utils.reports import get_job, start_report_job
+from utils.sheets_api import diff_cells, frame_version, schema_report, update_cells_checked
+from utils.snapshot_store import load_replica_dfs, request_sync
+from utils.startup import warm_in_background
+from utils.term_locks import frozen, lock_term, locked_terms, unlock_term
 
 # --- App config & Styles ---
+begin_page("index")
 st.set_page_config(page_title="Grades Portal", layout="wide")
 st.markdown("""
     <style>
@@ -36,29 +48,37 @@ st.markdown("""
 SPREADSHEET_NAME = "Grades3"
 SHEET_STUDENT = "Sheet2"
 SHEET_TEACHERS = "Sheet7"
+HISTORY_FIELDS = ["Grade", "Subject Teacher Conduct Code", "Subject Teacher Comment Code"]  # editable columns
 
-# --- Authenticate & Load Data ---
-@st.cache_resource(show_spinner=False)
+# --- Load Data (local replica, synced from Sheets in the background and patched on saves) ---
 def get_clients_and_data():
-    service_account_info = json.loads(st.secrets["GCP_SERVICE_ACCOUNT"])
-    creds = Credentials.from_service_account_info(
-        service_account_info,
-        scopes=[
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive"
-        ]
+    # One spreadsheet open and, on a cold start, one batched fetch for both worksheets
+    frames = load_replica_dfs(SPREADSHEET_NAME, [SHEET_TEACHERS, SHEET_STUDENT])
+    return frames[SHEET_TEACHERS], frames[SHEET_STUDENT]
+
+def load_grades():
+    teacher_df, student_df = get_clients_and_data()
+    # Lookup indexes are built once per data version and shared by every session
+    teacher_index = get_grade_index(
+        teacher_df, ["email"], normalize=["email"],
+        source=(SHEET_TEACHERS, frame_version(SPREADSHEET_NAME, SHEET_TEACHERS))
+    )
+    student_index = get_grade_index(
+        student_df, ["Teacher_Responsible_Email", "Subject", "Term", "Assessment Type"],
+        normalize=["Teacher_Responsible_Email"],
+        source=(SHEET_STUDENT, frame_version(SPREADSHEET_NAME, SHEET_STUDENT))
     )
-    client = gspread.authorize(creds)
-    teacher_ws = client.open(SPREADSHEET_NAME).worksheet(SHEET_TEACHERS)
-    teacher_data = teacher_ws.get_all_records()
-    teacher_df = pd.DataFrame(teacher_data)
-    student_ws = client.open(SPREADSHEET_NAME).worksheet(SHEET_STUDENT)
-    student_data = student_ws.get_all_values()
-    header = student_data[0]
-    student_df = pd.DataFrame(student_data[1:], columns=header)
-    return client, teacher_df, student_df, student_ws
-
-client, teacher_df, student_df, student_ws = get_clients_and_data()
+    return teacher_df, student_df, teacher_index, student_index
+
+def open_grades():
+    # Changes committed after this point reach the page through watch_changes below
+    mark_rendered("grades")
+    with st.spinner("Loading grades..."):
+        return load_grades()
+
+# Nothing above needs data: the landing page draws at once while the first run of
+# the process loads the replica and builds the indexes in the background
+warm_in_background("grades", load_grades)
 
 # --- Role Selection Logic ---
 if "user_role" not in st.session_state:
@@ -67,6 +87,7 @@ if "user_role" not in st.session_state:
 # --- Index / Landing Page ---
 if st.session_state["user_role"] is None:
     st.header("Welcome to CHHS Grading System")
+    first_render()
     st.subheader("Please select your role to continue:")
     role = st.selectbox("I am a...", ["Select...", "Teacher", "Student", "Parent", "Admin"])
     if st.button("Continue"):
@@ -80,9 +101,11 @@ if st.session_state["user_role"] is None:
 elif st.session_state["user_role"] == "Teacher":
     st.sidebar.image("logo-chhs.png", width=120)
     st.sidebar.title("Teacher Entry Portal")
+    first_render()
+    teacher_df, student_df, teacher_index, student_index = open_grades()
 
     email = st.sidebar.text_input("Your Email").strip().lower()
-    matched = teacher_df[teacher_df["email"].str.strip().str.lower() == email]
+    matched = teacher_index.rows(email)
 
     if len(matched) == 0:
         st.sidebar.error("Email not recognized! Please use your registered email.")
@@ -94,22 +117,28 @@ elif st.session_state["user_role"] == "Teacher":
         subjects = matched["Subject"].tolist()
         subject = st.sidebar.selectbox("Select Subject", sorted(set(subjects)))
 
-    filtered = student_df[
-        (student_df["Teacher_Responsible_Email"].str.strip().str.lower() == email) &
-        (student_df["Subject"] == subject)
-    ]
-    if not filtered.empty:
-        term = st.sidebar.selectbox("Term", sorted(filtered["Term"].unique()))
-        filtered = filtered[filtered["Term"] == term]
-        assessment_type = st.sidebar.selectbox("Assessment Type", sorted(filtered["Assessment Type"].unique()))
-        filtered = filtered[filtered["Assessment Type"] == assessment_type]
+    terms = student_index.options(email, subject)
+    if terms:
+        locks = locked_terms()
+        term = st.sidebar.selectbox("Term", sorted(terms), format_func=lambda t: f"🔒 {t}" if t in locks else t)
+        term_locked = term in locks
+        assessment_type = st.sidebar.selectbox("Assessment Type", sorted(student_index.options(email, subject, term)))
+        filtered = student_index.rows(email, subject, term, assessment_type)
+        # Someone else saving one of these rows refreshes this view from memory
+        watch_changes("grades", [(SPREADSHEET_NAME, SHEET_STUDENT, False)], positions=filtered.index)
 
         st.header(f"Teacher Dashboard: {teacher_name}")
         st.caption(f"Subject: **{subject}**  |  Term: **{term}**  |  Assessment: **{assessment_type}**")
 
-        editable_cols = ["Grade", "Subject Teacher Conduct Code", "Subject Teacher Comment Code"]
+        if term_locked:
+            st.info(f"{term} is locked by the administration; these grades are read-only.")
+
+        editable_cols = [] if term_locked else ["Grade", "Subject Teacher Conduct Code", "Subject Teacher Comment Code"]
         filtered_view = filtered.copy()
         filtered_view["Teacher"] = teacher_name
+        # Codes are stored as categoricals; the editor needs plain values it can add to
+        text_cols = ["Subject Teacher Conduct Code", "Subject Teacher Comment Code"]
+        filtered_view[text_cols] = filtered_view[text_cols].astype(object)
 
         edited_df = st.data_editor(
             filtered_view,
@@ -126,20 +155,45 @@ elif st.session_state["user_role"] == "Teacher":
             key="grade_editor"
         )
 
-        if st.button("Save Changes"):
-            changed = (filtered[editable_cols] != edited_df[editable_cols]).any(axis=1)
-            for idx in filtered[changed].index:
-                row_number = idx + 2  # Header = row 1 in Sheets
-                for col in editable_cols:
-                    col_number = student_df.columns.get_loc(col) + 1
-                    new_value = edited_df.at[idx, col]
-                    student_ws.update_cell(row_number, col_number, new_value)
-            st.success("Changes saved to Google Sheet!")
+        if st.button("Save Changes", disabled=term_locked):
+            changes = diff_cells(filtered, edited_df, editable_cols, student_df.columns)
+            statuses, error, conflicts = update_cells_checked(SPREADSHEET_NAME, SHEET_STUDENT, filtered, changes,
+                                                              actor=email, source="teacher_dashboard")
+            request_sync()
+            st.session_state["save_result"] = (statuses, str(error) if error else None, conflicts)
             st.rerun()
 
+        if "save_result" in st.session_state:
+            statuses, error, conflicts = st.session_state.pop("save_result")
+            conflicted = {(c["idx"], c["col"]) for c in conflicts}
+            saved = [cell for cell, ok in statuses.items() if ok]
+            failed = [cell for cell, ok in statuses.items() if not ok and cell not in conflicted]
+            if not statuses:
+                st.info("No changes to save.")
+            if saved:
+                st.success(f"{len(saved)} cell(s) saved to Google Sheet!")
+            if conflicts:
+                st.warning(
+                    f"{len(conflicts)} cell(s) were changed by someone else since you opened this sheet "
+                    "and were not overwritten. The table now shows the latest values; re-apply your edit if needed."
+                )
+                st.dataframe(
+                    pd.DataFrame(
+                        [(" / ".join(c["key"]), c["col"], c["yours"], c["theirs"], c["reason"]) for c in conflicts],
+                        columns=["Row", "Column", "Your value", "Current value", "Reason"],
+                    ),
+                    hide_index=True,
+                )
+            if failed:
+                st.error(f"{len(failed)} cell(s) could not be saved: {error}")
+                st.dataframe(
+                    pd.DataFrame([(idx + 2, col) for idx, col in failed], columns=["Sheet Row", "Column"]),
+                    hide_index=True,
+                )
+
         st.divider()
         with st.expander("Show all students/grades (read only):"):
-            st.dataframe(student_df, use_container_width=True)
+            paged_grid(student_df, "all_grades", source=(SHEET_STUDENT, frame_version(SPREADSHEET_NAME, SHEET_STUDENT)))
     else:
         st.info("No assigned students for your filter selection.")
 
@@ -147,27 +201,183 @@ elif st.session_state["user_role"] == "Teacher":
         st.session_state["user_role"] = None
         st.rerun()
 
-# --- STUDENT INTERFACE (Placeholder) ---
+# --- STUDENT INTERFACE ---
 elif st.session_state["user_role"] == "Student":
     st.title("Student Portal")
-    st.info("🔒 This area is under development.\n\nIn future, students will be able to securely view their grades and progress reports here.")
+    first_render()
+    portal("Student", "student_portal")
     if st.button("Change Role"):
         st.session_state["user_role"] = None
         st.rerun()
 
-# --- PARENT INTERFACE (Placeholder) ---
+# --- PARENT INTERFACE ---
 elif st.session_state["user_role"] == "Parent":
     st.title("Parent Portal")
-    st.info("🔒 This area is under development.\n\nParents will soon be able to log in and view their child's grades and school progress.")
+    first_render()
+    portal("Parent", "parent_portal")
     if st.button("Change Role"):
         st.session_state["user_role"] = None
         st.rerun()
 
-# --- ADMIN INTERFACE (Placeholder) ---
+# --- ADMIN INTERFACE ---
 elif st.session_state["user_role"] == "Admin":
     st.title("Admin Dashboard")
-    st.info("🔒 This area is under development.\n\nAdmins will be able to manage users, run analytics, and export grade reports.")
+    first_render()
+    _, student_df, _, _ = open_grades()
+    watch_changes("grades", [(SPREADSHEET_NAME, SHEET_STUDENT, False)])
+    stats = school_analytics(student_df, (SHEET_STUDENT, frame_version(SPREADSHEET_NAME, SHEET_STUDENT)))
+
+    cols = st.columns(len(BAND_LABELS) + 2)
+    cols[0].metric("Grades recorded", stats["rows"])
+    cols[1].metric("School mean", f"{stats['mean']:.1f}" if stats["rows"] else "–")
+    for col, band in zip(cols[2:], BAND_LABELS):
+        col.metric(f"Band {band}", int(stats["bands"][band]))
+
+    if "by_subject" in stats:
+        st.subheader("By Subject")
+        st.dataframe(stats["by_subject"], use_container_width=True, hide_index=True)
+    if "by_class" in stats:
+        st.subheader("By Class")
+        st.dataframe(stats["by_class"].rename(columns={"Teacher_Responsible_Email": "Teacher"}),
+                     use_container_width=True, hide_index=True)
+    if "term_deltas" in stats:
+        st.subheader("Term-over-term change (mean grade)")
+        st.dataframe(stats["term_deltas"], use_container_width=True, hide_index=True)
+
+    st.subheader("At-Risk Students")
+    ensure_job()  # keeps the table current between visits
+    at_risk, info = at_risk_table()
+    flagged_students = at_risk["NAME"].nunique()
+    updated = pd.Timestamp(info["updated_at"], unit="s").strftime("%H:%M:%S") if info["updated_at"] else "–"
+    st.caption(f"{flagged_students} students flagged · updated {updated} UTC "
+               f"({info['recomputed']} students recomputed on the last change).")
+    risk_cols = st.columns(2)
+    risk_subjects = risk_cols[0].multiselect("Subject", sorted(at_risk["Subject"].unique()), key="risk_subjects")
+    risk_reasons = risk_cols[1].multiselect("Reason", sorted(at_risk["Reason"].unique()), key="risk_reasons")
+    shown = at_risk
+    if risk_subjects:
+        shown = shown[shown["Subject"].isin(risk_subjects)]
+    if risk_reasons:
+        shown = shown[shown["Reason"].isin(risk_reasons)]
+    st.dataframe(shown, use_container_width=True, hide_index=True)
+    st.download_button("Download at-risk list (.csv)", shown.to_csv(index=False),
+                       file_name="at_risk_students.csv", mime="text/csv")
+    with st.expander("Thresholds"):
+        settings = load_settings()
+        st.caption(f"Flagged when the latest of {', '.join(ASSESSMENTS)} is below the subject's threshold, "
+                   "or when grades kept falling across them.")
+        default = st.number_input("Default threshold", 0, 100, int(settings["default"]), key="risk_default")
+        decline = st.number_input("Flag a fall of at least (points)", 1, 100, int(settings["decline"]),
+                                  key="risk_decline")
+        subjects = pd.DataFrame(
+            [{"Subject": s, "Threshold": settings["subjects"].get(s, default)}
+             for s in sorted(student_df["Subject"].dropna().unique())]
+        )
+        subjects = st.data_editor(subjects, disabled=["Subject"], hide_index=True, key="risk_thresholds")
+        if st.button("Save thresholds"):
+            save_settings({
+                "default": default,
+                "decline": decline,
+                # Subjects left at the default follow it when it changes later
+                "subjects": {str(r.Subject): int(r.Threshold) for r in subjects.itertuples()
+                             if pd.notna(r.Threshold) and r.Threshold != default},
+            })
+            st.rerun()
+
+    report = schema_report(SPREADSHEET_NAME, SHEET_STUDENT)
+    if report is not None:
+        with st.expander("Data quality & memory"):
+            saved = report["bytes_before"] / max(report["bytes_after"], 1)
+            st.caption(
+                f"Grade table in memory: {report['bytes_after'] / 1e6:.1f} MB "
+                f"(was {report['bytes_before'] / 1e6:.1f} MB as text, {saved:.1f}x smaller)."
+            )
+            if report["missing_columns"]:
+                st.warning(f"Missing columns in {SHEET_STUDENT}: {', '.join(report['missing_columns'])}")
+            if report["invalid_grades"]:
+                st.warning(f"{len(report['invalid_grades'])} grade cell(s) are not numbers between 0 and 100:")
+                st.dataframe(pd.DataFrame(report["invalid_grades"], columns=["Sheet Row", "Value"]), hide_index=True)
+
+    st.subheader("Term Locks")
+    locks = locked_terms()
+    lock_choice = st.selectbox("Term", sorted(student_df["Term"].unique()), key="lock_term",
+                               format_func=lambda t: f"🔒 {t}" if t in locks else t)
+    if lock_choice in locks:
+        info = locks[lock_choice]
+        locked_at = pd.Timestamp(info["locked_at"], unit="s").strftime("%Y-%m-%d %H:%M")
+        st.caption(f"Locked {locked_at} UTC · {info['rows']} grade rows frozen. Teachers can no longer edit this term.")
+        # Frozen at lock time: totals, averages, ranks and band counts are read, not recomputed
+        ranking = frozen(lock_choice, "students")
+        st.dataframe(ranking, use_container_width=True, hide_index=True)
+        st.download_button("Download term results (.csv)", ranking.to_csv(index=False),
+                           file_name=f"{lock_choice}_results.csv", mime="text/csv")
+        with st.expander("By subject"):
+            st.dataframe(frozen(lock_choice, "subjects"), use_container_width=True, hide_index=True)
+        if st.button("Unlock term"):
+            unlock_term(lock_choice)
+            st.rerun()
+    else:
+        st.caption("Open for editing. Locking freezes its grades and stores its final results.")
+        if st.button("Lock term"):
+            lock_term(student_df, lock_choice, locked_by="Admin")
+            st.rerun()
+
+    st.subheader("Grade History")
+    history_book = f"{SPREADSHEET_NAME}/{SHEET_STUDENT}"
+    # Only the chosen view runs: the as-of gradebook reads a whole term of the live sheet
+    history_view = st.segmented_control("View", ["Who changed what", "Gradebook as of"],
+                                        default="Who changed what", key="history_view")
+    if history_view == "Who changed what":
+        history_cols = st.columns(2)
+        history_student = history_cols[0].selectbox(
+            "Student", ["All", *sorted(student_df["NAME"].dropna().astype(str).unique())], key="history_student")
+        history_subject = history_cols[1].selectbox(
+            "Subject", ["All", *sorted(student_df["Subject"].dropna().astype(str).unique())], key="history_subject")
+        history = cell_history(
+            history_book,
+            student=None if history_student == "All" else history_student,
+            subject=None if history_subject == "All" else history_subject,
+        )
+        st.dataframe(history.drop(columns=["id", "book"]), use_container_width=True, hide_index=True)
+    elif history_view == "Gradebook as of":
+        as_of_cols = st.columns(3)
+        as_of_term = as_of_cols[0].selectbox("Term", sorted(student_df["Term"].unique()), key="as_of_term")
+        as_of_date = as_of_cols[1].date_input("Date", key="as_of_date")
+        as_of_time = as_of_cols[2].time_input("Time (UTC)", key="as_of_time")
+        when = pd.Timestamp.combine(as_of_date, as_of_time)
+        # Cells never logged are read from the live sheet (once per data version);
+        # changed ones are replayed from the log
+        gradebook, info = as_of(history_book, as_of_term, when.tz_localize("UTC"), live=student_df,
+                                fields=HISTORY_FIELDS, source=(SHEET_STUDENT, frame_version(SPREADSHEET_NAME, SHEET_STUDENT)))
+        st.caption(f"{info['changed_cells']} logged cells as of {when:%Y-%m-%d %H:%M} UTC · "
+                   f"{info['replayed']} changes replayed since the last checkpoint in {info['ms']:.0f} ms.")
+        st.dataframe(gradebook, use_container_width=True, hide_index=True)
+        st.download_button("Download gradebook (.csv)", gradebook.to_csv(index=False),
+                           file_name=f"{as_of_term}_as_of_{when:%Y%m%d-%H%M}.csv", mime="text/csv")
+
+    st.subheader("Report Cards")
+    report_term = st.selectbox("Term", sorted(student_df["Term"].unique()), key="report_term")
+    if st.button("Generate PDF report cards"):
+        st.session_state["report_job"] = start_report_job(student_df, report_term).id
+
+    report_job = get_job(st.session_state["report_job"]) if "report_job" in st.session_state else None
+    if report_job is not None and not report_job.finished:
+        # Polls only while rendering; the finished job is drawn once by the full rerun below
+        @st.fragment(run_every=1)
+        def report_progress():
+            job = get_job(st.session_state["report_job"])
+            if job is None or job.finished:
+                st.rerun()
+            st.progress(job.done / max(job.total, 1), text=f"Rendering {job.done}/{job.total} report cards...")
+        report_progress()
+    elif report_job is not None and report_job.error is not None:
+        st.error(f"Report generation failed: {report_job.error}")
+    elif report_job is not None:
+        with open(report_job.path, "rb") as f:
+            st.download_button("Download report cards (.zip)", f, file_name=report_job.path.split("/")[-1])
+
     if st.button("Change Role"):
         st.session_state["user_role"] = None
         st.rerun()
 
+end_page()
@@ -5,7 +5,7 @@ import streamlit as st
 from utils.layout import apply_common_layout
 
 apply_common_layout(
-    page_key="teacher_input",
+    page_key="main",
     title="CHHS Grading System",
     subtitle=""
 )
@@ -1,20 +1,14 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import gspread
-from google.oauth2.service_account import Credentials
-from gspread_dataframe import get_as_dataframe
 
-# --- Authenticate and load Google Sheet from Streamlit secrets ---
-scope = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/drive"
-]
-service_account_info = st.secrets["gcp_service_account"]
-creds = Credentials.from_service_account_info(service_account_info, scopes=scope)
-client = gspread.authorize(creds)
-worksheet = client.open("Grades2").sheet1  # or .worksheet("Sheet1")
-df = get_as_dataframe(worksheet, evaluate_formulas=True).dropna(how='all')
+from utils.analytics import grade_styles
+from utils.charts import cached_grade_bar_spec
+from utils.grade_index import get_grade_index
+from utils.live import mark_rendered, watch_changes
+from utils.metrics import begin_page, end_page, first_render
+from utils.sheets_api import frame_version
+from utils.snapshot_store import load_replica_df
+
+begin_page("admin_dashboard")
 
 # --- Set background color and font sizes ---
 st.markdown("""
@@ -49,64 +43,50 @@ st.sidebar.image("assets/logo-chhs.png", width=120)
 st.sidebar.header("Student Selector")
 st.sidebar.markdown("**Welcome to the Clement Howell High School Grades Dashboard!**", unsafe_allow_html=True)
 
-# --- Data selectors ---
-students = df['NAME'].dropna().unique()
-assessment_types = df['Assessment Type'].dropna().unique()
-
-selected_student = st.sidebar.selectbox("Select a student to view grades:", students)
-selected_assessment = st.sidebar.selectbox("Select Assessment Type:", assessment_types)
-
 # ---- Main page header ----
 st.markdown("<div class='main-title'>🟢 Student Grades Dashboard</div>", unsafe_allow_html=True)
 st.markdown("<div class='subtitle'>Visualize individual grades by subject.</div>", unsafe_allow_html=True)
 st.markdown("<div class='section-space'></div>", unsafe_allow_html=True)
 
+# Styles, sidebar and header are drawn before any data is touched
+first_render()
+
+# --- Load grades from the local replica (synced from Sheets in the background) ---
+mark_rendered("dashboard")
+with st.spinner("Loading grades..."):
+    df = load_replica_df("Grades2", numeric=True)
+data_version = ("Grades2", frame_version("Grades2", numeric=True))
+student_index = get_grade_index(df, ["NAME", "Assessment Type"], source=data_version)
+assessment_index = get_grade_index(df, ["Assessment Type"], source=data_version)
+
+# --- Data selectors ---
+students = student_index.options()
+assessment_types = assessment_index.options()
+
+selected_student = st.sidebar.selectbox("Select a student to view grades:", students)
+selected_assessment = st.sidebar.selectbox("Select Assessment Type:", assessment_types)
+
 # ---- Filter Data ----
-filtered = df[(df['NAME'] == selected_student) & (df['Assessment Type'] == selected_assessment)]
+watch_changes("dashboard", [("Grades2", None, True)])
+filtered = student_index.rows(selected_student, selected_assessment)
 grades = filtered[['Subject', 'Grade']].dropna()
 grades.set_index('Subject', inplace=True)
 grades = grades['Grade']
 
-def get_color(g):
-    if pd.isnull(g): return 'gray'
-    if g < 60: return 'red'
-    elif g < 70: return '#FFA500'
-    elif g < 93: return 'green'
-    else: return 'blue'
-colors = [get_color(g) for g in grades]
-
-# ---- Bar chart with large fonts ----
-fig, ax = plt.subplots(figsize=(36, 20))
-bars = ax.bar(grades.index, grades.values, color=colors)
-ax.set_title(f"{selected_student}'s Grades ({selected_assessment})", fontsize=50, pad=20)
-ax.set_ylabel('Grade', fontsize=44)
-ax.set_xlabel('Subject', fontsize=44)
-ax.set_ylim(0, 100)
-ax.set_yticks(range(0, 101, 10))
-plt.xticks(rotation=30, ha='right', fontsize=45)
-plt.yticks(fontsize=45)
-plt.tight_layout(pad=3.0)
-
-for bar, grade in zip(bars, grades.values):
-    ax.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 2,
-            f"{grade:.0f}", ha='center', va='bottom', fontsize=37, fontweight='bold')
-
-st.pyplot(fig, use_container_width=True)
+# ---- Bar chart (Vega-Lite spec, cached per student/assessment/data version) ----
+spec = cached_grade_bar_spec(
+    (selected_student, selected_assessment, data_version),
+    grades,
+    f"{selected_student}'s Grades ({selected_assessment})",
+)
+st.vega_lite_chart(spec, use_container_width=True)
 st.markdown("<div class='section-space'></div>", unsafe_allow_html=True)
 
 # ---- Styled table ----
-def color_grades(val):
-    if pd.isnull(val): return ''
-    if val < 60: color = 'red'
-    elif val < 70: color = '#FFA500'
-    elif val < 93: color = 'green'
-    else: color = 'blue'
-    return f'color: {color}; font-weight:bold; font-size:1.15em;'
-
 styled = (
     filtered[['Subject', 'Grade']]
     .style
-    .applymap(color_grades, subset=['Grade'])
+    .apply(grade_styles, subset=['Grade'])
     .format({'Grade': '{:.1f}'})
 )
 
@@ -124,3 +104,5 @@ st.markdown("""
 <span style='color:blue; font-size:1.1em;'>Blue</span>: 93-100
 </div>
 """, unsafe_allow_html=True)
+
+end_page()
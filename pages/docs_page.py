@@ -5,7 +5,7 @@ from pathlib import Path
 from utils.layout import apply_common_layout
 
 apply_common_layout(
-    page_key="teacher_input",
+    page_key="docs_page",
     title="Teacher Grade Input",
     subtitle="Input and update your subject grades here."
 )
@@ -0,0 +1,50 @@
+import streamlit as st
+import pandas as pd
+
+from utils.layout import apply_common_layout
+from utils.metrics import METRICS_LOG, page_summary, prometheus_text, recent_records, span_summary
+
+apply_common_layout(
+    page_key="metrics",
+    title="Performance Metrics",
+    subtitle="Render times, Sheets API usage and cache hit ratios for this server process."
+)
+
+if st.session_state.get("user_role") != "Admin":
+    st.warning("This page is only available to administrators. Select the Admin role on the home page first.")
+    st.stop()
+
+# --- Per-page latency ---
+st.subheader("Pages")
+summary = page_summary()
+if summary.empty:
+    st.info("No page renders recorded yet.")
+else:
+    st.dataframe(summary, use_container_width=True, hide_index=True)
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Sheets API calls", int(summary["sheets_calls"].sum()))
+    c2.metric("Quota errors (429)", int(summary["quota_errors"].sum()))
+    lookups = summary["cache_hits"].sum() + summary["cache_misses"].sum()
+    c3.metric("Cache hit ratio", f"{summary['cache_hits'].sum() / lookups:.0%}" if lookups else "–")
+
+# --- Where the time goes ---
+st.subheader("Spans")
+spans = span_summary()
+if not spans.empty:
+    st.dataframe(spans.sort_values("avg_ms", ascending=False), use_container_width=True, hide_index=True)
+
+with st.expander("Recent renders"):
+    records = recent_records()[-50:][::-1]
+    st.dataframe(pd.DataFrame([
+        {"page": r["page"], "started": pd.Timestamp(r["started"], unit="s"), "ms": r["ms"],
+         **{f"span: {k}": round(v, 1) for k, v in r["spans"].items()}, **r["counters"]}
+        for r in records
+    ]), use_container_width=True, hide_index=True)
+
+# --- Export ---
+st.subheader("Export")
+st.caption(f"Finished renders are also appended to `{METRICS_LOG}` as JSON lines.")
+text = prometheus_text()
+st.download_button("Download Prometheus metrics", text, file_name="chhs_metrics.prom", mime="text/plain")
+with st.expander("Prometheus text format"):
+    st.code(text, language="text")
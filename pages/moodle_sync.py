@@ -1,9 +1,81 @@
+import streamlit as st
 
 from utils.layout import apply_common_layout
+from utils.moodle_api import AUDIT_LOG, MoodleClient, apply_sync, preview_sync
+from utils.snapshot_store import load_replica_df
+from utils.term_locks import is_locked
 
 apply_common_layout(
-    page_key="teacher_input",
+    page_key="moodle_sync",
     title="Teacher Grade Input",
     subtitle="Input and update your subject grades here."
 )
 
+SPREADSHEET_NAME = "Grades3"
+SHEET_STUDENT = "Sheet2"
+
+# --- Moodle Sync (Tech Admin) ---
+st.header("Moodle Grade Sync")
+st.caption("Compares every course's grade report from Moodle with Sheet2. Review the changes, then apply "
+           "them: only the grades that differ are written and missing rows are appended.")
+
+moodle = st.secrets.get("moodle", {})
+if not moodle.get("url") or not moodle.get("token"):
+    st.warning("Moodle is not configured. Add `url` and `token` under `[moodle]` in secrets.toml.")
+    st.stop()
+
+term = st.text_input("Term to sync into", value=moodle.get("term", ""))
+locked = bool(term) and is_locked(term)
+if locked:
+    st.warning(f"{term} is locked; Moodle grades can be previewed but not written into it.")
+
+if st.button("Fetch & Compare", disabled=not term):
+    client = MoodleClient(moodle["url"], moodle["token"])
+    sheet_df = load_replica_df(SPREADSHEET_NAME, SHEET_STUDENT)
+    bar = st.progress(0.0, text="Fetching course list...")
+    st.session_state["moodle_preview"] = preview_sync(
+        client, sheet_df, term,
+        subject_map=moodle.get("subjects"), item_map=moodle.get("grade_items"),
+        progress=lambda done, total, course: bar.progress(done / total, text=f"{done}/{total}: {course['fullname']}"),
+    )
+    st.session_state.pop("moodle_result", None)
+
+preview = st.session_state.get("moodle_preview")
+if preview is not None:
+    st.subheader(f"Changes for {preview['term']}")
+    cols = st.columns(4)
+    cols[0].metric("Moodle grades", preview["grades"])
+    cols[1].metric("Updates", preview["update"])
+    cols[2].metric("New rows", preview["insert"])
+    cols[3].metric("Conflicts", preview["conflict"])
+    for course, error in preview["errors"]:
+        st.error(f"{course}: {error}")
+    changelog = preview["changelog"]
+    labels = {"update": "Updates", "insert": "New rows", "conflict": "Conflicts (changed in both since the last sync)"}
+    for kind, tab in zip(labels, st.tabs(list(labels.values()))):
+        with tab:
+            st.dataframe(changelog[changelog["kind"] == kind].drop(columns="kind"),
+                         use_container_width=True, hide_index=True)
+    st.download_button("Download changelog (.csv)", changelog.to_csv(index=False),
+                       file_name=f"moodle_changes_{preview['term']}.csv", mime="text/csv")
+
+    kinds = [kind for kind, label, default in (("update", "Apply updates", True), ("insert", "Append new rows", True),
+                                               ("conflict", "Let Moodle win conflicts", False))
+             if preview[kind] and st.checkbox(label, value=default, key=f"moodle_apply_{kind}")]
+    total = sum(preview[kind] for kind in kinds)
+    if st.button(f"Apply {total} change(s)", disabled=locked or not total):
+        st.session_state["moodle_result"] = apply_sync(preview, SPREADSHEET_NAME, SHEET_STUDENT, kinds)
+        st.session_state.pop("moodle_preview")
+        st.rerun()
+
+summary = st.session_state.get("moodle_result")
+if summary is not None:
+    st.success(f"{summary['updated']} grade(s) updated, {summary['inserted']} row(s) queued for appending.")
+    if summary["failed_cells"]:
+        st.error(f"{summary['failed_cells']} grade(s) could not be written to the sheet.")
+    if summary["conflicts"]:
+        st.warning(f"{len(summary['conflicts'])} grade(s) changed in the sheet during the sync or belong to a "
+                   "locked term and were left as they are.")
+    for course, error in summary["errors"]:
+        st.error(f"{course}: {error}")
+    st.caption(f"Every sync is recorded in `{AUDIT_LOG}`.")
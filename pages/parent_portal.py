@@ -1,9 +1,12 @@
 
 from utils.layout import apply_common_layout
+from utils.portal import portal
 
 apply_common_layout(
-    page_key="teacher_input",
-    title="Teacher Grade Input",
-    subtitle="Input and update your subject grades here."
+    page_key="parent_portal",
+    title="Parent Portal",
+    subtitle="View your child's grades, conduct and teacher comments."
 )
 
+# Only the rows of the students linked to this email are looked up and sent
+portal("Parent", "parent_portal")
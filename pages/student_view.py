@@ -1,26 +1,23 @@
 import streamlit as st
-import gspread
-from google.oauth2.service_account import Credentials
 
 
 from utils.layout import apply_common_layout
+from utils.term_locks import TermLockedError, check_unlocked
+from utils.write_queue import enqueue_row, ensure_flusher, entry_status
 
 apply_common_layout(
-    page_key="teacher_input",
+    page_key="student_view",
     title="Teacher Grade Input",
     subtitle="Input and update your subject grades here."
 )
 
 
 
-# --- Authenticate and connect to your new workbook ---
-service_account_info = st.secrets["gcp_service_account"]
-creds = Credentials.from_service_account_info(service_account_info, scopes = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/drive"
-])
-client = gspread.authorize(creds)
-worksheet = client.open("Grades3").worksheet("Sheet1")  # Update sheet name if needed
+TERMS = ["Term 1", "Term 2", "Term 3"]
+ASSESSMENTS = ["Marksheet 1", "Marksheet 2", "Exam"]
+
+# Queued rows from before a restart are sent as soon as the flusher is running
+ensure_flusher()
 
 # --- Sidebar UI ---
 st.sidebar.title("Teacher Entry Portal")
@@ -33,14 +30,57 @@ st.sidebar.markdown("---")
 
 # -- Grades input --
 student_name = st.sidebar.text_input("Student Name")
+term = st.sidebar.selectbox("Term", TERMS)
+assessment_type = st.sidebar.selectbox("Assessment Type", ASSESSMENTS)
 grade = st.sidebar.number_input("Grade", min_value=0, max_value=100)
 conduct_code = st.sidebar.selectbox("Conduct Code", ["Excellent", "Good", "Average", "Needs Improvement"])  # Update as needed
 comment_code = st.sidebar.text_area("Comment")
 
 if st.sidebar.button("Submit Entry"):
     # --- Logic to write to Google Sheets ---
-    new_row = [teacher_email, subject, role, student_name, grade, conduct_code, comment_code]
-    worksheet.append_row(new_row)
-    st.sidebar.success("Entry submitted!")
+    # Term and assessment go after the original columns, so existing rows keep their layout
+    new_row = [teacher_email, subject, role, student_name, grade, conduct_code, comment_code, term, assessment_type]
+    try:
+        check_unlocked(term)
+    except TermLockedError as e:
+        st.sidebar.error(str(e))
+    else:
+        # Logged to the grade history by the flusher once the row is in the sheet
+        history = {
+            "book": "Grades3/Sheet1",
+            "changes": [
+                {"key": (student_name, subject, term, assessment_type), "field": field, "new": value}
+                for field, value in (("Grade", grade), ("Conduct", conduct_code), ("Comment", comment_code))
+            ],
+            "actor": teacher_email,
+            "source": "student_view",
+        }
+        entry_id = enqueue_row("Grades3", "Sheet1", new_row, history=history)  # Update sheet name if needed
+        st.session_state.setdefault("submitted_entries", []).append((entry_id, student_name, subject))
+        st.sidebar.success("Entry queued! It is saved locally and will reach the sheet shortly.")
+
+# --- Submission status (queued entries are sent to Google Sheets in batches) ---
+def _status_label(status, error):
+    if status == "committed":
+        return "✅ committed"
+    if status == "failed":
+        return f"❌ failed: {error}"  # given up on; the entry has to be submitted again
+    return f"⏳ retrying ({error})" if error else "⏳ pending"
+
+if st.session_state.get("submitted_entries"):
+    @st.fragment(run_every=2)
+    def submission_status():
+        entries = st.session_state["submitted_entries"]
+        statuses = entry_status([entry_id for entry_id, _, _ in entries])
+        st.subheader("Your Submissions")
+        st.dataframe(
+            [
+                {"Student": name, "Subject": subj,
+                 "Status": _status_label(*statuses.get(entry_id, ("committed", None)))}
+                for entry_id, name, subj in reversed(entries)
+            ],
+            use_container_width=True, hide_index=True,
+        )
+    submission_status()
 
 # You can expand this with dropdowns for students, subjects, etc., by reading the sheet and populating options.
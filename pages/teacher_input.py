@@ -1,6 +1,6 @@
 import streamlit as st
 import pandas as pd
-from utils.sheets_api import load_grades_df, append_grade_row
+from utils.snapshot_store import load_replica_df
 
 from utils.layout import apply_common_layout
 
@@ -20,7 +20,7 @@ if teacher_email:
     st.success(f"Welcome, {teacher_email}!")
 
     # Load Grades data
-    df = load_grades_df()
+    df = load_replica_df("Grades3", numeric=True)
 
     # Filter for this teacher's entries
     teacher_df = df[df["Teacher"] == teacher_email]
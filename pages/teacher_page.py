@@ -1,44 +1,50 @@
 import streamlit as st
-import pandas as pd
 from datetime import datetime
 
+from utils import metrics
+from utils.grade_store import append_entry, master_entries, maybe_compact, recent_entries
+from utils.term_locks import TermLockedError
+
 
 from utils.layout import apply_common_layout
 
 apply_common_layout(
-    page_key="teacher_input",
+    page_key="teacher_page",
     title="Teacher Grade Input",
     subtitle="Input and update your subject grades here."
 )
 
 
-# Load master data
-grades_file = "Grades3.xlsx"
-df = pd.read_excel(grades_file)
-teacher_list = sorted(df["Subject Teacher"].dropna().unique())
-subjects_list = sorted(df["Subject"].dropna().unique())
-terms = sorted(df["Assessment Period"].dropna().unique())
+ENTRY_KEYS = ("Subject Teacher", "Subject", "Assessment Period")
+PERIOD_KEYS = ("Assessment Period",)
 
-# --- Grade Entry Form ---
+# The layout header is already on screen; draw the page title before the entry log is read
 st.image('logo-chhs.png', width=100)
 st.title("Teacher Grade Entry Portal")
 
+# Master data: the append-only local store, held in memory for all sessions; each
+# render reads and indexes only the entries submitted since the last one
+with st.spinner("Loading grade entries..."), metrics.span("load_entries"):
+    df, indexes = master_entries([ENTRY_KEYS, PERIOD_KEYS])
+index, period_index = indexes[ENTRY_KEYS], indexes[PERIOD_KEYS]
+teacher_list = sorted(index.options())
+subjects_list = sorted(df["Subject"].dropna().unique())
+terms = sorted(period_index.options())
+
+# --- Grade Entry Form ---
+
 with st.form("grade_entry_form", clear_on_submit=True):
     teacher = st.selectbox("Teacher Name", ["Select..."] + teacher_list)
     # Only show subjects that this teacher teaches
     if teacher != "Select...":
-        teacher_subjects = df[df["Subject Teacher"] == teacher]["Subject"].dropna().unique()
+        teacher_subjects = index.options(teacher)
     else:
         teacher_subjects = []
     subject = st.selectbox("Subject", ["Select..."] + list(teacher_subjects))
     term = st.selectbox("Term/Period", terms)
     
     # Students filtered by subject/teacher/term (adjust as needed)
-    eligible_students = df[
-        (df["Subject Teacher"] == teacher) & 
-        (df["Subject"] == subject) & 
-        (df["Assessment Period"] == term)
-    ]["NAME"].unique()
+    eligible_students = index.rows(teacher, subject, term)["NAME"].unique()
     
     student = st.selectbox("Student Name", eligible_students)
     assessment_type = st.selectbox("Assessment Type", ["Marksheet 1", "Marksheet 2", "Exam"])
@@ -57,16 +63,16 @@ with st.form("grade_entry_form", clear_on_submit=True):
             "Date Submitted": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "Comments": comments
         }
-        # Append to DataFrame
-        df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-        # Write back to Excel (CAREFUL: this will overwrite!)
-        df.to_excel(grades_file, index=False)
+        # O(1) insert; the workbook is regenerated by periodic compaction
+        try:
+            append_entry(new_row)
+        except TermLockedError as e:
+            st.error(str(e))
+            st.stop()
+        maybe_compact()
         st.success(f"Grade for {student} in {subject} ({assessment_type}) submitted!")
 
         # Optional: show last 5 submissions for this teacher
         st.subheader("Your Recent Submissions")
-        recent = df[
-            (df["Subject Teacher"] == teacher)
-        ].sort_values("Date Submitted", ascending=False).head(5)
+        recent = recent_entries(teacher, limit=5)
         st.dataframe(recent)
-
@@ -0,0 +1,28 @@
+#!/bin/bash
+# Container entry point.
+#   WORKERS=1 (default): one Streamlit process that reads Google Sheets itself.
+#   WORKERS=N: one sync daemon owns all Sheets reads and appends and publishes
+#   snapshots to shared memory; N Streamlit replicas on ports PORT..PORT+N-1
+#   attach to them read-only. Put a load balancer with sticky sessions in front.
+set -euo pipefail
+
+WORKERS="${WORKERS:-1}"
+PORT="${PORT:-8501}"
+STREAMLIT_ARGS=(--server.enableCORS=false --server.headless=true)
+
+if [ "$WORKERS" -le 1 ]; then
+    exec streamlit run index.py --server.port="$PORT" "${STREAMLIT_ARGS[@]}"
+fi
+
+# tmpfs: every replica memory-maps the same snapshot pages
+export GRADES_SNAPSHOT_DIR="${GRADES_SNAPSHOT_DIR:-/dev/shm/chhs-grades}"
+mkdir -p "$GRADES_SNAPSHOT_DIR"
+
+python -m utils.sync_daemon &
+for ((i = 0; i < WORKERS; i++)); do
+    GRADES_SYNC_MODE=attach streamlit run index.py --server.port=$((PORT + i)) "${STREAMLIT_ARGS[@]}" &
+done
+
+# If any process exits, stop the rest so the container restarts as a whole
+trap 'kill $(jobs -p) 2>/dev/null' EXIT
+wait -n
@@ -0,0 +1,138 @@
+# tests/conftest.py
+
+import json
+import os
+import sys
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tests.fake_sheets import FakeBackend, installed  # noqa: E402
+
+# A few grade rows as they sit in Sheet2 (all cells are sheet text)
+SHEET2 = [
+    ["NAME", "Subject", "Term", "Assessment Type", "Grade"],
+    ["Aaliyah Browne", "Mathematics", "Term 1", "Exam", "80"],
+    ["Aaliyah Browne", "English", "Term 1", "Exam", "70"],
+    ["Jaden Williams", "Mathematics", "Term 1", "Exam", "55"],
+    ["Jaden Williams", "English", "Term 1", "Exam", "61"],
+]
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # Every data/ file the app writes lands in a fresh directory per test
+    from utils import grade_history, write_queue
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(write_queue, "_local", threading.local())
+    monkeypatch.setattr(write_queue, "ensure_flusher", lambda: None)  # tests call flush() themselves
+    monkeypatch.setattr(grade_history, "_local", threading.local())
+    monkeypatch.setattr(grade_history, "_initialized", set())
+    return tmp_path
+
+@pytest.fixture
+def sheets():
+    """Fake Sheets holding SHEET2, installed behind utils.sheets_api."""
+    from utils import sheets_api
+    with sheets_api._frames_lock:
+        sheets_api._frames.clear()
+        sheets_api._last.clear()  # no frame of an earlier test is refreshed against this sheet
+    backend = FakeBackend()
+    backend.add_worksheet("Grades3", "Sheet1", [SHEET2[0]])
+    backend.add_worksheet("Grades3", "Sheet2", SHEET2)
+    with installed(backend):
+        yield backend
+
+# --- Stub Moodle ---
+
+class StubMoodle:
+    """Moodle's REST endpoint (webservice/rest/server.php) for the functions MoodleClient calls.
+
+    failures[course_id] lists HTTP statuses to answer a course's grade report with
+    before it succeeds; errors[course_id] is a Moodle exception payload sent instead.
+    """
+
+    def __init__(self, token="stub-token"):
+        self.token = token
+        self.url = None
+        self.courses = [{"id": 1, "shortname": "site", "fullname": "CHHS Moodle"}]  # the front page
+        self.grades = {}  # course id -> usergrades
+        self.failures = {}
+        self.errors = {}
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def add_course(self, course_id, shortname, fullname, grades, grademax=100):
+        """grades: {student: {item name: raw grade}}; a course total item is added for each student."""
+        self.courses.append({"id": course_id, "shortname": shortname, "fullname": fullname})
+        self.grades[course_id] = [
+            {"userfullname": student, "gradeitems": [
+                *({"itemname": item, "itemtype": "mod", "graderaw": raw, "grademax": grademax}
+                  for item, raw in items.items()),
+                {"itemname": None, "itemtype": "course", "graderaw": sum(filter(None, items.values())),
+                 "grademax": grademax * len(items)},
+            ]}
+            for student, items in grades.items()
+        ]
+
+    def answer(self, params):
+        """(HTTP status, JSON body) for one web service call."""
+        function = params.get("wsfunction")
+        with self._lock:
+            self.calls[function] += 1
+        if params.get("wstoken") != self.token:
+            return 200, {"exception": "moodle_exception", "errorcode": "invalidtoken",
+                         "message": "Invalid token - token not found"}
+        if function == "core_course_get_courses":
+            return 200, self.courses
+        if function == "gradereport_user_get_grade_items":
+            course_id = int(params["courseid"])
+            with self._lock:
+                pending = self.failures.get(course_id)
+                if pending:
+                    return pending.pop(0), {"error": "unavailable"}
+            if course_id in self.errors:
+                return 200, self.errors[course_id]
+            return 200, {"usergrades": self.grades.get(course_id, []), "warnings": []}
+        return 200, {"exception": "dml_missing_record_exception", "message": f"Unknown function {function}"}
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+                params = {k: v[0] for k, v in parse_qs(body).items()}
+                status, payload = stub.answer(params) if self.path == "/webservice/rest/server.php" else (404, {})
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+@pytest.fixture
+def moodle(monkeypatch):
+    """A StubMoodle served on a local port for the duration of the test."""
+    from utils import moodle_api
+    monkeypatch.setattr(moodle_api, "RETRY_BACKOFF", 0)  # retries are exercised, not waited for
+    stub = StubMoodle()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), stub.handler())
+    thread = threading.Thread(target=server.serve_forever, name="stub-moodle", daemon=True)
+    thread.start()
+    stub.url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        yield stub
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,225 @@
+# tests/fake_sheets.py
+
+import json
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range
+
+# In-memory stand-in for the parts of gspread this app uses, for tests and
+# benchmarks. Every request can be slowed down by `latency` seconds and
+# is refused with a 429 once more than `quota` requests were made in the last
+# minute, the way Sheets enforces its per-minute read/write quota.
+
+class _Response:
+    def __init__(self, code, message):
+        self.status_code = code
+        self.text = json.dumps({"error": {"code": code, "message": message}})
+
+    def json(self):
+        return json.loads(self.text)
+
+def _number(text):
+    # What UNFORMATTED_VALUE returns for a cell the sheet parsed as a number
+    if isinstance(text, str) and re.fullmatch(r"-?\d+(\.\d+)?", text.strip()):
+        value = float(text)
+        return int(value) if value.is_integer() else value
+    return text
+
+class FakeBackend:
+    def __init__(self, latency=0.0, quota=None, window=60.0):
+        self.latency = latency
+        self.quota = quota  # requests per window; None means unlimited
+        self.window = window
+        self.spreadsheets = {}  # name -> {worksheet name: rows of cell text}
+        self.calls = Counter()
+        self.quota_errors = 0
+        self._recent = deque()
+        self._lock = threading.RLock()
+
+    def add_worksheet(self, spreadsheet_name, worksheet_name, values):
+        # The first worksheet added to a spreadsheet is its sheet1
+        rows = [["" if v is None else str(v) for v in row] for row in values]
+        with self._lock:
+            self.spreadsheets.setdefault(spreadsheet_name, {})[worksheet_name] = rows
+
+    def values(self, spreadsheet_name, worksheet_name):
+        return self.spreadsheets[spreadsheet_name][worksheet_name]
+
+    def request(self, kind):
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and self._recent[0] <= now - self.window:
+                self._recent.popleft()
+            if self.quota is not None and len(self._recent) >= self.quota:
+                self.quota_errors += 1
+                raise APIError(_Response(429, "Quota exceeded for quota metric 'Read requests'"))
+            self._recent.append(now)
+            self.calls[kind] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def client(self):
+        return FakeClient(self)
+
+class FakeClient:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def open(self, title):
+        self.backend.request("open")
+        if title not in self.backend.spreadsheets:
+            raise APIError(_Response(404, f"Spreadsheet {title!r} not found"))
+        return FakeSpreadsheet(self.backend, title)
+
+class FakeSpreadsheet:
+    def __init__(self, backend, title):
+        self.backend = backend
+        self.title = title
+
+    @property
+    def sheet1(self):
+        return FakeWorksheet(self, next(iter(self.backend.spreadsheets[self.title])))
+
+    def worksheet(self, title):
+        self.backend.request("worksheet")
+        if title not in self.backend.spreadsheets[self.title]:
+            raise WorksheetNotFound(title)
+        return FakeWorksheet(self, title)
+
+    def worksheets(self):
+        self.backend.request("worksheets")
+        return [FakeWorksheet(self, t) for t in self.backend.spreadsheets[self.title]]
+
+    def _read(self, a1, unformatted=False):
+        # "'Sheet2'!A1:C9", "'Sheet2'" (whole worksheet) or "A1:C9" (first worksheet)
+        sheets = self.backend.spreadsheets[self.title]
+        title, _, cells = a1.rpartition("!")
+        title = title.strip("'").replace("''", "'")
+        if not title and a1.strip("'").replace("''", "'") in sheets:
+            title, cells = a1.strip("'").replace("''", "'"), ""
+        worksheet = FakeWorksheet(self, title or next(iter(sheets)))
+        values = worksheet._range(cells) if cells else worksheet._all()
+        return [[_number(v) for v in row] for row in values] if unformatted else values
+
+    def values_get(self, range, params=None):
+        self.backend.request("values_get")
+        unformatted = (params or {}).get("valueRenderOption") == "UNFORMATTED_VALUE"
+        return {"range": range, "values": self._read(range, unformatted)}
+
+    def values_batch_get(self, ranges, params=None):
+        self.backend.request("values_batch_get")
+        unformatted = (params or {}).get("valueRenderOption") == "UNFORMATTED_VALUE"
+        return {
+            "spreadsheetId": self.title,
+            "valueRanges": [{"range": r, "values": self._read(r, unformatted)} for r in ranges],
+        }
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title):
+        self.spreadsheet = spreadsheet
+        self.backend = spreadsheet.backend
+        self.title = title
+
+    @property
+    def _rows(self):
+        return self.backend.values(self.spreadsheet.title, self.title)
+
+    @property
+    def row_count(self):
+        return max(len(self._rows), 1)
+
+    @property
+    def col_count(self):
+        return max((len(r) for r in self._rows), default=1)
+
+    def _all(self):
+        return self._range(None)
+
+    def _range(self, a1):
+        # Like the API: trailing blank cells and rows are not returned
+        grid = a1_range_to_grid_range(a1) if a1 else {}
+        rows = self._rows
+        top, bottom = grid.get("startRowIndex", 0), grid.get("endRowIndex", len(rows))
+        left, right = grid.get("startColumnIndex", 0), grid.get("endColumnIndex")
+        block = []
+        for row in rows[top:bottom]:
+            cells = row[left:right]
+            while cells and cells[-1] == "":
+                cells.pop()
+            block.append(cells)
+        while block and not block[-1]:
+            block.pop()
+        return block
+
+    def get_all_values(self, **kwargs):
+        self.backend.request("get_all_values")
+        rows = self._all()
+        width = max((len(r) for r in rows), default=0)
+        return [r + [""] * (width - len(r)) for r in rows]
+
+    def batch_get(self, ranges, **kwargs):
+        self.backend.request("batch_get")
+        return [self._range(a1) for a1 in ranges]
+
+    def _write(self, top, left, values):
+        rows = self._rows
+        for i, line in enumerate(values):
+            while len(rows) <= top + i:
+                rows.append([])
+            row = rows[top + i]
+            if len(row) < left + len(line):
+                row.extend([""] * (left + len(line) - len(row)))
+            row[left:left + len(line)] = ["" if v is None else str(v) for v in line]
+
+    def batch_update(self, data, **kwargs):
+        self.backend.request("batch_update")
+        with self.backend._lock:
+            for entry in data:
+                grid = a1_range_to_grid_range(entry["range"])
+                self._write(grid.get("startRowIndex", 0), grid.get("startColumnIndex", 0), entry["values"])
+        return {"totalUpdatedCells": sum(len(r) for e in data for r in e["values"])}
+
+    def update_cell(self, row, col, value):
+        self.backend.request("update_cell")
+        with self.backend._lock:
+            self._write(row - 1, col - 1, [[value]])
+
+    def append_rows(self, values, **kwargs):
+        self.backend.request("append_rows")
+        with self.backend._lock:
+            self._write(len(self._all()), 0, values)
+
+    def append_row(self, values, **kwargs):
+        self.append_rows([values], **kwargs)
+
+    def insert_rows(self, values, row=1, **kwargs):
+        self.backend.request("insert_rows")
+        with self.backend._lock:
+            rows = self._rows
+            rows[row - 1:row - 1] = [["" if v is None else str(v) for v in line] for line in values]
+
+@contextmanager
+def installed(backend):
+    """Route utils.sheets_api through `backend` instead of Google for the duration."""
+    from utils import sheets_api
+
+    def reset():
+        sheets_api.get_spreadsheet.clear()
+        sheets_api.get_worksheet.clear()
+        with sheets_api._frames_lock:
+            sheets_api._frames.clear()
+            sheets_api._last.clear()
+
+    original = sheets_api.get_client
+    sheets_api.get_client = backend.client
+    reset()
+    try:
+        yield backend
+    finally:
+        sheets_api.get_client = original
+        reset()
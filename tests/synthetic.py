@@ -0,0 +1,104 @@
+# tests/synthetic.py
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.sheets_api import REV_COLUMN
+
+# Synthetic schools shaped like the real grade sheets (students x subjects x terms x
+# assessments), for tests and benchmarks. Subjects, teachers and conduct/comment
+# codes come from the seed CSV; grades follow a per-student level plus
+# per-assessment noise so bands and averages look like a real school.
+SEED_CSV = os.path.join("data", "sample_data.csv")
+TERMS = ["Term 1", "Term 2", "Term 3"]
+BLANK_RATE = 0.02  # grades not entered yet
+
+FIRST_NAMES = [
+    "Aaliyah", "Jaden", "Keisha", "Malik", "Tiana", "Andre", "Shanice", "Marcus", "Kayla", "Devon",
+    "Nia", "Tyrese", "Imani", "Jamal", "Ashanti", "Kareem", "Zara", "Rohan", "Leah", "Nathan",
+    "Brianna", "Curtis", "Danielle", "Elijah", "Gabrielle", "Isaiah", "Jada", "Kemar", "Latoya", "Omari",
+]
+LAST_NAMES = [
+    "Browne", "Williams", "Robinson", "Samuel", "Joseph", "Charles", "Thomas", "Edwards", "Henry", "Francis",
+    "Martin", "Baptiste", "Richardson", "Gumbs", "Hodge", "Connor", "Fleming", "Lake", "Carty", "Hughes",
+    "Rogers", "Webster", "Harrigan", "Gumbs-Lake", "Richardson-Hodge", "Niles", "Mussington", "Banks", "Brooks", "Proctor",
+]
+
+def load_seed(path=SEED_CSV):
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+def student_names(count, rng):
+    pairs = [f"{f} {l}" for f in FIRST_NAMES for l in LAST_NAMES]
+    rng.shuffle(pairs)
+    # Past 900 students, repeat the pool with a numeric suffix so NAME stays unique
+    return [pairs[i % len(pairs)] + (f" {i // len(pairs) + 1}" if i >= len(pairs) else "") for i in range(count)]
+
+def synthetic_school(students=500, terms=TERMS, seed=0, rev=False, seed_path=SEED_CSV):
+    """Student sheet (all cells as sheet text) for `students` students."""
+    rng = np.random.default_rng(seed)
+    sample = load_seed(seed_path)
+    subjects = sample[["Subject", "Teacher_Responsible_Email"]].drop_duplicates("Subject")
+    assessments = list(dict.fromkeys(sample["Assessment Type"]))
+    conduct = sample["Subject Teacher Conduct Code"].unique()
+    comments = sample["Subject Teacher Comment Code"].unique()
+
+    names = student_names(students, rng)
+    n_sub, n_term, n_ass = len(subjects), len(terms), len(assessments)
+    per_student = n_sub * n_term * n_ass
+    total = students * per_student
+
+    level = rng.normal(72, 11, students)
+    grades = np.repeat(level, per_student) + rng.normal(0, 8, total)
+    grades = np.clip(np.rint(grades), 0, 100).astype(int).astype(str).astype(object)
+    grades[rng.random(total) < BLANK_RATE] = ""
+
+    df = pd.DataFrame({
+        "NAME": np.repeat(names, per_student),
+        "Subject": np.tile(np.repeat(subjects["Subject"].to_numpy(), n_term * n_ass), students),
+        "Term": np.tile(np.repeat(terms, n_ass), students * n_sub),
+        "Assessment Type": np.tile(assessments, students * n_sub * n_term),
+        "Teacher_Responsible_Email": np.tile(
+            np.repeat(subjects["Teacher_Responsible_Email"].to_numpy(), n_term * n_ass), students
+        ),
+        "Grade": grades,
+        "Subject Teacher Conduct Code": rng.choice(conduct, total),
+        "Subject Teacher Comment Code": rng.choice(comments, total),
+    })
+    if rev:
+        df[REV_COLUMN] = [f"{i:012x}" for i in range(total)]
+    return df
+
+def teacher_sheet(student_df):
+    # One row per (teacher, subject), the layout of the teachers worksheet
+    pairs = student_df[["Teacher_Responsible_Email", "Subject"]].drop_duplicates()
+    names = pairs["Teacher_Responsible_Email"].str.split("@").str[0].str.replace(".", " ").str.title()
+    return pd.DataFrame({
+        "email": pairs["Teacher_Responsible_Email"].to_numpy(),
+        "Teacher": names.to_numpy(),
+        "Subject": pairs["Subject"].to_numpy(),
+    })
+
+def roster_sheet(student_df):
+    # Student and parent sign-in emails for the portals
+    names = pd.Series(student_df["NAME"].unique())
+    slug = names.str.lower().str.replace(r"[^a-z0-9]+", ".", regex=True)
+    return pd.DataFrame({
+        "NAME": names,
+        "Student Email": slug + "@students.chhs.edu",
+        "Parent Email": "parent." + slug + "@example.com",
+    })
+
+def sheet_values(df):
+    return [list(df.columns)] + df.astype(str).to_numpy().tolist()
+
+def populate(backend, students=500, seed=0, rev=False):
+    """Fill a fake Sheets backend with the worksheets the app reads; returns the student frame."""
+    df = synthetic_school(students, seed=seed, rev=rev)
+    backend.add_worksheet("Grades3", "Sheet1", [list(df.columns)])  # student submissions
+    backend.add_worksheet("Grades3", "Sheet2", sheet_values(df))
+    backend.add_worksheet("Grades3", "Sheet7", sheet_values(teacher_sheet(df)))
+    backend.add_worksheet("Grades3", "Students", sheet_values(roster_sheet(df)))
+    backend.add_worksheet("Grades2", "Sheet1", sheet_values(df))
+    return df
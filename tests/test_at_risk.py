@@ -0,0 +1,28 @@
+# tests/test_at_risk.py
+
+import time
+
+import pandas as pd
+
+from utils import at_risk, change_bus, sheets_api
+
+def _computed_before(monkeypatch):
+    # State left by an earlier run, before Sheet2's frame went away (e.g. a failed reload)
+    monkeypatch.setattr(at_risk, "_state", dict(
+        at_risk._state, table=pd.DataFrame(columns=at_risk.TABLE_COLUMNS), names=[],
+        seq=change_bus.latest_seq(), settings=at_risk.load_settings(),
+    ))
+
+def test_no_frame_does_not_wake_the_job_for_other_sheets(sheets, monkeypatch):
+    _computed_before(monkeypatch)
+    change_bus.publish(("Grades2", None, True), 1)
+    assert at_risk.refresh() == 0
+    started = time.monotonic()
+    assert not change_bus.wait_for_changes(at_risk._state["seq"], timeout=0.2)  # the job sleeps
+    assert time.monotonic() - started >= 0.2
+
+def test_frame_after_a_gap_is_flagged_in_full(sheets, monkeypatch):
+    _computed_before(monkeypatch)
+    at_risk.refresh()
+    sheets_api.load_sheet_df("Grades3", "Sheet2")  # no event announces a first load
+    assert at_risk.refresh() == 2
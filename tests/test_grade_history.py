@@ -0,0 +1,37 @@
+# tests/test_grade_history.py
+
+import pandas as pd
+import pytest
+from cachetools import LRUCache
+
+from utils import grade_history
+
+BOOK = "Grades3/Sheet2"
+MATHS = ("Aaliyah Browne", "Mathematics", "Term 1", "Exam")
+
+@pytest.fixture
+def logged(monkeypatch):
+    """Aaliyah's Mathematics exam went 80 -> 85 (t=100) -> 90 (t=200), checkpoint, -> 95 (t=300)."""
+    monkeypatch.setattr(grade_history, "_checkpoints", LRUCache(maxsize=16))
+    clock = {"now": 0.0}
+    monkeypatch.setattr(grade_history.time, "time", lambda: clock["now"])
+    for at, old, new in [(100, "80", "85"), (200, "85", "90")]:
+        clock["now"] = at
+        grade_history.record_changes(BOOK, [{"key": MATHS, "field": "Grade", "old": old, "new": new}])
+    assert grade_history.checkpoint(BOOK, "Term 1")
+    clock["now"] = 300
+    grade_history.record_changes(BOOK, [{"key": MATHS, "field": "Grade", "old": "90", "new": "95"}])
+    return pd.DataFrame({
+        "NAME": ["Aaliyah Browne", "Aaliyah Browne"], "Subject": ["Mathematics", "English"],
+        "Term": ["Term 1", "Term 1"], "Assessment Type": ["Exam", "Exam"], "Grade": ["95", "70"],
+    })
+
+def _grades(live, when):
+    wide, info = grade_history.as_of(BOOK, "Term 1", when, live=live)
+    return dict(zip(wide["subject"], wide["Grade"])), info["replayed"]
+
+def test_as_of_before_between_and_after_the_changes(logged):
+    assert _grades(logged, 50) == ({"English": "70", "Mathematics": "80"}, 0)
+    assert _grades(logged, 150) == ({"English": "70", "Mathematics": "85"}, 1)  # before the checkpoint
+    assert _grades(logged, 250) == ({"English": "70", "Mathematics": "90"}, 0)  # the checkpoint alone
+    assert _grades(logged, 350) == ({"English": "70", "Mathematics": "95"}, 1)  # checkpoint + one change
@@ -0,0 +1,125 @@
+# tests/test_moodle_sync.py
+
+import json
+
+import pytest
+
+from utils import grade_history, moodle_api, write_queue
+from utils.moodle_api import MoodleClient, MoodleError
+from utils.sheets_api import invalidate, load_sheet_df
+
+SUBJECTS = {"MATH": "Mathematics", "ENG": "English"}
+ITEMS = {"Final exam": "Exam", "Marksheet 1": "Marksheet 1"}
+
+@pytest.fixture
+def school(moodle):
+    # Mathematics is marked out of 50; Jaden's exam moved from 55 to 60 in Moodle.
+    # English has a Marksheet 1 the sheet does not have yet.
+    moodle.add_course(2, "MATH", "Mathematics 10", {
+        "Aaliyah Browne": {"Final exam": 40},
+        "Jaden Williams": {"Final exam": 30},
+    }, grademax=50)
+    moodle.add_course(3, "ENG", "English 10", {
+        "Aaliyah Browne": {"Final exam": 70, "Marksheet 1": 75},
+        "Jaden Williams": {"Final exam": 61, "Marksheet 1": None},  # not graded yet
+    })
+    return moodle
+
+def _client(moodle, token=None):
+    return MoodleClient(moodle.url, token or moodle.token, max_connections=2)
+
+def _fetch(moodle, **kwargs):
+    return moodle_api.fetch_moodle_grades(_client(moodle, **kwargs), "Term 1", SUBJECTS, ITEMS)
+
+def _preview(moodle):
+    return moodle_api.preview_sync(_client(moodle), load_sheet_df("Grades3", "Sheet2"), "Term 1", SUBJECTS, ITEMS)
+
+def _grade(backend, name, subject, assessment="Exam"):
+    rows = backend.values("Grades3", "Sheet2")
+    return next(r[4] for r in rows if r[0] == name and r[1] == subject and r[3] == assessment)
+
+def _set_grade(backend, name, subject, value):
+    rows = backend.values("Grades3", "Sheet2")
+    next(r for r in rows if r[0] == name and r[1] == subject and r[3] == "Exam")[4] = value
+
+# --- Fetch ---
+
+def test_fetch_grades(school):
+    grades, courses, errors = _fetch(school)
+    assert courses == 2 and errors == []  # the front page is not a course
+    by_key = grades.set_index(["NAME", "Subject", "Assessment Type"])["Grade"]
+    assert len(grades) == 5  # course totals and ungraded items are skipped
+    assert by_key[("Jaden Williams", "Mathematics", "Exam")] == 60.0  # scaled to 100
+    assert by_key[("Aaliyah Browne", "English", "Marksheet 1")] == 75
+    assert (grades["Term"] == "Term 1").all()
+
+def test_fetch_retries_transient_errors(school):
+    school.failures[2] = [503, 502]
+    grades, _, errors = _fetch(school)
+    assert errors == [] and len(grades) == 5
+    assert school.calls["gradereport_user_get_grade_items"] == 4  # 2 courses + 2 retries
+
+def test_fetch_reports_course_that_keeps_failing(school):
+    school.failures[2] = [503] * (moodle_api.RETRIES + 1)
+    grades, courses, errors = _fetch(school)
+    assert courses == 2
+    assert [name for name, _ in errors] == ["Mathematics 10"]
+    assert set(grades["Subject"]) == {"English"}  # the other course still arrives
+
+def test_fetch_reports_moodle_exception(school):
+    school.errors[3] = {"exception": "required_capability_exception", "message": "Sorry, no access"}
+    grades, _, errors = _fetch(school)
+    assert errors == [("English 10", "gradereport_user_get_grade_items: Sorry, no access")]
+    assert set(grades["Subject"]) == {"Mathematics"}
+
+def test_fetch_rejects_bad_token(school):
+    with pytest.raises(MoodleError, match="Invalid token"):
+        _fetch(school, token="wrong")
+
+# --- Reconcile ---
+
+def test_preview_reconciles_without_writing(school, sheets):
+    preview = _preview(school)
+    assert (preview["update"], preview["insert"], preview["conflict"]) == (1, 1, 0)
+    changelog = preview["changelog"].set_index("kind")
+    assert changelog.loc["update", "NAME"] == "Jaden Williams" and changelog.loc["update", "row"] == 4
+    assert changelog.loc["insert", "Assessment Type"] == "Marksheet 1"
+    assert sheets.calls["batch_update"] == 0 and _grade(sheets, "Jaden Williams", "Mathematics") == "55"
+
+# --- Apply ---
+
+def test_apply_writes_cells_and_queues_new_rows(school, sheets):
+    summary = moodle_api.apply_sync(_preview(school), "Grades3", "Sheet2")
+    assert (summary["updated"], summary["inserted"], summary["conflicts"]) == (1, 1, [])
+    assert _grade(sheets, "Jaden Williams", "Mathematics") == "60"
+    assert grade_history.cell_history("Grades3/Sheet2", assessment="Marksheet 1").empty  # only queued so far
+    assert write_queue.flush() == 1
+    assert _grade(sheets, "Aaliyah Browne", "English", "Marksheet 1") == "75"
+    assert grade_history.cell_history("Grades3/Sheet2", assessment="Marksheet 1")["new"].tolist() == ["75"]
+
+    with open(moodle_api.AUDIT_LOG) as f:
+        runs = [r for r in map(json.loads, f) if r["type"] == "run"]
+    assert [r["dry_run"] for r in runs] == [True, False]
+    # The sheet now agrees with Moodle: the next preview has nothing to do
+    again = _preview(school)
+    assert (again["update"], again["insert"], again["conflict"]) == (0, 0, 0)
+
+def test_apply_leaves_cells_changed_since_preview(school, sheets):
+    preview = _preview(school)
+    _set_grade(sheets, "Jaden Williams", "Mathematics", "58")  # a teacher saved in between
+    summary = moodle_api.apply_sync(preview, "Grades3", "Sheet2", kinds=("update",))
+    assert summary["updated"] == 0 and summary["inserted"] == 0
+    assert [c["reason"] for c in summary["conflicts"]] == ["changed by someone else"]
+    assert _grade(sheets, "Jaden Williams", "Mathematics") == "58"
+
+def test_hand_edits_since_last_sync(school, sheets):
+    moodle_api.apply_sync(_preview(school), "Grades3", "Sheet2", kinds=("update",))
+    # Edited in the sheet only: kept. Edited in both: a conflict, not an update.
+    _set_grade(sheets, "Aaliyah Browne", "Mathematics", "85")
+    _set_grade(sheets, "Jaden Williams", "Mathematics", "65")
+    school.grades[2][1]["gradeitems"][0]["graderaw"] = 31
+    invalidate("Grades3", "Sheet2")
+    preview = _preview(school)
+    conflicts = preview["changelog"][preview["changelog"]["kind"] == "conflict"]
+    assert (preview["update"], preview["conflict"]) == (0, 1)
+    assert conflicts["NAME"].tolist() == ["Jaden Williams"] and conflicts["moodle"].tolist() == [62.0]
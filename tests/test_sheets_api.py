@@ -0,0 +1,46 @@
+# tests/test_sheets_api.py
+
+import pytest
+from gspread.exceptions import APIError
+
+from utils import change_bus, sheets_api
+
+def _as_float_text(sheets):
+    # Grades written back by a parsed-frame tool come out as "80.0"
+    for row in sheets.values("Grades3", "Sheet2")[1:]:
+        row[4] = f"{float(row[4])}"
+
+def test_typed_grade_matches_sheet_text(sheets):
+    _as_float_text(sheets)
+    df = sheets_api.load_sheet_df("Grades3", "Sheet2")
+    grade_col = df.columns.get_loc("Grade") + 1
+    statuses, _, conflicts = sheets_api.update_cells_checked(
+        "Grades3", "Sheet2", df, [(2, "Grade", 4, grade_col, "57")]
+    )
+    assert statuses == {(2, "Grade"): True} and conflicts == []
+    assert sheets.values("Grades3", "Sheet2")[3][4] == "57"
+
+def test_refresh_publishes_only_changed_rows(sheets):
+    _as_float_text(sheets)
+    sheets_api.load_sheet_df("Grades3", "Sheet2")
+    sheets.values("Grades3", "Sheet2")[1][4] = "81"
+    sheets_api.invalidate("Grades3", "Sheet2")
+    seq = change_bus.latest_seq()
+    df = sheets_api.load_sheet_df("Grades3", "Sheet2")
+    events, _, _ = change_bus.changes_since(seq)
+    assert [len(e.deltas) for e in events] == [1]
+    assert df["Grade"].tolist() == [81, 70, 55, 61]
+
+def test_failed_reload_keeps_the_frame_and_its_version(sheets, monkeypatch):
+    df = sheets_api.load_sheet_df("Grades3", "Sheet2")
+    sheets_api.reload("Grades3", "Sheet2")
+    version = sheets_api.frame_version("Grades3", "Sheet2")
+    monkeypatch.setattr(sheets_api, "MAX_ATTEMPTS", 1)
+    sheets.quota = 0  # every request answers 429
+    with pytest.raises(APIError):
+        sheets_api.reload("Grades3", "Sheet2")
+    assert sheets_api.frame_version("Grades3", "Sheet2") == version
+    assert sheets_api.peek_df("Grades3", "Sheet2")["Grade"].tolist() == df["Grade"].tolist()
+    sheets.quota = None
+    sheets_api.reload("Grades3", "Sheet2")
+    assert sheets_api.frame_version("Grades3", "Sheet2") == version + 1
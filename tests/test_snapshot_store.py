@@ -0,0 +1,87 @@
+# tests/test_snapshot_store.py
+
+import os
+import threading
+import time
+
+import pytest
+
+from utils import change_bus, sheets_api, snapshot_store
+
+KEY = ("Grades3", "Sheet2", False)
+
+@pytest.fixture
+def published(sheets, tmp_path, monkeypatch):
+    """Publish Sheet2 as the sync daemon would, then forget it, as a fresh replica has."""
+    monkeypatch.setattr(snapshot_store, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(snapshot_store, "ATTACHED", True)
+    monkeypatch.setattr(snapshot_store, "_attached", {})
+
+    def publish():
+        df = sheets_api.load_sheet_df(*KEY)
+        name = snapshot_store.snapshot_name(*KEY)
+        snapshot_store.write_snapshot(name, df, source=list(KEY), hashes=sheets_api.row_hashes(*KEY, df=df))
+
+    publish()
+    with sheets_api._frames_lock:
+        sheets_api._frames.clear()
+        sheets_api._last.clear()
+    return publish
+
+def _republish(sheets, publish, row, grade):
+    # The daemon sees one edited row and writes a new snapshot over the old one
+    replica = sheets_api._last.pop(KEY)
+    sheets.values("Grades3", "Sheet2")[row][4] = grade
+    sheets_api.invalidate("Grades3", "Sheet2")
+    publish()
+    sheets_api._last[KEY] = replica
+    snapshot_store._attached[KEY] = (snapshot_store._attached[KEY][0], 0)  # due for a manifest check
+
+def test_attach_maps_the_snapshot_without_hashing(published, monkeypatch):
+    monkeypatch.setattr(sheets_api, "_frame_hashes", lambda *a: pytest.fail("rows hashed again"))
+    df = snapshot_store.load_replica_df(*KEY)
+    assert df["Grade"].tolist() == [80, 70, 55, 61]
+    assert not df["Subject"].array.codes.flags.writeable  # still the mapped file's pages
+    assert sheets_api.frame_version(*KEY) == snapshot_store.read_manifest(snapshot_store.snapshot_name(*KEY))["version"]
+
+def test_new_snapshot_publishes_row_deltas(sheets, published):
+    snapshot_store.load_replica_df(*KEY)
+    _republish(sheets, published, 2, "75")
+    seq = change_bus.latest_seq()
+    df = snapshot_store.load_replica_df(*KEY)
+    events, _, _ = change_bus.changes_since(seq, {KEY})
+    assert [(d["pos"], d["kind"], d["values"]["Grade"]) for d in events[0].deltas] == [(1, "update", "75")]
+    assert df["Grade"].tolist() == [80, 75, 55, 61]
+
+def test_saving_into_an_attached_frame_copies_the_column(sheets, published):
+    df = snapshot_store.load_replica_df(*KEY)
+    grade = df.columns.get_loc("Grade") + 1
+    statuses, _, _ = sheets_api.update_cells_checked("Grades3", "Sheet2", df.copy(), [(0, "Grade", 2, grade, "90")])
+    assert statuses == {(0, "Grade"): True}
+    assert sheets_api.peek_df(*KEY)["Grade"].tolist() == [90, 70, 55, 61]
+
+def test_waiting_for_one_sheet_does_not_block_another(published, monkeypatch):
+    monkeypatch.setattr(snapshot_store, "ATTACH_TIMEOUT", 1.0)
+    errors = []
+
+    def wait_for_unpublished():
+        try:
+            snapshot_store.load_replica_df("Grades3", "Sheet9")  # never published
+        except snapshot_store.SnapshotUnavailable as e:
+            errors.append(e)
+
+    waiting = threading.Thread(target=wait_for_unpublished)
+    waiting.start()
+    time.sleep(0.1)
+    started = time.monotonic()
+    snapshot_store.load_replica_df(*KEY)
+    assert time.monotonic() - started < 0.5
+    waiting.join()
+    assert len(errors) == 1
+
+def test_reload_in_attach_mode_leaves_sheets_to_the_daemon(sheets, published):
+    df = snapshot_store.load_replica_df(*KEY)
+    reads = sum(sheets.calls.values())
+    assert sheets_api.reload("Grades3", "Sheet2") is df
+    assert sum(sheets.calls.values()) == reads
+    assert os.path.exists(snapshot_store.control_path("sync.request"))
@@ -0,0 +1,51 @@
+# tests/test_term_locks.py
+
+import os
+import threading
+
+import pytest
+
+from utils import grade_store, sheets_api, term_locks
+from utils.term_locks import TermLockedError
+
+@pytest.fixture(autouse=True)
+def fresh_locks(monkeypatch):
+    # locks.json is re-read by mtime; a file of an earlier test must not look unchanged
+    monkeypatch.setattr(term_locks, "_state", {"mtime": None, "locks": {}})
+
+def test_save_refuses_rows_of_a_locked_term(sheets):
+    df = sheets_api.load_sheet_df("Grades3", "Sheet2")
+    term_locks.lock_term(df, "Term 1")
+    grade = df.columns.get_loc("Grade") + 1
+    statuses, error, conflicts = sheets_api.update_cells_checked(
+        "Grades3", "Sheet2", df, [(0, "Grade", 2, grade, "90")]
+    )
+    assert statuses == {(0, "Grade"): False} and error is None
+    assert [c["reason"] for c in conflicts] == ["term is locked"]
+    assert sheets.values("Grades3", "Sheet2")[1][4] == "80"
+
+def test_append_entry_refuses_a_locked_term(sheets, monkeypatch):
+    monkeypatch.setattr(grade_store, "_local", threading.local())
+    monkeypatch.setattr(grade_store, "_initialized", set())
+    term_locks.lock_term(sheets_api.load_sheet_df("Grades3", "Sheet2"), "Term 1")
+    entry = {"NAME": "Aaliyah Browne", "Subject": "Mathematics", "Subject Teacher": "t@school.edu",
+             "Assessment Type": "Exam", "Grade": 90, "Assessment Period": "Term 1"}
+    with pytest.raises(TermLockedError):
+        grade_store.append_entry(entry)
+    assert grade_store.append_entry({**entry, "Assessment Period": "Term 2"})
+
+def test_lock_and_unlock_round_trip_the_artifacts(sheets):
+    df = sheets_api.load_sheet_df("Grades3", "Sheet2")
+    assert term_locks.lock_term(df, "Term 1", locked_by="admin@school.edu")["rows"] == 4
+    assert term_locks.is_locked("Term 1") and not term_locks.is_locked("Term 2")
+    rows = term_locks.frozen("Term 1")
+    assert rows["_pos"].tolist() == [0, 1, 2, 3]
+    assert rows["Grade"].tolist() == df["Grade"].tolist()
+    assert sorted(term_locks.frozen("Term 1", "students")["NAME"]) == ["Aaliyah Browne", "Jaden Williams"]
+    paths = [term_locks._artifact_path("Term 1", name) for name in term_locks.ARTIFACTS]
+    assert all(os.path.exists(p) for p in paths)
+
+    assert term_locks.unlock_term("Term 1")
+    assert not term_locks.is_locked("Term 1") and term_locks.frozen("Term 1") is None
+    assert not any(os.path.exists(p) for p in paths)
+    assert not term_locks.unlock_term("Term 1")
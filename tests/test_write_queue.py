@@ -0,0 +1,59 @@
+# tests/test_write_queue.py
+
+from utils import grade_history, sheets_api, write_queue
+
+ROW = ["t@chhs.edu", "Mathematics", "Subject Teacher", "Jaden Williams", "60", "Good", ""]
+
+def test_rows_for_a_missing_worksheet_fail_without_blocking_others(sheets, monkeypatch):
+    monkeypatch.setattr(write_queue, "MAX_BATCH", 3)
+    lost = [write_queue.enqueue_row("Grades3", "Sheet9", ROW) for _ in range(5)]
+    sent = write_queue.enqueue_row("Grades3", "Sheet1", ROW)
+    while write_queue.flush():
+        pass
+    write_queue.flush()  # the first claim held only rows for Sheet9
+    statuses = write_queue.entry_status(lost + [sent])
+    assert {statuses[i][0] for i in lost} == {"failed"}
+    assert statuses[sent] == ("committed", None)
+    assert sheets.values("Grades3", "Sheet1")[-1] == ROW
+    assert write_queue.pending_count() == 0
+
+def test_transient_errors_back_off_then_give_up(sheets, monkeypatch):
+    monkeypatch.setattr(sheets_api, "MAX_ATTEMPTS", 1)  # no in-call retries
+    sheets.quota = 0  # every request answers 429
+    entry = write_queue.enqueue_row("Grades3", "Sheet1", ROW)
+    write_queue.flush()
+    status, error = write_queue.entry_status([entry])[entry]
+    assert status == "pending" and "Quota exceeded" in error
+    assert write_queue.next_due() > write_queue.time.time()
+    assert write_queue.flush() == 0 and sheets.calls["append_rows"] == 0  # still backing off
+
+    with write_queue._conn() as conn:
+        conn.execute("UPDATE appends SET next_attempt = 0")  # the wait is over
+    monkeypatch.setattr(write_queue, "RETRY_BASE", 0)
+    for _ in range(2, write_queue.MAX_ATTEMPTS + 1):
+        assert write_queue.entry_status([entry])[entry][0] == "pending"
+        write_queue.flush()
+    assert write_queue.entry_status([entry])[entry][0] == "failed"
+    assert write_queue.pending_count() == 0
+
+def test_history_is_logged_when_the_row_is_committed(sheets):
+    def history(term):
+        return {"book": "Grades3/Sheet1", "actor": "t@chhs.edu", "source": "student_view",
+                "changes": [{"key": ("Jaden Williams", "Mathematics", term, "Exam"), "field": "Grade", "new": "60"}]}
+
+    write_queue.enqueue_row("Grades3", "Sheet9", ROW, history=history("Term 1"))  # never reaches a sheet
+    write_queue.enqueue_row("Grades3", "Sheet1", ROW, history=history("Term 2"))
+    assert grade_history.cell_history("Grades3/Sheet1").empty  # queued is not written
+    write_queue.flush()
+    write_queue.flush()
+    logged = grade_history.cell_history("Grades3/Sheet1")
+    assert logged[["term", "assessment", "new", "actor"]].values.tolist() == [["Term 2", "Exam", "60", "t@chhs.edu"]]
+
+def test_append_grade_row_is_logged_once_committed(sheets):
+    row = {"NAME": "Jaden Williams", "Subject": "Mathematics", "Term": "Term 1", "Assessment Type": "Exam", "Grade": 60}
+    sheets_api.append_grade_row(row)
+    assert grade_history.cell_history("Grades3/sheet1").empty
+    assert write_queue.flush() == 1
+    assert sheets.values("Grades3", "Sheet1")[-1] == ["Jaden Williams", "Mathematics", "Term 1", "Exam", "60"]
+    assert grade_history.cell_history("Grades3/sheet1")[["student", "term", "new"]].values.tolist() == [
+        ["Jaden Williams", "Term 1", "60"]]
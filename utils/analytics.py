@@ -0,0 +1,99 @@
+# utils/analytics.py
+
+import threading
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+from utils import metrics
+
+# Grade bands used across the dashboards (same cut-offs as the legend)
+BAND_LABELS = ["<60", "60–69", "70–92", "93+"]
+BAND_COLORS = ["red", "#FFA500", "green", "blue"]
+PERCENTILES = [0.1, 0.25, 0.75, 0.9]
+# The grade sheets carry no class column: a class is one teacher's group in a subject.
+# A "Class" column, if a sheet ever gets one, is used instead.
+CLASS_KEYS = ["Subject", "Teacher_Responsible_Email"]
+
+_results = LRUCache(maxsize=8)
+_results_lock = threading.Lock()
+
+def numeric_grades(df, col="Grade"):
+    return pd.to_numeric(df[col], errors="coerce")
+
+def _band_conditions(grades):
+    return [grades < 60, grades < 70, grades < 93, grades >= 93]
+
+def grade_bands(grades):
+    """Band label per grade (NaN stays NaN), computed for the whole column at once."""
+    grades = np.asarray(grades, dtype=float)
+    labels = np.select(_band_conditions(grades), BAND_LABELS, default="")
+    return pd.Categorical(np.where(labels == "", None, labels), categories=BAND_LABELS, ordered=True)
+
+def grade_colors(grades, missing="gray"):
+    grades = np.asarray(grades, dtype=float)
+    return np.select(_band_conditions(grades), BAND_COLORS, default=missing)
+
+def grade_styles(grades):
+    # Styler.apply callback: CSS for a whole Grade column in one pass
+    colors = grade_colors(grades, missing="")
+    return np.where(colors == "", "", "color: " + colors + "; font-weight:bold; font-size:1.15em;")
+
+def term_column(df):
+    return next((c for c in ("Term", "Assessment Period") if c in df.columns), None)
+
+def group_summary(df, by):
+    """Count, mean, median, percentiles and band counts of Grade per group."""
+    grouped = df.groupby(by, observed=True, sort=True)["_grade"]
+    summary = grouped.agg(["count", "mean", "median"])
+    quantiles = grouped.quantile(PERCENTILES).unstack()
+    quantiles.columns = [f"p{int(q * 100)}" for q in quantiles.columns]
+    bands = pd.crosstab([df[c] for c in by], df["_band"]).reindex(columns=BAND_LABELS, fill_value=0)
+    return summary.join(quantiles).join(bands).round(1).reset_index()
+
+def term_deltas(df, by):
+    """Mean grade per group and term, with the change from the previous term."""
+    term = term_column(df)
+    means = df.groupby(by + [term], observed=True, sort=True)["_grade"].mean().rename("mean").reset_index()
+    means["delta"] = means.groupby(by, observed=True)["mean"].diff()
+    return means.round(1)
+
+def student_summary(df, student_col="NAME"):
+    """Per student: graded count, total, average, rank (1 = highest average) and band counts."""
+    frame = df.assign(_grade=numeric_grades(df)).dropna(subset=["_grade"])
+    frame["_band"] = grade_bands(frame["_grade"])
+    grouped = frame.groupby(student_col, observed=True, sort=True)["_grade"]
+    summary = grouped.agg(graded="count", total="sum", average="mean")
+    summary["rank"] = summary["average"].rank(method="min", ascending=False).astype(int)
+    bands = pd.crosstab(frame[student_col], frame["_band"]).reindex(columns=BAND_LABELS, fill_value=0)
+    return summary.join(bands).round(1).sort_values("rank").reset_index()
+
+def _compute(df):
+    frame = df.assign(_grade=numeric_grades(df)).dropna(subset=["_grade"])
+    frame["_band"] = grade_bands(frame["_grade"])
+    result = {
+        "rows": len(frame),
+        "mean": frame["_grade"].mean(),
+        "bands": frame["_band"].value_counts().reindex(BAND_LABELS, fill_value=0),
+    }
+    class_keys = ["Class"] if "Class" in frame.columns else CLASS_KEYS
+    for name, by in (("by_subject", ["Subject"]), ("by_class", class_keys)):
+        if all(c in frame.columns for c in by):
+            result[name] = group_summary(frame, by)
+    term = term_column(frame)
+    if term is not None and "Subject" in frame.columns:
+        result["term_deltas"] = term_deltas(frame, ["Subject"])
+    return result
+
+def school_analytics(df, source):
+    """Whole-school aggregates, computed once per `source` (e.g. sheet name + data version)."""
+    with _results_lock:
+        result = _results.get(source)
+    metrics.count("cache_hits" if result is not None else "cache_misses")
+    if result is None:
+        with metrics.span("school_analytics"):
+            result = _compute(df)
+        with _results_lock:
+            _results[source] = result
+    return result
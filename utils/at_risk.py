@@ -0,0 +1,148 @@
+# utils/at_risk.py
+
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import metrics
+from utils.analytics import numeric_grades
+from utils.change_bus import changes_since, touched_positions, wait_for_changes
+from utils.sheets_api import peek_df
+
+# Students to follow up on, kept as a materialized table over the shared grade frame.
+# A (student, subject, term) is flagged when its latest assessment is below the
+# subject's threshold, or when grades kept falling across Marksheet 1, Marksheet 2
+# and Exam and lost at least `decline` points overall. A background thread
+# follows the change bus and recomputes only the students whose rows changed.
+SPREADSHEET_NAME = "Grades3"
+WORKSHEET = "Sheet2"
+KEY = (SPREADSHEET_NAME, WORKSHEET, False)
+SETTINGS_FILE = os.path.join("data", "at_risk.json")
+DEFAULT_SETTINGS = {
+    "default": 50,  # threshold for subjects not listed below
+    "subjects": {"Mathematics": 50, "English": 50},
+    "decline": 10,  # points lost between the first and the latest assessment
+}
+ASSESSMENTS = ["Marksheet 1", "Marksheet 2", "Exam"]
+TABLE_COLUMNS = ["NAME", "Subject", "Term", *ASSESSMENTS, "Latest", "Threshold", "Change", "Reason"]
+REFRESH_INTERVAL = 60  # seconds; the thread also wakes on every published change
+
+log = logging.getLogger(__name__)
+
+_state = {"table": None, "names": None, "seq": 0, "settings": None, "updated_at": None, "recomputed": 0}
+_state_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_job = None
+
+def load_settings():
+    try:
+        with open(SETTINGS_FILE) as f:
+            return {**DEFAULT_SETTINGS, **json.load(f)}
+    except (OSError, ValueError):
+        return dict(DEFAULT_SETTINGS)
+
+def save_settings(settings):
+    os.makedirs(os.path.dirname(SETTINGS_FILE), exist_ok=True)
+    tmp = f"{SETTINGS_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(settings, f, indent=2)
+    os.replace(tmp, SETTINGS_FILE)  # the next refresh sees the new settings and recomputes everyone
+
+def flag_students(df, settings):
+    """At-risk (student, subject, term) rows of df, one column per assessment."""
+    if df.empty or not {"NAME", "Subject", "Term", "Assessment Type", "Grade"} <= set(df.columns):
+        return pd.DataFrame(columns=TABLE_COLUMNS)
+    frame = df[["NAME", "Subject", "Term", "Assessment Type"]].assign(_grade=numeric_grades(df).astype(float))
+    frame = frame[frame["Assessment Type"].isin(ASSESSMENTS)].dropna(subset=["_grade"])
+    wide = frame.pivot_table(index=["NAME", "Subject", "Term"], columns="Assessment Type", values="_grade",
+                             aggfunc="last", observed=True)
+    wide = wide.reindex(columns=ASSESSMENTS)
+    wide.columns = list(wide.columns)
+    latest = wide.ffill(axis=1).iloc[:, -1]
+    first = wide.bfill(axis=1).iloc[:, 0]
+    subjects = wide.index.get_level_values("Subject").astype(str)
+    threshold = pd.Series(subjects, index=wide.index).map(settings["subjects"]).fillna(settings["default"])
+    change = (latest - first).where(wide.notna().sum(axis=1) >= 2)
+    # A blank assessment in between neither breaks nor extends the fall
+    falling = (wide.ffill(axis=1).diff(axis=1).fillna(0) <= 0).all(axis=1)
+    below = latest < threshold
+    declining = falling & (change <= -settings["decline"])
+    reason = np.select([below & declining, below, declining],
+                       ["below threshold, falling", "below threshold", "falling"], default="")
+    table = wide.assign(Latest=latest, Threshold=threshold, Change=change, Reason=reason)
+    table = table[below | declining].reset_index()
+    for col in ("NAME", "Subject", "Term"):
+        table[col] = table[col].astype(str)
+    return table[TABLE_COLUMNS]
+
+def _sorted(table):
+    return table.sort_values(["Latest", "NAME", "Subject", "Term"], ignore_index=True)
+
+def refresh():
+    """Bring the table up to date with the grade frame. Returns the number of students recomputed."""
+    with _refresh_lock:
+        with _state_lock:
+            seen, old, names, previous = _state["seq"], _state["table"], _state["names"], _state["settings"]
+        # Read the feed before the frame: anything published later is picked up next time
+        events, latest, complete = changes_since(seen, [KEY])
+        df = peek_df(*KEY)
+        if df is None:
+            # Nothing to flag yet: take the feed as read, or the job
+            # would wake for every event, and rebuild in full once there is a frame again
+            with _state_lock:
+                _state.update(seq=latest, settings=None)
+            return 0
+        settings = load_settings()
+        if old is not None and complete and not events and settings == previous:
+            with _state_lock:
+                _state["seq"] = latest
+            return 0
+        touched = touched_positions(events) if old is not None and complete and settings == previous else None
+        current = df["NAME"].astype(str).to_numpy()
+        with metrics.span("at_risk"):
+            if touched is None:
+                table = flag_students(df, settings)
+                recomputed = len(np.unique(current))
+            else:
+                # A row may have moved to another student: refresh both the old and the new owner
+                changed = {current[p] for p in touched if p < len(current)}
+                changed |= {names[p] for p in touched if p < len(names)}
+                rows = df[df["NAME"].astype(str).isin(changed)]
+                table = pd.concat([old[~old["NAME"].isin(changed)], flag_students(rows, settings)],
+                                  ignore_index=True)
+                recomputed = len(changed)
+        with _state_lock:
+            _state.update(table=_sorted(table), names=current, seq=latest, settings=settings,
+                          updated_at=time.time(), recomputed=recomputed)
+        return recomputed
+
+def at_risk_table():
+    """(table, info) as of now; info has updated_at and how many students the last run recomputed."""
+    refresh()
+    with _state_lock:
+        table = _state["table"] if _state["table"] is not None else pd.DataFrame(columns=TABLE_COLUMNS)
+        return table, {"updated_at": _state["updated_at"], "recomputed": _state["recomputed"]}
+
+# --- Background job ---
+
+def _job_loop():
+    while True:
+        try:
+            refresh()
+        except Exception:
+            log.exception("At-risk refresh failed")
+        with _state_lock:
+            seen = _state["seq"]
+        wait_for_changes(seen, timeout=REFRESH_INTERVAL)
+
+def ensure_job():
+    global _job
+    with _state_lock:
+        if _job is None or not _job.is_alive():
+            _job = threading.Thread(target=_job_loop, name="at-risk", daemon=True)
+            _job.start()
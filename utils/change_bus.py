@@ -0,0 +1,56 @@
+# utils/change_bus.py
+
+import threading
+from collections import deque, namedtuple
+
+# In-process feed of committed changes to the shared grade frames. utils.sheets_api
+# publishes one event whenever a cached frame is patched (a save written through,
+# or rows that moved on a background refresh); sessions remember the last sequence
+# number they rendered and ask for anything newer, so an idle page can pick up
+# other people's edits from memory instead of re-reading Google Sheets.
+MAX_EVENTS = 2000
+
+# deltas is a list of {"pos", "kind", "values"} dicts, kind being "update", "insert"
+# or "delete"; None means the whole frame was replaced and positions are meaningless
+Event = namedtuple("Event", ["seq", "key", "version", "deltas"])
+
+_events = deque(maxlen=MAX_EVENTS)
+_seq = 0
+_changed = threading.Condition()
+
+def publish(key, version, deltas=None):
+    global _seq
+    with _changed:
+        _seq += 1
+        _events.append(Event(_seq, key, version, deltas))
+        _changed.notify_all()
+        return _seq
+
+def latest_seq():
+    with _changed:
+        return _seq
+
+def changes_since(seq, keys=None):
+    """(events newer than seq for `keys`, latest seq, complete).
+
+    complete is False when older events were already dropped from the buffer; the
+    caller missed something and should rebuild its view from the frame.
+    """
+    with _changed:
+        complete = not _events or _events[0].seq <= seq + 1
+        events = [e for e in _events if e.seq > seq and (keys is None or e.key in keys)]
+        return events, _seq, complete
+
+def wait_for_changes(seq, timeout=None):
+    # Blocks until something newer than seq is published; False on timeout
+    with _changed:
+        return _changed.wait_for(lambda: _seq > seq, timeout)
+
+def touched_positions(events):
+    """Frame positions changed by events; None if any event replaced the whole frame."""
+    positions = set()
+    for event in events:
+        if event.deltas is None:
+            return None
+        positions.update(d["pos"] for d in event.deltas)
+    return positions
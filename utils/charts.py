@@ -0,0 +1,42 @@
+# utils/charts.py
+
+import threading
+
+import pandas as pd
+from cachetools import LRUCache
+
+from utils import metrics
+from utils.analytics import BAND_COLORS, BAND_LABELS, grade_bands
+
+# Rendered Vega-Lite specs are plain dicts (a few KB each), keyed on
+# (student, assessment, data version) so reruns and other admins reuse them
+_specs = LRUCache(maxsize=512)
+_specs_lock = threading.Lock()
+
+def grade_bar_spec(grades, title):
+    """Vega-Lite spec for a per-subject grade bar chart, coloured by grade band."""
+    import altair as alt  # deferred: only needed on a cache miss
+    data = pd.DataFrame({"Subject": grades.index.astype(str), "Grade": grades.to_numpy(dtype=float)})
+    data["Band"] = grade_bands(data["Grade"]).astype(str)
+    base = alt.Chart(data).encode(
+        x=alt.X("Subject:N", sort=None, axis=alt.Axis(labelAngle=-30, labelFontSize=14, titleFontSize=16)),
+        y=alt.Y("Grade:Q", scale=alt.Scale(domain=[0, 100]), axis=alt.Axis(labelFontSize=14, titleFontSize=16)),
+    )
+    bars = base.mark_bar().encode(
+        color=alt.Color("Band:N", scale=alt.Scale(domain=BAND_LABELS, range=BAND_COLORS), legend=None),
+        tooltip=["Subject", "Grade", "Band"],
+    )
+    labels = base.mark_text(dy=-8, fontSize=14, fontWeight="bold").encode(text=alt.Text("Grade:Q", format=".0f"))
+    chart = (bars + labels).properties(title=alt.TitleParams(title, fontSize=22), height=420)
+    return chart.to_dict()
+
+def cached_grade_bar_spec(key, grades, title):
+    with _specs_lock:
+        spec = _specs.get(key)
+    metrics.count("cache_hits" if spec is not None else "cache_misses")
+    if spec is None:
+        with metrics.span("grade_bar_spec"):
+            spec = grade_bar_spec(grades, title)
+        with _specs_lock:
+            _specs[key] = spec
+    return spec
@@ -0,0 +1,273 @@
+# utils/grade_history.py
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+# Append-only log of every grade write (teacher dashboard, Excel entry path, student
+# submissions, Moodle sync): one row per changed cell with its key, old and new text,
+# actor and time. Triggers refuse UPDATE and DELETE on the log. Every
+# CHECKPOINT_EVERY changes to a (book, term) the state of its logged cells is
+# frozen to Parquet, so an as-of query replays at most that many changes.
+# A book is the grade table a change belongs to, e.g. "Grades3/Sheet2".
+DB_PATH = os.path.join("data", "grade_history.db")
+CHECKPOINT_DIR = os.path.join("data", "grade_history")
+CHECKPOINT_EVERY = 500
+KEY = ["student", "subject", "term", "assessment"]
+CELL = KEY + ["field"]
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+_checkpoints = LRUCache(maxsize=16)  # checkpoint path -> state frame (immutable)
+_checkpoints_lock = threading.Lock()
+_cells = LRUCache(maxsize=8)  # (source, term, fields) -> live cells in gradebook_cells layout
+_cells_lock = threading.Lock()
+_running = set()  # (book, term) checkpoints being written by this process
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, at REAL NOT NULL, book TEXT NOT NULL,
+    student TEXT, subject TEXT, term TEXT, assessment TEXT, field TEXT,
+    old TEXT, new TEXT, actor TEXT, source TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_changes_term ON changes (book, term, id);
+CREATE INDEX IF NOT EXISTS idx_changes_cell ON changes (book, student, subject, term, assessment, field, id);
+CREATE TRIGGER IF NOT EXISTS changes_no_update BEFORE UPDATE ON changes
+    BEGIN SELECT RAISE(ABORT, 'grade history is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS changes_no_delete BEFORE DELETE ON changes
+    BEGIN SELECT RAISE(ABORT, 'grade history is append-only'); END;
+-- First logged change of each cell: its value before logging began
+CREATE TABLE IF NOT EXISTS origins (
+    book TEXT, student TEXT, subject TEXT, term TEXT, assessment TEXT, field TEXT,
+    first_id INTEGER, at REAL, old TEXT,
+    PRIMARY KEY (book, student, subject, term, assessment, field)
+);
+CREATE INDEX IF NOT EXISTS idx_origins_term ON origins (book, term, at);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, book TEXT, term TEXT, upto_id INTEGER, at REAL, path TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_checkpoints ON checkpoints (book, term, at);
+"""
+
+def _conn():
+    path = DB_PATH
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    if path not in conns:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _init_lock:
+            if path not in _initialized:
+                conn.executescript(_SCHEMA)
+                _initialized.add(path)
+        conns[path] = conn
+    return conns[path]
+
+def _text(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _texts(series):
+    # _text for a whole column: converted once per distinct value, not per cell
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        series = pd.Series(series.to_numpy(dtype=float, na_value=np.nan))
+    codes, uniques = pd.factorize(series)
+    texts = np.array([_text(float(u) if isinstance(u, np.floating) else u) for u in uniques] + [None], dtype=object)
+    return texts[codes]  # code -1 (missing) picks the trailing None
+
+def record_changes(book, changes, actor=None, source=None):
+    """Log changed cells: each change is {"key": (student, subject, term, assessment), "field", "old", "new"}."""
+    if not changes:
+        return 0
+    now = time.time()
+    rows = [
+        (now, book, *(_text(k) or "" for k in c["key"]), c["field"], _text(c.get("old")), _text(c.get("new")),
+         actor, source)
+        for c in changes
+    ]
+    conn = _conn()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")  # no other writer between reading MAX(id) and inserting
+        first = conn.execute("SELECT COALESCE(MAX(id), 0) FROM changes").fetchone()[0]
+        conn.executemany(
+            "INSERT INTO changes (at, book, student, subject, term, assessment, field, old, new, actor, source)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.execute(
+            "INSERT OR IGNORE INTO origins SELECT book, student, subject, term, assessment, field, id, at, old"
+            " FROM changes WHERE id > ? ORDER BY id",
+            (first,),
+        )
+    for term in {r[4] for r in rows}:
+        maybe_checkpoint(book, term)
+    return len(rows)
+
+def cell_history(book=None, student=None, subject=None, term=None, assessment=None, limit=500):
+    """Who changed what and when, newest first, for the cells matching the given key parts."""
+    filters = {"book": book, "student": student, "subject": subject, "term": term, "assessment": assessment}
+    where = [f"{col} = ?" for col, value in filters.items() if value is not None]
+    params = [value for value in filters.values() if value is not None]
+    df = pd.read_sql_query(
+        f"SELECT id, at, book, {', '.join(CELL)}, old, new, actor, source FROM changes"
+        f"{' WHERE ' + ' AND '.join(where) if where else ''} ORDER BY id DESC LIMIT ?",
+        _conn(), params=params + [limit],
+    )
+    df["at"] = pd.to_datetime(df["at"], unit="s")
+    return df
+
+# --- Checkpoints ---
+
+def _slug(text):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", str(text)).strip("_") or "none"
+
+def _latest_checkpoint(conn, book, term, before=None):
+    sql = "SELECT upto_id, at, path FROM checkpoints WHERE book = ? AND term = ?"
+    params = [book, term]
+    if before is not None:
+        sql += " AND at <= ?"
+        params.append(before)
+    return conn.execute(sql + " ORDER BY upto_id DESC LIMIT 1", params).fetchone()
+
+def _read_checkpoint(path):
+    with _checkpoints_lock:
+        state = _checkpoints.get(path)
+    if state is None:
+        state = pd.read_parquet(path)
+        with _checkpoints_lock:
+            _checkpoints[path] = state
+    return state
+
+def _replay(state, changes):
+    # Latest value, writer and time of every cell; `changes` ordered by id
+    latest = changes.rename(columns={"new": "value", "id": "change_id"})[CELL + ["value", "change_id", "actor", "at"]]
+    if latest.empty:
+        return state
+    merged = pd.concat([state, latest], ignore_index=True) if len(state) else latest
+    return merged.drop_duplicates(CELL, keep="last")
+
+def _state_as_of(conn, book, term, when):
+    """(state of the logged cells at `when`, changes replayed on top of the checkpoint)."""
+    checkpoint = _latest_checkpoint(conn, book, term, when)
+    upto = checkpoint[0] if checkpoint else 0
+    state = (_read_checkpoint(checkpoint[2]) if checkpoint
+             else pd.DataFrame(columns=CELL + ["value", "change_id", "actor", "at"]))
+    changes = pd.read_sql_query(
+        f"SELECT id, {', '.join(CELL)}, new, actor, at FROM changes"
+        " WHERE book = ? AND term = ? AND id > ? AND at <= ? ORDER BY id",
+        conn, params=(book, term, upto, when),
+    )
+    return _replay(state, changes), len(changes)
+
+def checkpoint(book, term):
+    """Freeze the state of (book, term)'s logged cells up to the latest change; returns its path."""
+    conn = _conn()
+    previous = _latest_checkpoint(conn, book, term)
+    upto = previous[0] if previous else 0
+    state = (_read_checkpoint(previous[2]) if previous
+             else pd.DataFrame(columns=CELL + ["value", "change_id", "actor", "at"]))
+    changes = pd.read_sql_query(
+        f"SELECT id, {', '.join(CELL)}, new, actor, at FROM changes WHERE book = ? AND term = ? AND id > ? ORDER BY id",
+        conn, params=(book, term, upto),
+    )
+    if changes.empty:
+        return previous[2] if previous else None
+    state = _replay(state, changes)
+    last_id, last_at = int(changes["id"].iloc[-1]), float(changes["at"].iloc[-1])
+    target = os.path.join(CHECKPOINT_DIR, f"{_slug(book)}.{_slug(term)}.{last_id}.parquet")
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    state.to_parquet(tmp, index=False)
+    os.replace(tmp, target)
+    with conn:
+        conn.execute("INSERT INTO checkpoints (book, term, upto_id, at, path) VALUES (?, ?, ?, ?, ?)",
+                     (book, term, last_id, last_at, target))
+    return target
+
+def maybe_checkpoint(book, term, every=CHECKPOINT_EVERY):
+    """Start a background checkpoint once `every` changes have piled up since the last one."""
+    conn = _conn()
+    previous = _latest_checkpoint(conn, book, term)
+    pending = conn.execute(
+        "SELECT COUNT(*) FROM (SELECT 1 FROM changes WHERE book = ? AND term = ? AND id > ? LIMIT ?)",
+        (book, term, previous[0] if previous else 0, every),
+    ).fetchone()[0]
+    if pending < every:
+        return False
+    with _init_lock:
+        if (book, term) in _running:
+            return False
+        _running.add((book, term))
+
+    def run():
+        try:
+            checkpoint(book, term)
+        finally:
+            with _init_lock:
+                _running.discard((book, term))
+
+    threading.Thread(target=run, name="grade-history-checkpoint", daemon=True).start()
+    return True
+
+# --- As-of queries ---
+
+def gradebook_cells(df, fields, term=None, key_cols=("NAME", "Subject", "Term", "Assessment Type"), source=None):
+    """A grade frame (only `term`'s rows, if given) in the log's long (cell, value)
+    layout, values as sheet text. Memoized per `source` (e.g. sheet name + data version)."""
+    cache_key = (source, None if term is None else str(term), tuple(fields))
+    if source is not None:
+        with _cells_lock:
+            cells = _cells.get(cache_key)
+        if cells is not None:
+            return cells
+    key_cols = list(key_cols)
+    if term is not None:
+        df = df[(df[key_cols[2]] == term).to_numpy(dtype=bool)]
+    keys = {col: pd.Series(_texts(df[key])).fillna("").to_numpy() for col, key in zip(KEY, key_cols)}
+    cells = pd.DataFrame({
+        **{col: np.tile(values, len(fields)) for col, values in keys.items()},
+        "field": np.repeat(list(fields), len(df)),
+        "value": np.concatenate([_texts(df[field]) for field in fields]) if fields else [],
+    })
+    if source is not None:
+        with _cells_lock:
+            _cells[cache_key] = cells
+    return cells
+
+def as_of(book, term, when, live=None, fields=("Grade",), source=None):
+    """The term's gradebook as it stood at `when` (a datetime or epoch seconds).
+
+    Cells changed by `when` come from the nearest checkpoint plus the changes after
+    it; cells first changed later get the value they had before that change; every
+    other cell is taken from `live` (the live grade frame, read through
+    gradebook_cells with `source`), since nothing logged has touched it.
+    Returns (wide frame, info); info["ms"] includes reading the live frame.
+    """
+    started = time.perf_counter()
+    when = pd.Timestamp(when).timestamp() if not isinstance(when, (int, float)) else when
+    conn = _conn()
+    state, replayed = _state_as_of(conn, book, term, when)
+    later = pd.read_sql_query(
+        f"SELECT {', '.join(CELL)}, old AS value FROM origins WHERE book = ? AND term = ? AND at > ?",
+        conn, params=(book, term, when),
+    )
+    parts = [gradebook_cells(live, fields, term=term, source=source)] if live is not None else []
+    parts += [later, state[CELL + ["value"]]]
+    cells = pd.concat([p for p in parts if len(p)] or [later], ignore_index=True).drop_duplicates(CELL, keep="last")
+    wide = cells.pivot(index=KEY, columns="field", values="value").reset_index()
+    wide.columns.name = None
+    info = {"replayed": replayed, "changed_cells": len(state), "ms": (time.perf_counter() - started) * 1000}
+    return wide, info
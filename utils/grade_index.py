@@ -0,0 +1,89 @@
+# utils/grade_index.py
+
+import threading
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+_indexes = LRUCache(maxsize=16)
+_indexes_lock = threading.Lock()
+
+def normalize_key(series):
+    # Emails and names are typed by hand in the sheet; compare them trimmed and lowercased
+    return series.astype("string").str.strip().str.lower()
+
+class GradeIndex:
+    """Row-offset lookup over a grade frame for a fixed, ordered list of key columns.
+
+    Built once per data version, or extended in place when rows are only appended.
+    rows(*prefix) returns the slice for any key prefix (e.g. just the teacher, or
+    teacher + subject + term) without scanning the frame, and options(*prefix) lists
+    the values available at the next level for sidebars.
+    """
+
+    def __init__(self, df, keys, normalize=()):
+        self.df = df
+        self.keys = list(keys)
+        self.normalize = set(normalize)
+        self._offsets = [{} for _ in self.keys]
+        self._children = {}
+        self._add(df, 0)
+
+    def _add(self, df, start):
+        # Index df's rows from position `start` on, appending to the existing groups
+        rows = df.iloc[start:]
+        keyframe = pd.DataFrame(
+            {
+                col: (normalize_key(rows[col]) if col in self.normalize else rows[col]).astype("category").array
+                for col in self.keys
+            },
+            index=pd.RangeIndex(len(rows)),
+        )
+        for depth in range(1, len(self.keys) + 1):
+            groups = keyframe.groupby(self.keys[:depth], sort=False, observed=True).indices
+            offsets = self._offsets[depth - 1]
+            for k, positions in groups.items():
+                key = k if isinstance(k, tuple) else (k,)
+                positions = positions + start if start else positions
+                if key in offsets:
+                    offsets[key] = np.concatenate([offsets[key], positions])
+                else:
+                    offsets[key] = positions
+                    self._children.setdefault(key[:-1], []).append(key[-1])
+
+    def extend(self, df):
+        """Take over df, the indexed frame with rows appended, indexing only the new rows."""
+        start = len(self.df)
+        # Swap the frame first: lookups made meanwhile still find their rows in it
+        self.df = df
+        self._add(df, start)
+
+    def _key(self, prefix):
+        return tuple(
+            str(v).strip().lower() if col in self.normalize else v
+            for col, v in zip(self.keys, prefix)
+        )
+
+    def positions(self, *prefix):
+        if not prefix:
+            return np.arange(len(self.df))
+        return self._offsets[len(prefix) - 1].get(self._key(prefix), np.empty(0, dtype=np.intp))
+
+    def rows(self, *prefix):
+        return self.df.take(self.positions(*prefix))
+
+    def options(self, *prefix):
+        # Next-level values in order of first appearance
+        return list(self._children.get(self._key(prefix), []))
+
+def get_grade_index(df, keys, normalize=(), source=None):
+    """Shared GradeIndex for df, rebuilt only when `source` (e.g. name + data version) changes."""
+    cache_key = (source if source is not None else id(df), tuple(keys), tuple(normalize))
+    with _indexes_lock:
+        index = _indexes.get(cache_key)
+    if index is None or index.df is not df:
+        index = GradeIndex(df, keys, normalize)
+        with _indexes_lock:
+            _indexes[cache_key] = index
+    return index
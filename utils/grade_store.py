@@ -0,0 +1,176 @@
+# utils/grade_store.py
+
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from utils.grade_history import record_changes
+from utils.grade_index import GradeIndex
+from utils.term_locks import check_unlocked
+
+# Local store for the Excel-based entry path (pages/teacher_page.py). Submissions are
+# single-row INSERTs into SQLite in WAL mode, so concurrent teachers never overwrite
+# each other; the workbook is regenerated from the table by periodic compaction.
+DB_PATH = os.path.join("data", "grades.db")
+GRADES_XLSX = "Grades3.xlsx"
+GRADES_PARQUET = os.path.join("data", "grades.parquet")
+COMPACT_INTERVAL = 600  # seconds between workbook/Parquet exports
+TABLE = "grade_entries"
+ENTRY_COLUMNS = [
+    "NAME", "Subject", "Subject Teacher", "Assessment Type", "Grade",
+    "Assessment Period", "Date Submitted", "Comments",
+]
+HISTORY_KEY = ["NAME", "Subject", "Assessment Type", "Assessment Period"]  # one assessment's entries
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+_master = {"path": None, "df": None, "last_id": 0, "indexes": {}}  # see master_entries
+_master_lock = threading.Lock()
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def _create(conn, xlsx_path):
+    # Seed from the existing workbook once, keeping all of its columns
+    seed = pd.read_excel(xlsx_path) if os.path.exists(xlsx_path) else pd.DataFrame(columns=ENTRY_COLUMNS)
+    columns = list(seed.columns) + [c for c in ENTRY_COLUMNS if c not in seed.columns]
+    defs = ", ".join(f"{_quote(c)} {'REAL' if c == 'Grade' else 'TEXT'}" for c in columns)
+    conn.execute(f"CREATE TABLE {TABLE} (id INTEGER PRIMARY KEY AUTOINCREMENT, {defs})")
+    conn.execute(f"CREATE INDEX idx_teacher ON {TABLE} ({_quote('Subject Teacher')}, id)")
+    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+    if not seed.empty:
+        seed = seed.astype(object).where(seed.notna(), None)
+        seed = seed.map(lambda v: v.isoformat(sep=" ") if hasattr(v, "isoformat") else v)
+        placeholders = ", ".join("?" * len(seed.columns))
+        conn.executemany(
+            f"INSERT INTO {TABLE} ({', '.join(map(_quote, seed.columns))}) VALUES ({placeholders})",
+            seed.itertuples(index=False, name=None),
+        )
+    conn.execute("INSERT INTO meta VALUES ('last_compacted', ?)", (str(time.time()),))
+
+def get_connection(path=DB_PATH, xlsx_path=GRADES_XLSX):
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    if path not in conns:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = _connect(path)
+        with _init_lock:
+            if path not in _initialized:
+                # BEGIN IMMEDIATE makes exactly one process create and seed the table
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    exists = conn.execute(
+                        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (TABLE,)
+                    ).fetchone()
+                    if not exists:
+                        _create(conn, xlsx_path)
+                    # append_entry's lookup of the entry a submission replaces; stores
+                    # created before it get the index on their next start
+                    conn.execute(
+                        f"CREATE INDEX IF NOT EXISTS idx_history ON {TABLE}"
+                        f" ({', '.join(map(_quote, HISTORY_KEY))}, id)"
+                    )
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                _initialized.add(path)
+        conns[path] = conn
+    return conns[path]
+
+def append_entry(entry, path=DB_PATH):
+    """Insert one submission (O(1), safe under concurrent writers); returns its id."""
+    check_unlocked(entry.get("Assessment Period"))
+    conn = get_connection(path)
+    cols = list(entry)
+    key = [entry.get(c) for c in HISTORY_KEY]
+    with conn:
+        # The newest earlier entry for the same assessment is what this one replaces
+        previous = conn.execute(
+            f"SELECT {_quote('Grade')}, {_quote('Comments')} FROM {TABLE}"
+            f" WHERE {' AND '.join(f'{_quote(c)} = ?' for c in HISTORY_KEY)} ORDER BY id DESC LIMIT 1",
+            key,
+        ).fetchone() or (None, None)
+        cur = conn.execute(
+            f"INSERT INTO {TABLE} ({', '.join(map(_quote, cols))}) VALUES ({', '.join('?' * len(cols))})",
+            [entry[c] for c in cols],
+        )
+    record_changes("grade_store", [
+        {"key": (key[0], key[1], key[3], key[2]), "field": field, "old": old, "new": entry.get(field)}
+        for field, old in zip(("Grade", "Comments"), previous) if field in entry and old != entry[field]
+    ], actor=entry.get("Subject Teacher"), source="teacher_page")
+    return cur.lastrowid
+
+def load_entries(path=DB_PATH):
+    df = pd.read_sql_query(f"SELECT * FROM {TABLE} ORDER BY id", get_connection(path))
+    return df.drop(columns="id")
+
+def entries_since(last_id, path=DB_PATH):
+    # Rows are only ever appended, so everything new has a higher id (a primary key seek)
+    return pd.read_sql_query(f"SELECT * FROM {TABLE} WHERE id > ? ORDER BY id", get_connection(path),
+                             params=(last_id,))
+
+def master_entries(index_keys=(), path=DB_PATH):
+    """(all entries, {keys: GradeIndex}) shared by every session in the process.
+
+    Each call reads only the rows added since the previous one, appends them to the
+    in-memory frame and indexes just those rows, so a render costs O(new rows).
+    """
+    with _master_lock:
+        if _master["path"] != path:
+            _master.update(path=path, df=None, last_id=0, indexes={})
+        new = entries_since(_master["last_id"], path)
+        if _master["df"] is None or not new.empty:
+            last_id = int(new["id"].iloc[-1]) if not new.empty else _master["last_id"]
+            new = new.drop(columns="id")
+            df = new if _master["df"] is None or _master["df"].empty else pd.concat(
+                [_master["df"], new], ignore_index=True)
+            for index in _master["indexes"].values():
+                index.extend(df)
+            _master.update(df=df, last_id=last_id)
+        df, indexes = _master["df"], _master["indexes"]
+        for keys in map(tuple, index_keys):
+            if keys not in indexes:
+                indexes[keys] = GradeIndex(df, keys)
+        return df, {keys: indexes[tuple(keys)] for keys in map(tuple, index_keys)}
+
+def recent_entries(teacher, limit=5, path=DB_PATH):
+    return pd.read_sql_query(
+        f"SELECT * FROM {TABLE} WHERE {_quote('Subject Teacher')} = ? ORDER BY id DESC LIMIT ?",
+        get_connection(path), params=(teacher, limit),
+    ).drop(columns="id")
+
+def compact(path=DB_PATH, xlsx_path=GRADES_XLSX, parquet_path=GRADES_PARQUET):
+    """Rewrite the workbook and a Parquet copy from the table (write to temp, then rename)."""
+    df = load_entries(path)
+    for target, write in ((xlsx_path, df.to_excel), (parquet_path, df.to_parquet)):
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        root, ext = os.path.splitext(target)
+        tmp = f"{root}.{os.getpid()}.tmp{ext}"
+        write(tmp, index=False)
+        os.replace(tmp, target)
+
+def maybe_compact(path=DB_PATH, interval=COMPACT_INTERVAL):
+    """Start a background compaction if the last one is older than `interval` seconds."""
+    conn = get_connection(path)
+    now = time.time()
+    with conn:
+        # Claim the slot atomically so only one session/process compacts at a time
+        claimed = conn.execute(
+            "UPDATE meta SET value = ? WHERE key = 'last_compacted' AND CAST(value AS REAL) < ?",
+            (str(now), now - interval),
+        ).rowcount
+    if claimed:
+        threading.Thread(target=compact, args=(path,), name="grade-store-compact", daemon=True).start()
+    return bool(claimed)
@@ -0,0 +1,83 @@
+# utils/grid.py
+
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from cachetools import LRUCache
+
+PAGE_SIZE = 50
+
+# Per data version: a lowercased search blob per row and sort orders per column
+_derived = LRUCache(maxsize=32)
+_derived_lock = threading.Lock()
+
+def _cached(key, build):
+    with _derived_lock:
+        value = _derived.get(key)
+    if value is None:
+        value = build()
+        with _derived_lock:
+            _derived[key] = value
+    return value
+
+def _search_blob(df):
+    blob = df.iloc[:, 0].astype(str)
+    for col in df.columns[1:]:
+        blob = blob + "\x1f" + df[col].astype(str)
+    return blob.str.lower().reset_index(drop=True)
+
+def _sort_order(df, col):
+    # Numbers sort numerically even though the sheet stores them as text
+    values = df[col]
+    numbers = pd.to_numeric(values, errors="coerce")
+    filled = values.notna() & (values.astype(str) != "")
+    if filled.any() and numbers[filled].notna().all():
+        keys = numbers.to_numpy()
+    else:
+        keys = values.astype(str).str.lower().to_numpy()
+    return np.argsort(keys, kind="stable")
+
+def paged_grid(df, key, source=None, page_size=PAGE_SIZE):
+    """Read-only grid that sends only the visible page of rows to the browser.
+
+    Search and sort run on the server against the cached frame; pass `source`
+    (e.g. sheet name + data version) so the search index and sort orders are reused.
+    """
+    source = source if source is not None else id(df)
+    c1, c2, c3 = st.columns([3, 2, 1])
+    query = c1.text_input("Search", key=f"{key}_query", placeholder="Name, subject, term...").strip().lower()
+    sort_col = c2.selectbox("Sort by", ["(sheet order)"] + list(df.columns), key=f"{key}_sort")
+    descending = c3.toggle("Desc", key=f"{key}_desc")
+
+    positions = np.arange(len(df))
+    if sort_col != "(sheet order)":
+        positions = _cached((source, "sort", sort_col), lambda: _sort_order(df, sort_col))
+        if descending:
+            positions = positions[::-1]
+    if query:
+        blob = _cached((source, "blob"), lambda: _search_blob(df))
+        matches = blob.iloc[positions].str.contains(query, regex=False).to_numpy()
+        positions = positions[matches]
+
+    pages = max(1, -(-len(positions) // page_size))
+    page_key = f"{key}_page"
+    # Start from the first page whenever the filter or sort changes
+    view = (query, sort_col, descending)
+    if st.session_state.get(f"{key}_view") != view:
+        st.session_state[f"{key}_view"] = view
+        st.session_state[page_key] = 1
+    page = min(st.session_state.get(page_key, 1), pages)
+
+    start = (page - 1) * page_size
+    st.dataframe(df.iloc[positions[start:start + page_size]], use_container_width=True)
+
+    p1, p2, p3 = st.columns([1, 2, 1])
+    if p1.button("◀ Previous", key=f"{key}_prev", disabled=page <= 1):
+        st.session_state[page_key] = page - 1
+        st.rerun()
+    p2.caption(f"Page {page} of {pages} · {len(positions)} row(s)")
+    if p3.button("Next ▶", key=f"{key}_next", disabled=page >= pages):
+        st.session_state[page_key] = page + 1
+        st.rerun()
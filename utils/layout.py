@@ -2,7 +2,10 @@
 
 import streamlit as st
 
+from utils.metrics import begin_page, first_render
+
 def apply_common_layout(page_key: str, title: str, subtitle: str):
+    begin_page(page_key)
     st.set_page_config(page_title=title, layout="wide")
 
     # Sidebar styling with logo and active highlight
@@ -36,7 +39,8 @@ def apply_common_layout(page_key: str, title: str, subtitle: str):
             "parent_portal": "Parent Portal",
             "student_view": "Student View",
             "teacher_input": "Teacher Input",
-            "teacher_page": "Teacher Page"
+            "teacher_page": "Teacher Page",
+            "metrics": "Metrics"
         }
 
         for key, name in pages.items():
@@ -56,3 +60,5 @@ def apply_common_layout(page_key: str, title: str, subtitle: str):
         """,
         unsafe_allow_html=True
     )
+    # Sidebar and header are the page shell; everything after this may wait on data
+    first_render()
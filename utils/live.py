@@ -0,0 +1,37 @@
+# utils/live.py
+
+import streamlit as st
+
+from utils.change_bus import changes_since, latest_seq, touched_positions
+
+POLL_INTERVAL = 3  # seconds between checks of the change feed (memory only, no Sheets calls)
+
+def mark_rendered(name):
+    """Call before reading the shared frame: this run's view includes every change so far."""
+    st.session_state[f"{name}_seq"] = latest_seq()
+    notice = st.session_state.pop(f"{name}_notice", None)
+    if notice:
+        st.toast(notice)
+
+def watch_changes(name, keys, positions=None, interval=POLL_INTERVAL):
+    """Rerun the page when a committed change touches what this session is showing.
+
+    `keys` are the (spreadsheet, worksheet, numeric) frames the page reads and
+    `positions` the frame rows it displays (None: any change counts). Changes the
+    page does not show only move this session's cursor forward.
+    """
+    state_key = f"{name}_seq"
+
+    @st.fragment(run_every=interval)
+    def _watch():
+        seen = st.session_state.get(state_key, latest_seq())
+        events, latest, complete = changes_since(seen, keys)
+        st.session_state[state_key] = latest
+        if complete and not events:
+            return
+        touched = touched_positions(events)
+        if not complete or touched is None or positions is None or touched & set(positions):
+            st.session_state[f"{name}_notice"] = "Grades were updated elsewhere; showing the latest values."
+            st.rerun()
+
+    _watch()
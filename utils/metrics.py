@@ -0,0 +1,174 @@
+# utils/metrics.py
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Per-render performance records. Streamlit runs each session's script in its own
+# thread, so the record being filled is kept thread-local; work done in background
+# threads (snapshot sync, write queue) is attributed to "background".
+METRICS_LOG = os.path.join("data", "metrics.jsonl")
+MAX_RECORDS = 2000
+PROCESS_STARTED = time.time()  # first import of this module, i.e. server start
+
+_records = deque(maxlen=MAX_RECORDS)
+_lock = threading.Lock()
+_local = threading.local()
+_counters = defaultdict(float)  # (name, page) -> running total, for Prometheus counters
+_spans = defaultdict(lambda: [0, 0.0])  # (name, page) -> [count, seconds]
+_cold = True  # no page has rendered in this process yet
+
+def _new_record(page):
+    return {
+        "page": page, "started": time.time(), "ms": 0.0, "first_render_ms": None, "finished": False,
+        "spans": defaultdict(float), "counters": defaultdict(int),
+        "thread": threading.current_thread(),
+    }
+
+def _current():
+    return getattr(_local, "record", None)
+
+def _page():
+    record = _current()
+    return record["page"] if record is not None else "background"
+
+def _log(record):
+    try:
+        os.makedirs(os.path.dirname(METRICS_LOG) or ".", exist_ok=True)
+        with open(METRICS_LOG, "a") as f:
+            f.write(json.dumps(_public(record)) + "\n")
+    except OSError:
+        pass  # metrics must never break a page
+
+def _public(record):
+    return {k: dict(v) if isinstance(v, defaultdict) else v for k, v in record.items() if k != "thread"}
+
+def _finish(record, now=None):
+    # Without an explicit end_page the render time is up to the last finished span
+    if record["finished"]:
+        return
+    record["finished"] = True
+    if now is not None:
+        record["ms"] = round((now - record["started"]) * 1000, 1)
+    _log(record)
+
+def begin_page(page):
+    """Start the render record for this script run (called from apply_common_layout)."""
+    # Each rerun gets a fresh script thread; records of runs that have ended are logged here
+    with _lock:
+        done = [r for r in _records if not r["finished"] and not r["thread"].is_alive()]
+    for previous in done:
+        _finish(previous)
+    record = _new_record(page)
+    _local.record = record
+    with _lock:
+        _records.append(record)
+    count("page_renders")
+    return record
+
+def first_render():
+    """Mark the page shell as drawn; the time since begin_page is the time to first render."""
+    record = _current()
+    if record is not None and record["first_render_ms"] is None:
+        record["first_render_ms"] = round((time.time() - record["started"]) * 1000, 1)
+        global _cold
+        with _lock:
+            cold, _cold = _cold, False
+        if cold:
+            # The very first render of this process also pays for imports and warm-up
+            record["cold_start_ms"] = round((time.time() - PROCESS_STARTED) * 1000, 1)
+
+def end_page():
+    record = _current()
+    if record is not None:
+        _finish(record, time.time())
+        _local.record = None
+
+def count(name, value=1):
+    page = _page()
+    record = _current()
+    if record is not None:
+        record["counters"][name] += value
+    with _lock:
+        _counters[(name, page)] += value
+
+@contextmanager
+def span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        record = _current()
+        if record is not None:
+            record["spans"][name] += round(elapsed * 1000, 3)
+            record["ms"] = round((time.time() - record["started"]) * 1000, 1)
+        with _lock:
+            totals = _spans[(name, _page())]
+            totals[0] += 1
+            totals[1] += elapsed
+
+# --- Reporting ---
+
+def recent_records():
+    with _lock:
+        return [_public(r) for r in _records]
+
+def page_summary():
+    """Per page: renders, p50/p95 render ms, Sheets calls, quota errors, cache hit ratio."""
+    import pandas as pd
+
+    records = recent_records()
+    if not records:
+        return pd.DataFrame()
+    df = pd.DataFrame({
+        "page": [r["page"] for r in records],
+        "ms": [r["ms"] for r in records],
+        "first_render_ms": [r.get("first_render_ms") for r in records],
+        "sheets_calls": [r["counters"].get("sheets_api_calls", 0) for r in records],
+        "quota_errors": [r["counters"].get("sheets_quota_errors", 0) for r in records],
+        "cache_hits": [r["counters"].get("cache_hits", 0) for r in records],
+        "cache_misses": [r["counters"].get("cache_misses", 0) for r in records],
+    })
+    summary = df.groupby("page").agg(
+        renders=("ms", "size"),
+        p50_ms=("ms", "median"),
+        p95_ms=("ms", lambda s: s.quantile(0.95)),
+        p50_first_render_ms=("first_render_ms", "median"),
+        p95_first_render_ms=("first_render_ms", lambda s: s.quantile(0.95)),
+        sheets_calls=("sheets_calls", "sum"),
+        quota_errors=("quota_errors", "sum"),
+        cache_hits=("cache_hits", "sum"),
+        cache_misses=("cache_misses", "sum"),
+    )
+    lookups = summary["cache_hits"] + summary["cache_misses"]
+    summary["cache_hit_ratio"] = (summary["cache_hits"] / lookups.where(lookups > 0)).round(3)
+    return summary.round(1).reset_index()
+
+def span_summary():
+    import pandas as pd
+
+    with _lock:
+        rows = [(name, page, n, total * 1000 / n) for (name, page), (n, total) in _spans.items() if n]
+    return pd.DataFrame(rows, columns=["span", "page", "calls", "avg_ms"]).round(1)
+
+def prometheus_text():
+    """Prometheus text exposition of the process-wide counters and span timings."""
+    def labels(**kv):
+        return "{" + ",".join(f'{k}="{v}"' for k, v in kv.items()) + "}"
+
+    with _lock:
+        counters = dict(_counters)
+        spans = {k: tuple(v) for k, v in _spans.items()}
+    lines = []
+    for metric in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE chhs_{metric}_total counter")
+        lines += [f"chhs_{metric}_total{labels(page=p)} {v:g}" for (n, p), v in counters.items() if n == metric]
+    lines.append("# TYPE chhs_span_seconds summary")
+    for (name, page), (n, total) in spans.items():
+        lines.append(f"chhs_span_seconds_count{labels(span=name, page=page)} {n}")
+        lines.append(f"chhs_span_seconds_sum{labels(span=name, page=page)} {total:.6f}")
+    return "\n".join(lines) + "\n"
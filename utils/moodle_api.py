@@ -0,0 +1,300 @@
+# utils/moodle_api.py
+
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.sheets_api import REV_COLUMN, ROW_KEY, cell_text, update_cells_checked
+
+# Moodle is the official grade source; Sheet2 rows are identified by this key
+SHEET_KEY = ROW_KEY
+MAX_CONNECTIONS = 8  # concurrent requests (and pooled connections) against Moodle
+REQUEST_TIMEOUT = 30  # seconds
+RETRIES = 3  # for 429/502/503 answers, on top of the first attempt
+RETRY_BACKOFF = 0.5  # seconds, doubled on every retry after the second attempt
+
+# Reconciliation: both grade sets are split into this many hash partitions of the row
+# key and merged partition by partition. Every run's changelog is appended to
+# AUDIT_LOG; BASELINE_PATH keeps the Moodle grades of the last applied sync.
+PARTITIONS = 16
+AUDIT_LOG = os.path.join("data", "moodle_audit.jsonl")
+BASELINE_PATH = os.path.join("data", "moodle_baseline.parquet")
+CHANGELOG_COLUMNS = ["kind", *SHEET_KEY, "row", "sheet", "moodle", "baseline"]
+
+class MoodleError(Exception):
+    pass
+
+class MoodleClient:
+    """Minimal client for Moodle's REST web services (webservice/rest/server.php).
+
+    base_url can point at a local stub server for testing.
+    """
+
+    def __init__(self, base_url, token, max_connections=MAX_CONNECTIONS):
+        self.url = base_url.rstrip("/") + "/webservice/rest/server.php"
+        self.token = token
+        self.max_connections = max_connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max_connections,
+            max_retries=Retry(total=RETRIES, backoff_factor=RETRY_BACKOFF, status_forcelist=[429, 502, 503],
+                              allowed_methods=None),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def call(self, function, **params):
+        data = {"wstoken": self.token, "wsfunction": function, "moodlewsrestformat": "json", **params}
+        response = self.session.post(self.url, data=data, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        body = response.json()
+        # Moodle reports web service errors with HTTP 200 and an exception payload
+        if isinstance(body, dict) and "exception" in body:
+            raise MoodleError(f"{function}: {body.get('message', body['exception'])}")
+        return body
+
+    def get_courses(self):
+        # Course id 1 is the site front page, not a real course
+        return [c for c in self.call("core_course_get_courses") if c.get("id") != 1]
+
+    def get_course_grades(self, course_id):
+        # One request returns every enrolled student's grade items for the course
+        return self.call("gradereport_user_get_grade_items", courseid=course_id)["usergrades"]
+
+# --- Grade extraction ---
+
+def course_grades_frame(course, usergrades, term, subject_map=None, item_map=None):
+    """Flatten one course's grade report into Sheet2-shaped rows."""
+    subject = (subject_map or {}).get(course["shortname"], course["fullname"])
+    rows = []
+    for user in usergrades:
+        for item in user.get("gradeitems", []):
+            if item.get("itemtype") == "course" or item.get("graderaw") is None:
+                continue
+            name = item.get("itemname") or ""
+            grade = item["graderaw"]
+            if item.get("grademax"):
+                grade = round(grade / item["grademax"] * 100, 1)
+            rows.append((user["userfullname"], subject, term, (item_map or {}).get(name, name), grade))
+    return pd.DataFrame(rows, columns=SHEET_KEY + ["Grade"])
+
+def iter_course_grades(client, courses, term, subject_map=None, item_map=None):
+    """Yield (course, frame, error) as each course's grade report arrives."""
+    with ThreadPoolExecutor(max_workers=client.max_connections) as pool:
+        futures = {pool.submit(client.get_course_grades, c["id"]): c for c in courses}
+        for future in as_completed(futures):
+            course = futures[future]
+            try:
+                frame = course_grades_frame(course, future.result(), term, subject_map, item_map)
+                yield course, frame, None
+            except (requests.RequestException, MoodleError, KeyError) as e:
+                yield course, None, e
+
+# --- Reconciliation ---
+
+def _key_text(values):
+    # Key columns repeat a few thousand names/subjects: strip each distinct value once
+    codes, uniques = pd.factorize(values)
+    stripped = np.append(pd.Index(uniques).astype(str).str.strip().to_numpy(dtype=object), "")
+    return stripped[codes]  # code -1 (blank) picks the trailing ""
+
+def _keyed(df, col, partitions):
+    # Normalized key text, the grade as a number and a hash partition per row
+    keys = pd.DataFrame({k: _key_text(df[k]) for k in SHEET_KEY})
+    keys["_value"] = pd.to_numeric(df[col], errors="coerce").round(1).to_numpy()
+    # 64-bit fingerprint of the key: partitions and merges work on this one column
+    keys["_hash"] = pd.util.hash_pandas_object(keys[SHEET_KEY], index=False).to_numpy()
+    keys["_part"] = keys["_hash"] % partitions
+    return keys
+
+def _same(a, b):
+    return (a == b) | (a.isna() & b.isna())
+
+def _classify(merged):
+    found = merged["_pos"].notna()
+    has_base = merged["baseline"].notna()
+    sheet_edited = has_base & ~_same(merged["sheet"], merged["baseline"])
+    moodle_moved = ~has_base | ~_same(merged["moodle"], merged["baseline"])
+    # A grade edited in the sheet since the last sync is kept unless Moodle changed it too
+    kind = np.select(
+        [~found, _same(merged["moodle"], merged["sheet"]), sheet_edited & moodle_moved, sheet_edited],
+        ["insert", "", "conflict", ""], default="update",
+    )
+    return merged.assign(kind=kind)[kind != ""]
+
+def reconcile(sheet_df, moodle_df, baseline=None, col="Grade", partitions=PARTITIONS):
+    """Changelog of the Moodle grades that differ from the sheet.
+
+    Both sides (and the grades applied by the last sync, if given) are keyed on
+    NAME/Subject/Term/Assessment Type and split into hash partitions that are merged
+    independently. kind is "insert" (no sheet row), "update" (sheet still holds what
+    the last sync wrote, or there was no sync yet) or "conflict" (sheet and Moodle
+    both changed since). row is the sheet row number of the matching row.
+    """
+    sheet = _keyed(sheet_df, col, partitions).assign(_pos=np.arange(len(sheet_df)))
+    sheet = sheet.drop_duplicates("_hash")[["_hash", "_part", "_pos", "_value"]]  # duplicated rows: the first wins
+    moodle = _keyed(moodle_df, col, partitions).drop_duplicates("_hash", keep="last")
+    if baseline is not None and not baseline.empty:
+        base = _keyed(baseline, col, partitions)[["_hash", "_part", "_value"]]
+    else:
+        base = pd.DataFrame({"_hash": pd.Series(dtype="uint64"), "_part": pd.Series(dtype="uint64"),
+                             "_value": pd.Series(dtype=float)})
+    sheet_parts = dict(list(sheet.groupby("_part", sort=False)))
+    base_parts = dict(list(base.groupby("_part", sort=False)))
+
+    changes = []
+    for part, rows in moodle.groupby("_part", sort=False):
+        merged = rows.rename(columns={"_value": "moodle"}).merge(
+            sheet_parts.get(part, sheet.iloc[:0]).drop(columns="_part").rename(columns={"_value": "sheet"}),
+            on="_hash", how="left",
+        ).merge(
+            base_parts.get(part, base.iloc[:0]).drop(columns="_part").rename(columns={"_value": "baseline"}),
+            on="_hash", how="left",
+        )
+        changes.append(_classify(merged))
+    if not changes:
+        return pd.DataFrame(columns=CHANGELOG_COLUMNS)
+    log = pd.concat(changes, ignore_index=True)
+    log["row"] = (log["_pos"] + 2).astype("Int64")
+    return log[CHANGELOG_COLUMNS].sort_values(["kind"] + SHEET_KEY, ignore_index=True)
+
+def load_baseline():
+    try:
+        return pd.read_parquet(BASELINE_PATH)
+    except (OSError, ValueError):
+        return None
+
+def save_baseline(synced, baseline=None):
+    # Moodle grades the sheet now agrees with; later syncs tell hand edits from Moodle changes with it
+    frame = pd.concat([baseline, synced], ignore_index=True) if baseline is not None else synced
+    frame = frame[SHEET_KEY + ["Grade"]].drop_duplicates(SHEET_KEY, keep="last")
+    os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+    tmp = f"{BASELINE_PATH}.{os.getpid()}.tmp"
+    frame.to_parquet(tmp, index=False)
+    os.replace(tmp, BASELINE_PATH)
+
+def write_audit(run, changelog):
+    """Append one run record and its changelog entries to the audit log (JSON lines)."""
+    os.makedirs(os.path.dirname(AUDIT_LOG), exist_ok=True)
+    entries = changelog.astype(object).where(changelog.notna(), None).to_dict("records")
+    with open(AUDIT_LOG, "a") as f:
+        f.write(json.dumps({"type": "run", **run}, default=str) + "\n")
+        for entry in entries:
+            f.write(json.dumps({"type": "change", "run": run["id"], **entry}, default=str) + "\n")
+
+# --- Sync ---
+
+def fetch_moodle_grades(client, term, subject_map=None, item_map=None, progress=None):
+    """(grades, courses, errors): every course's grades as one Sheet2-shaped frame.
+
+    Courses are fetched concurrently; progress(done, total, course) is called as each arrives.
+    """
+    courses = client.get_courses()
+    frames, errors = [], []
+    for done, (course, frame, error) in enumerate(
+        iter_course_grades(client, courses, term, subject_map, item_map), start=1
+    ):
+        if error is not None:
+            errors.append((course["fullname"], str(error)))
+        else:
+            frames.append(frame)
+        if progress is not None:
+            progress(done, len(courses), course)
+    grades = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=SHEET_KEY + ["Grade"])
+    return grades, len(courses), errors
+
+def apply_changelog(changelog, sheet_df, spreadsheet_name, worksheet_name, kinds=("update", "insert")):
+    """Write the entries of `kinds`: only the differing Grade cells, plus appended rows for inserts.
+
+    Returns (summary, changelog with an "applied" column: True/False, None when not chosen).
+    """
+    from utils.term_locks import is_locked
+    from utils.write_queue import enqueue_row
+
+    changelog = changelog.assign(applied=None)
+    summary = {"updated": 0, "inserted": 0, "failed_cells": 0, "conflicts": [], "errors": []}
+    chosen = changelog["kind"].isin(kinds)
+    cells = changelog[chosen & (changelog["kind"] != "insert")]
+    inserts = changelog[chosen & (changelog["kind"] == "insert")]
+
+    if not cells.empty:
+        col_number = sheet_df.columns.get_loc("Grade") + 1
+        changes = [(int(row) - 2, "Grade", int(row), col_number, value)
+                   for row, value in zip(cells["row"], cells["moodle"])]
+        written, write_error, conflicts = update_cells_checked(spreadsheet_name, worksheet_name, sheet_df, changes,
+                                                                actor="Moodle sync", source="moodle_sync")
+        changelog.loc[cells.index, "applied"] = [written.get((int(row) - 2, "Grade"), False) for row in cells["row"]]
+        summary["updated"] = sum(written.values())
+        summary["failed_cells"] = sum(not ok for ok in written.values()) - len(conflicts)
+        summary["conflicts"] = conflicts
+        if write_error is not None:
+            summary["errors"].append((worksheet_name, str(write_error)))
+
+    header = list(sheet_df.columns)
+    for i, (*key, grade) in zip(inserts.index, inserts[SHEET_KEY + ["moodle"]].itertuples(index=False, name=None)):
+        values = dict(zip(SHEET_KEY, key), Grade=cell_text(grade))
+        if is_locked(values["Term"]):
+            summary["conflicts"].append({"key": tuple(key), "yours": values["Grade"], "theirs": None,
+                                         "reason": "term is locked"})
+            changelog.at[i, "applied"] = False
+            continue
+        if REV_COLUMN in header:
+            values[REV_COLUMN] = uuid.uuid4().hex[:12]
+        # Appended through the durable write queue, in the sheet's column order; the
+        # grade history records the row once the flusher has committed it
+        history = {"book": f"{spreadsheet_name}/{worksheet_name}", "actor": "Moodle sync", "source": "moodle_sync",
+                   "changes": [{"key": [values.get(k) for k in ROW_KEY], "field": "Grade", "new": values["Grade"]}]}
+        enqueue_row(spreadsheet_name, worksheet_name, [values.get(c, "") for c in header], history=history)
+        changelog.at[i, "applied"] = True
+        summary["inserted"] += 1
+    return summary, changelog
+
+def _audit_run(term, dry_run, summary, changelog):
+    run = {"id": uuid.uuid4().hex[:8], "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+           "term": term, "dry_run": dry_run, "grades": summary["grades"],
+           **{kind: summary[kind] for kind in ("update", "insert", "conflict")}}
+    write_audit(run, changelog)
+
+def preview_sync(client, sheet_df, term, subject_map=None, item_map=None, progress=None):
+    """Fetch every course and reconcile it against the sheet without writing anything.
+
+    The preview keeps a copy of the sheet it was compared with, so apply_sync only
+    writes cells that still hold what the admin saw. The run is audited as a dry run.
+    """
+    moodle_df, courses, errors = fetch_moodle_grades(client, term, subject_map, item_map, progress)
+    baseline = load_baseline()
+    changelog = reconcile(sheet_df, moodle_df, baseline)
+    counts = changelog["kind"].value_counts()
+    preview = {"term": term, "courses": courses, "grades": len(moodle_df), "errors": errors,
+               "changelog": changelog, "moodle": moodle_df, "sheet": sheet_df.copy(), "baseline": baseline,
+               **{kind: int(counts.get(kind, 0)) for kind in ("update", "insert", "conflict")}}
+    _audit_run(term, True, preview, changelog)
+    return preview
+
+def apply_sync(preview, spreadsheet_name, worksheet_name, kinds=("update", "insert")):
+    """Apply a preview's changelog entries of `kinds`, record the new baseline and audit the run."""
+    summary, changelog = apply_changelog(preview["changelog"], preview["sheet"], spreadsheet_name,
+                                         worksheet_name, kinds)
+    summary = {**preview, **summary, "errors": preview["errors"] + summary["errors"], "changelog": changelog}
+    # Everything Moodle sent except what is still open (conflicts left alone, failed writes)
+    synced = _keyed(preview["moodle"], "Grade", 1).rename(columns={"_value": "Grade"})
+    still_open = changelog.loc[changelog["applied"] != True, SHEET_KEY]  # noqa: E712
+    synced = synced.merge(still_open, on=SHEET_KEY, how="left", indicator=True)
+    save_baseline(synced[synced["_merge"] == "left_only"], preview["baseline"])
+    _audit_run(preview["term"], False, summary, changelog)
+    return summary
+
+def sync_grades(client, sheet_df, spreadsheet_name, worksheet_name, term,
+                subject_map=None, item_map=None, progress=None, dry_run=False, kinds=("update", "insert")):
+    """Preview and, unless dry_run, apply in one go (see preview_sync and apply_sync)."""
+    preview = preview_sync(client, sheet_df, term, subject_map, item_map, progress)
+    return preview if dry_run else apply_sync(preview, spreadsheet_name, worksheet_name, kinds)
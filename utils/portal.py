@@ -0,0 +1,96 @@
+# utils/portal.py
+
+import threading
+
+import streamlit as st
+from cachetools import LRUCache
+from gspread.exceptions import WorksheetNotFound
+
+from utils.analytics import BAND_LABELS, grade_bands, grade_styles
+from utils.grade_index import get_grade_index
+from utils.sheets_api import frame_version
+from utils.snapshot_store import load_replica_df
+
+# Read path for the student and parent portals. A session only ever receives the
+# rows of the students its email is linked to: they are looked up through a
+# NAME -> row-offset index over the shared grade frame (built once per data
+# version), and each student's finished report is cached until the data changes.
+SPREADSHEET_NAME = "Grades3"
+GRADES_WORKSHEET = "Sheet2"
+# One row per student: NAME, Student Email, Parent Email (a parent may appear on several rows)
+ROSTER_WORKSHEET = "Students"
+EMAIL_COLUMNS = {"Student": "Student Email", "Parent": "Parent Email"}
+PORTAL_COLUMNS = [
+    "Subject", "Term", "Assessment Type", "Grade",
+    "Subject Teacher Conduct Code", "Subject Teacher Comment Code",
+]
+
+_reports = LRUCache(maxsize=4096)
+_reports_lock = threading.Lock()
+
+def linked_students(email, role):
+    """Students a Student/Parent email may see; None when the roster sheet does not exist."""
+    try:
+        roster = load_replica_df(SPREADSHEET_NAME, ROSTER_WORKSHEET)
+    except WorksheetNotFound:
+        return None
+    col = EMAIL_COLUMNS[role]
+    if col not in roster.columns or not email:
+        return []
+    index = get_grade_index(roster, [col], normalize=[col],
+                            source=(ROSTER_WORKSHEET, frame_version(SPREADSHEET_NAME, ROSTER_WORKSHEET)))
+    return list(dict.fromkeys(index.rows(email)["NAME"]))
+
+def student_report(student):
+    """One student's grades and per-term averages, built from that student's rows only."""
+    df = load_replica_df(SPREADSHEET_NAME, GRADES_WORKSHEET)
+    source = (GRADES_WORKSHEET, frame_version(SPREADSHEET_NAME, GRADES_WORKSHEET))
+    key = (source, str(student).strip().lower())
+    with _reports_lock:
+        report = _reports.get(key)
+    if report is None:
+        index = get_grade_index(df, ["NAME"], normalize=["NAME"], source=source)
+        cols = [c for c in PORTAL_COLUMNS if c in df.columns]
+        rows = index.rows(student)[cols].reset_index(drop=True)
+        report = {"student": student, "rows": rows}
+        if {"Grade", "Term"} <= set(cols):
+            graded = rows.dropna(subset=["Grade"]).assign(Band=lambda r: grade_bands(r["Grade"]))
+            terms = graded.groupby("Term", observed=True).agg(graded=("Grade", "count"), average=("Grade", "mean"))
+            bands = graded.pivot_table(index="Term", columns="Band", values="Grade", aggfunc="count",
+                                       observed=False, fill_value=0).reindex(columns=BAND_LABELS, fill_value=0)
+            report["terms"] = terms.join(bands).round(1).reset_index()
+        with _reports_lock:
+            _reports[key] = report
+    return report
+
+def show_student_report(report):
+    st.subheader(report["student"])
+    rows = report["rows"]
+    if rows.empty:
+        st.info("No grades have been recorded yet.")
+        return
+    if "terms" in report:
+        st.dataframe(report["terms"], use_container_width=True, hide_index=True)
+    for term, term_rows in rows.groupby("Term", observed=True, sort=True) if "Term" in rows else [(None, rows)]:
+        with st.expander(str(term) if term is not None else "Grades", expanded=True):
+            view = term_rows.drop(columns="Term", errors="ignore").rename(columns={
+                "Subject Teacher Conduct Code": "Conduct", "Subject Teacher Comment Code": "Comment",
+            })
+            styled = view.style.apply(grade_styles, subset=["Grade"]).format({"Grade": "{:.1f}"}, na_rep="–")
+            st.dataframe(styled, use_container_width=True, hide_index=True)
+
+def portal(role, key):
+    """Email sign-in followed by the linked students' reports (Student or Parent role)."""
+    email = st.text_input("Your Email", key=f"{key}_email").strip().lower()
+    if not email:
+        st.info(f"Enter the email the school has on file for you as a {role.lower()}.")
+        return
+    students = linked_students(email, role)
+    if students is None:
+        st.error("The student roster has not been set up yet. Please contact the school administrator.")
+        return
+    if not students:
+        st.error("Email not recognized! Please use the email registered with the school.")
+        return
+    student = students[0] if len(students) == 1 else st.selectbox("Student", students, key=f"{key}_student")
+    show_student_report(student_report(student))
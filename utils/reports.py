@@ -0,0 +1,114 @@
+# utils/reports.py
+
+import io
+import multiprocessing
+import os
+import threading
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+REPORTS_DIR = os.path.join("data", "reports")
+MAX_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # leave a core for the Streamlit server
+# Built-in PDF fonts: nothing to embed, so cards render faster and stay a few KB each
+PDF_RC = {"pdf.use14corefonts": True, "font.family": "sans-serif", "font.sans-serif": ["Helvetica"]}
+CARD_COLUMNS = {
+    "Subject": "Subject",
+    "Assessment Type": "Assessment",
+    "Grade": "Grade",
+    "Subject Teacher Conduct Code": "Conduct",
+    "Subject Teacher Comment Code": "Comment",
+}
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+def build_cards(df, term=None, student_col="NAME", term_col="Term"):
+    """One (student, rows) payload per student, grouping the frame once."""
+    if term is not None:
+        # A locked term's cards come from its frozen rows, not the live sheet. Imported
+        # here so the worker processes, which only render, stay free of pandas.
+        from utils.analytics import term_column
+        from utils.term_locks import term_rows
+        df = term_rows(df, term) if term_col == term_column(df) else df[df[term_col] == term]
+    cols = [c for c in CARD_COLUMNS if c in df.columns]
+    return [
+        (str(student), rows[cols].astype(object).fillna("").astype(str).values.tolist(), [CARD_COLUMNS[c] for c in cols])
+        for student, rows in df.groupby(student_col, sort=True, observed=True)
+    ]
+
+def render_card(card, term=None, school="Clement Howell High School"):
+    """Render a single report card to PDF bytes (runs inside a worker process)."""
+    # matplotlib is only needed by the workers, so the app itself never pays for the import
+    import matplotlib
+    with matplotlib.rc_context(PDF_RC):
+        return student_pdf(card, term, school)
+
+def student_pdf(card, term, school):
+    from matplotlib.figure import Figure
+
+    student, rows, header = card
+    # A bare Figure is not registered with pyplot, so it is freed as soon as it goes out of scope
+    fig = Figure(figsize=(8.27, 11.69))  # A4 portrait
+    fig.text(0.5, 0.95, school, ha="center", fontsize=16, fontweight="bold")
+    fig.text(0.5, 0.92, "Student Report Card", ha="center", fontsize=13)
+    fig.text(0.08, 0.88, f"Student: {student}", fontsize=11)
+    if term is not None:
+        fig.text(0.08, 0.86, f"Term: {term}", fontsize=11)
+    ax = fig.add_axes([0.08, 0.1, 0.84, 0.72])
+    ax.axis("off")
+    if rows:
+        table = ax.table(cellText=[[c[:40] for c in r] for r in rows], colLabels=header, loc="upper center",
+                         cellLoc="left")
+        table.auto_set_font_size(False)
+        table.set_fontsize(9)
+        table.scale(1, 1.4)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="pdf")
+    return student, buf.getvalue()
+
+def _render(args):
+    return render_card(*args)
+
+class ReportJob:
+    def __init__(self, total, path):
+        self.id = uuid.uuid4().hex[:8]
+        self.total = total
+        self.done = 0
+        self.path = path
+        self.error = None
+        self.finished = False
+
+def _run(job, cards, term, max_workers):
+    try:
+        ctx = multiprocessing.get_context("spawn")  # do not fork the threaded server process
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as pool, \
+                zipfile.ZipFile(job.path, "w", zipfile.ZIP_DEFLATED) as archive:
+            results = pool.map(_render, [(card, term) for card in cards], chunksize=8)
+            for student, pdf in results:
+                archive.writestr(f"{student}.pdf".replace("/", "-"), pdf)
+                job.done += 1
+    except Exception as e:
+        job.error = e
+    finally:
+        job.finished = True
+
+def start_report_job(df, term=None, max_workers=MAX_WORKERS):
+    """Render every student's card in a process pool, streaming them into a zip.
+
+    Runs in a background thread and returns immediately; poll the job for progress.
+    """
+    cards = build_cards(df, term)
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    job = ReportJob(len(cards), os.path.join(REPORTS_DIR, f"report_cards_{term or 'all'}_{stamp}.zip"))
+    with _jobs_lock:
+        _jobs[job.id] = job
+    threading.Thread(target=_run, args=(job, cards, term, max_workers), name=f"reports-{job.id}",
+                     daemon=True).start()
+    return job
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
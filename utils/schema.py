@@ -0,0 +1,77 @@
+# utils/schema.py
+
+import numpy as np
+import pandas as pd
+
+# Column types for the grade sheets. Everything not listed stays as text.
+# Low-cardinality text becomes categorical (one small code per cell instead of a
+# Python string), Grade becomes a nullable float.
+STUDENT_SCHEMA = {
+    "NAME": "category",
+    "Subject": "category",
+    "Term": "category",
+    "Assessment Type": "category",
+    "Teacher_Responsible_Email": "category",
+    "Subject Teacher Conduct Code": "category",
+    "Subject Teacher Comment Code": "category",
+    "Grade": "Float64",
+}
+
+# Text-mode worksheets loaded through utils.sheets_api that should be typed on load
+SCHEMAS = {
+    ("Grades3", "Sheet2"): STUDENT_SCHEMA,
+}
+
+GRADE_RANGE = (0, 100)
+
+def parse_grades(series):
+    text = series.astype("string").str.strip()
+    grades = pd.to_numeric(text.replace("", pd.NA), errors="coerce").astype("Float64")
+    # Anything written in the cell that is not a number is a validation problem, not a blank
+    unparsed = text.notna() & (text != "") & grades.isna()
+    return grades, unparsed
+
+def apply_schema(df, schema):
+    """Typed copy of a text frame plus a validation/memory report."""
+    before = int(df.memory_usage(deep=True).sum())
+    typed = df.copy()
+    report = {"missing_columns": [c for c in schema if c not in df.columns], "invalid_grades": []}
+    for col, dtype in schema.items():
+        if col not in typed.columns:
+            continue
+        if dtype == "Float64":
+            grades, unparsed = parse_grades(typed[col])
+            low, high = GRADE_RANGE
+            out_of_range = grades.notna() & ((grades < low) | (grades > high))
+            bad = (unparsed | out_of_range).to_numpy(dtype=bool)
+            # Row numbers as they appear in the sheet (header is row 1)
+            report["invalid_grades"] = [(int(pos) + 2, df[col].iat[pos]) for pos in np.flatnonzero(bad)]
+            typed[col] = grades
+        else:
+            typed[col] = typed[col].astype(dtype)
+    report["bytes_before"] = before
+    report["bytes_after"] = int(typed.memory_usage(deep=True).sum())
+    typed.attrs["schema_report"] = report
+    return typed
+
+def _read_only(series):
+    # Columns read from a memory-mapped snapshot share its pages and cannot be written
+    values = series.array
+    data = getattr(values, "_ndarray", getattr(values, "_data", None))
+    return isinstance(data, np.ndarray) and not data.flags.writeable
+
+def set_cell(df, pos, col, text):
+    """Store sheet text into a possibly typed column, in place."""
+    series = df[col]
+    if _read_only(series):
+        df[col] = series = series.copy()  # copy-on-write, this column only
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        if text not in series.cat.categories:
+            df[col] = series.cat.add_categories([text])
+    elif series.dtype == "Float64":
+        text = parse_grades(pd.Series([text]))[0].iat[0]
+    df.iat[pos, df.columns.get_loc(col)] = text
+
+def set_row(df, pos, row):
+    for col, text in zip(df.columns, row):
+        set_cell(df, pos, col, text)
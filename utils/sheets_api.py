@@ -1,20 +1,703 @@
 # utils/sheets_api.py
 
+import json
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 import gspread
-from gspread_dataframe import get_as_dataframe
+from cachetools import TTLCache
+from gspread.exceptions import APIError
+from gspread.utils import ValueInputOption, absolute_range_name, fill_gaps, rowcol_to_a1
 import streamlit as st
 
-def load_grades_df(sheet_name="Grades3"):
-    gc = gspread.service_account_from_dict(st.secrets["gcp_service_account"])
-    sh = gc.open(sheet_name)
-    worksheet = sh.sheet1
-    df = get_as_dataframe(worksheet, evaluate_formulas=True)
-    df = df.dropna(how="all")  # remove empty rows
+from utils import change_bus, metrics
+from utils.schema import SCHEMAS, apply_schema, set_cell, set_row
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+# How long a downloaded worksheet is served to every session before it is refetched
+DATA_TTL = 300  # seconds
+
+# Text-mode worksheets are refreshed by patching the previous frame instead of
+# rebuilding it. When the sheet carries a REV_COLUMN (bumped by our writers, or by
+# an onEdit Apps Script trigger for hand edits) only that column is downloaded and
+# just the rows whose marker moved are fetched.
+INCREMENTAL_REFRESH = True
+REV_COLUMN = "Row Version"
+
+# Stable identity of a grade row; writes are located by this key, not by position
+ROW_KEY = ["NAME", "Subject", "Term", "Assessment Type"]
+
+# Sheets answers 429 when the per-minute quota is used up and 5xx when it is
+# briefly unavailable; both are worth retrying, anything else is a real error.
+RETRYABLE_CODES = {429, 500, 502, 503}
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0  # seconds, doubled on every retry
+
+# Worksheets of one spreadsheet loaded together (load_sheet_dfs) run on at most this
+# many threads when they cannot share a single values.batchGet request
+LOADER_THREADS = 4
+
+# --- Shared client & worksheet cache ---
+
+_frames = TTLCache(maxsize=64, ttl=DATA_TTL)  # key -> frame, while still fresh
+_frames_lock = threading.Lock()
+_load_locks = {}
+_last = {}  # key -> {"df": last frame, "hashes": per-row content hashes}, kept past the TTL
+
+def _service_account_info():
+    # index.py keeps the key as a JSON string, the pages as a TOML table
+    if "GCP_SERVICE_ACCOUNT" in st.secrets:
+        return json.loads(st.secrets["GCP_SERVICE_ACCOUNT"])
+    return dict(st.secrets["gcp_service_account"])
+
+@st.cache_resource(show_spinner=False)
+def get_client():
+    # Imported on first use: pages served from the local replica never authenticate
+    from google.oauth2.service_account import Credentials
+    creds = Credentials.from_service_account_info(_service_account_info(), scopes=SCOPES)
+    return gspread.authorize(creds)
+
+@st.cache_resource(show_spinner=False)
+def get_spreadsheet(spreadsheet_name):
+    # Opened once per process; every worksheet of it shares the metadata lookup
+    return with_backoff(get_client().open, spreadsheet_name)
+
+@st.cache_resource(show_spinner=False)
+def get_worksheet(spreadsheet_name, worksheet_name=None):
+    sh = get_spreadsheet(spreadsheet_name)
+    return sh.sheet1 if worksheet_name is None else with_backoff(sh.worksheet, worksheet_name)
+
+def _text_frame(spreadsheet_name, worksheet_name, values):
+    if not values:
+        return pd.DataFrame()
+    df = pd.DataFrame(values[1:], columns=values[0])
+    schema = SCHEMAS.get((spreadsheet_name, worksheet_name))
+    return apply_schema(df, schema) if schema else df
+
+def _fetch_df(spreadsheet_name, worksheet_name, numeric):
+    worksheet = get_worksheet(spreadsheet_name, worksheet_name)
+    if numeric:
+        from gspread_dataframe import get_as_dataframe  # slow to import, only this path needs it
+        df = with_backoff(get_as_dataframe, worksheet, evaluate_formulas=True)
+        return df.dropna(how="all")  # remove empty rows
+    return _text_frame(spreadsheet_name, worksheet_name, with_backoff(worksheet.get_all_values))
+
+def _number_columns(spreadsheet_name, worksheet_name):
+    # Columns the schema types as numbers: their text is compared as the number it holds
+    schema = SCHEMAS.get((spreadsheet_name, worksheet_name)) or {}
+    return {col for col, dtype in schema.items() if dtype == "Float64"}
+
+def _hash_text(series, number):
+    # Cell text as the sheet would show it; numbers in one canonical form ("87.0" -> "87").
+    # Categorical columns are hashed per category, not per cell (pandas hashes a
+    # categorical like its values), and numbers are formatted once per distinct value.
+    if not number and isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories.astype(str)
+        if categories.is_unique:
+            text = series.cat.rename_categories(categories)
+            if text.hasnans:
+                text = (text if "" in categories else text.cat.add_categories([""])).fillna("")
+            return text
+    if not number:
+        return series.astype(object).where(series.notna(), "").astype(str)
+    codes, numbers = pd.factorize(pd.to_numeric(series, errors="coerce").astype(float).to_numpy())
+    whole = np.isfinite(numbers) & (numbers == np.round(numbers))
+    integers = np.where(whole, numbers, 0).astype(np.int64).astype(str)
+    categories = np.where(whole, integers, numbers.astype(str)).astype(object)
+    unparsed = codes == -1
+    if unparsed.any():
+        # Blank or non-numeric cells keep their own text
+        raw = series[unparsed].astype(object).where(series[unparsed].notna(), "").astype(str)
+        raw_codes, raw_text = pd.factorize(raw)
+        codes[unparsed] = raw_codes + len(categories)
+        categories = np.concatenate([categories, np.asarray(raw_text, dtype=object)])
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=series.index)
+
+def _frame_hashes(df, numbers=()):
+    """64-bit content hash per row over the sheet text, so a typed frame and the text
+    rows it was parsed from hash the same."""
+    if df.empty:
+        return np.empty(0, dtype=np.uint64)
+    text = pd.DataFrame({
+        i: _hash_text(df.iloc[:, i], col in numbers or pd.api.types.is_float_dtype(df.dtypes.iloc[i]))
+        for i, col in enumerate(df.columns)
+    })
+    return pd.util.hash_pandas_object(text, index=False).to_numpy()
+
+def _rows_hashes(rows, header, numbers):
+    return _frame_hashes(pd.DataFrame(_pad(rows, len(header)), columns=header), numbers)
+
+def _pad(rows, width):
+    return [list(r) + [""] * (width - len(r)) for r in rows]
+
+def _row_ranges(positions, width):
+    # Consecutive frame positions -> "A5:K9"-style ranges (frame row i is sheet row i + 2)
+    ranges, start = [], None
+    for pos in sorted(positions):
+        if start is None:
+            start = prev = pos
+        elif pos == prev + 1:
+            prev = pos
+        else:
+            ranges.append((start, prev))
+            start = prev = pos
+    if start is not None:
+        ranges.append((start, prev))
+    return [(a, b, f"{rowcol_to_a1(a + 2, 1)}:{rowcol_to_a1(b + 2, width)}") for a, b in ranges]
+
+def _writable(cached):
+    # Hashes adopted from a snapshot are mapped read-only; copied on the first patch
+    if not cached["hashes"].flags.writeable:
+        cached["hashes"] = cached["hashes"].copy()
+    return cached["hashes"]
+
+def _patch_rows(df, hashes, positions, rows, numbers, typed=False):
+    for pos, row in zip(positions, rows):
+        if typed:
+            set_row(df, pos, row)
+        else:
+            df.iloc[pos] = row
+    if positions:
+        hashes[positions] = _rows_hashes(rows, list(df.columns), numbers)
+
+def _fetch_rows(worksheet, positions, width):
+    ranges = _row_ranges(positions, width)
+    if not ranges:
+        return {}
+    blocks = with_backoff(worksheet.batch_get, [a1 for _, _, a1 in ranges])
+    rows = {}
+    for (a, b, _), block in zip(ranges, blocks):
+        # Trailing blank rows are left out of the response
+        block = _pad(block, width) + [[""] * width] * (b - a + 1 - len(block))
+        rows.update(zip(range(a, b + 1), block))
+    return rows
+
+def _refresh_df(spreadsheet_name, worksheet_name, cached):
+    """Bring the cached text frame up to date in place; None means a full reload is needed."""
+    worksheet = get_worksheet(spreadsheet_name, worksheet_name)
+    df, hashes = cached["df"], _writable(cached)
+    header = list(df.columns)
+    width = len(header)
+    numbers = _number_columns(spreadsheet_name, worksheet_name)
+
+    if REV_COLUMN not in header:
+        # No revision markers: the values still have to come down, but only the
+        # rows whose content hash moved are written into the frame
+        values = with_backoff(worksheet.get_all_values)
+        if not values or values[0] != header:
+            return None
+        rows = values[1:]
+        total = len(rows)
+        common = min(total, len(df))
+        changed = np.flatnonzero(_rows_hashes(rows[:common], header, numbers) != hashes[:common]).tolist()
+        changed_rows = [rows[i] for i in changed]
+        appended = rows[len(df):]
+    else:
+        rev_letter = rowcol_to_a1(1, header.index(REV_COLUMN) + 1).rstrip("0123456789")
+        head, revs = with_backoff(worksheet.batch_get, ["1:1", f"{rev_letter}2:{rev_letter}"])
+        if not head or _pad(head, width)[0] != header:
+            return None
+        revs = [r[0] if r else "" for r in revs]
+        total = len(revs)
+        current = df[REV_COLUMN].to_numpy()
+        changed = [i for i in range(min(total, len(df))) if revs[i] != current[i]]
+        fetched = _fetch_rows(worksheet, changed + list(range(len(df), total)), width)
+        changed_rows = [fetched[i] for i in changed]
+        appended = [fetched[i] for i in range(len(df), total)]
+
+    schema = SCHEMAS.get((spreadsheet_name, worksheet_name))
+    _patch_rows(df, hashes, changed, changed_rows, numbers, typed=bool(schema))
+    if changed or total != len(df):
+        cached["version"] += 1
+        deltas = [{"pos": i, "kind": "update", "values": dict(zip(header, r))} for i, r in zip(changed, changed_rows)]
+        deltas += [{"pos": len(df) + i, "kind": "insert", "values": dict(zip(header, r))} for i, r in enumerate(appended)]
+        deltas += [{"pos": i, "kind": "delete", "values": None} for i in range(total, len(df))]
+        change_bus.publish((spreadsheet_name, worksheet_name, False), cached["version"], deltas)
+    if total < len(df):
+        # Rows were removed from the bottom of the sheet
+        cached["hashes"] = hashes[:total].copy()
+        return df.iloc[:total].copy()
+    if appended:
+        cached["hashes"] = np.concatenate([hashes, _rows_hashes(appended, header, numbers)])
+        df = pd.concat([df, pd.DataFrame(appended, columns=header)], ignore_index=True)
+        # Categoricals with different categories concatenate to object; type them again
+        return apply_schema(df, schema) if schema else df
+    return df
+
+def _load(key):
+    spreadsheet_name, worksheet_name, numeric = key
+    cached = _last.get(key)
+    df = None
+    if cached is not None and INCREMENTAL_REFRESH and not numeric:
+        df = _refresh_df(spreadsheet_name, worksheet_name, cached)
+    if df is None:
+        return _adopt_full(key, _fetch_df(spreadsheet_name, worksheet_name, numeric))
+    cached["df"] = df
+    _last[key] = cached
     return df
 
+def _row_deltas(cached, df, hashes):
+    """Change events turning the cached frame into df, from the row hashes; None if the
+    columns moved, since positions then say nothing about what changed."""
+    if list(cached["df"].columns) != list(df.columns):
+        return None
+    old = cached["hashes"]
+    common = min(len(old), len(hashes))
+    changed = np.flatnonzero(old[:common] != hashes[:common])
+    header = list(df.columns)
+    rows = df.iloc[np.concatenate([changed, np.arange(common, len(hashes))])].itertuples(index=False)
+    values = [dict(zip(header, map(cell_text, row))) for row in rows]
+    deltas = [{"pos": int(i), "kind": "update", "values": v} for i, v in zip(changed, values)]
+    deltas += [{"pos": common + i, "kind": "insert", "values": v} for i, v in enumerate(values[len(changed):])]
+    deltas += [{"pos": i, "kind": "delete", "values": None} for i in range(len(hashes), len(old))]
+    return deltas
+
+def _adopt_full(key, df, hashes=None, version=None):
+    # A complete frame (downloaded, or a published snapshot with its hashes and version)
+    # replaces whatever was cached for the key; sessions are sent the rows that differ
+    cached = _last.get(key)
+    if hashes is None:
+        hashes = _frame_hashes(df, _number_columns(*key[:2]))
+    if cached is None:
+        _last[key] = {"df": df, "hashes": hashes, "version": version or 1}
+        return df
+    # Versions only ever move on, so data keyed on an older one is never mistaken for this
+    version = max(cached["version"] + 1, version or 0)
+    if not np.array_equal(hashes, cached["hashes"]):
+        change_bus.publish(key, version, _row_deltas(cached, df, hashes))
+    _last[key] = {"df": df, "hashes": hashes, "version": version}
+    return df
+
+def load_sheet_df(spreadsheet_name, worksheet_name=None, numeric=False):
+    """Worksheet as a DataFrame, downloaded at most once per DATA_TTL for the whole process.
+
+    With numeric=False every cell is kept as the sheet's text (row i is sheet row i + 2)
+    and refreshes are incremental; numeric=True lets gspread_dataframe parse numbers
+    and drops blank rows. The returned frame is shared between sessions and patched
+    in place on refresh, so copy it before mutating.
+    """
+    key = (spreadsheet_name, worksheet_name, numeric)
+    with _frames_lock:
+        if key in _frames:
+            metrics.count("cache_hits")
+            return _frames[key]
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+    # One session downloads, concurrent sessions wait for its result
+    with load_lock:
+        with _frames_lock:
+            if key in _frames:
+                metrics.count("cache_hits")
+                return _frames[key]
+        metrics.count("cache_misses")
+        with metrics.span("load_sheet_df"):
+            df = _load(key)
+        with _frames_lock:
+            _frames[key] = df
+        return df
+
+def _batch_load(spreadsheet_name, worksheet_names):
+    """Download several text-mode worksheets in one values.batchGet request."""
+    keys = [(spreadsheet_name, name, False) for name in worksheet_names]
+    with _frames_lock:
+        locks = [_load_locks.setdefault(key, threading.Lock()) for key in keys]
+    # Always taken in the same order, so two batch loads cannot deadlock
+    for lock in sorted(locks, key=id):
+        lock.acquire()
+    try:
+        with _frames_lock:
+            frames = {key[1]: _frames[key] for key in keys if key in _frames}
+        pending = [key for key in keys if key[1] not in frames]
+        if not pending:
+            return frames
+        for _ in pending:
+            metrics.count("cache_misses")
+        with metrics.span("batch_load"):
+            sh = get_spreadsheet(spreadsheet_name)
+            response = with_backoff(sh.values_batch_get, [absolute_range_name(key[1]) for key in pending])
+            for key, block in zip(pending, response.get("valueRanges", [])):
+                # batchGet drops trailing blank cells; get_all_values pads them back
+                df = _text_frame(spreadsheet_name, key[1], fill_gaps(block.get("values", [])))
+                frames[key[1]] = _adopt_full(key, df)
+        with _frames_lock:
+            for key in pending:
+                _frames[key] = frames[key[1]]
+        return frames
+    finally:
+        for lock in locks:
+            lock.release()
+
+def load_sheet_dfs(spreadsheet_name, worksheet_names, numeric=False):
+    """Several worksheets of one spreadsheet as {worksheet_name: frame}, fetched together.
+
+    The spreadsheet is opened once. Text worksheets that have never been downloaded
+    come down in a single values.batchGet request; the rest (incremental refreshes,
+    numeric frames, sheet1) are loaded on a small thread pool. Frames are cached and
+    shared exactly as with load_sheet_df.
+    """
+    frames, missing = {}, []
+    with _frames_lock:
+        for name in worksheet_names:
+            key = (spreadsheet_name, name, numeric)
+            if key in _frames:
+                metrics.count("cache_hits")
+                frames[name] = _frames[key]
+            else:
+                missing.append(name)
+    cold = [name for name in missing if not numeric and name is not None and (spreadsheet_name, name, False) not in _last]
+    if len(cold) > 1:
+        frames.update(_batch_load(spreadsheet_name, cold))
+    rest = [name for name in missing if name not in frames]
+    if len(rest) == 1:
+        frames[rest[0]] = load_sheet_df(spreadsheet_name, rest[0], numeric)
+    elif rest:
+        with ThreadPoolExecutor(max_workers=min(LOADER_THREADS, len(rest)), thread_name_prefix="sheets-load") as pool:
+            frames.update(zip(rest, pool.map(lambda name: load_sheet_df(spreadsheet_name, name, numeric), rest)))
+    return {name: frames[name] for name in worksheet_names}
+
+def adopt_df(spreadsheet_name, worksheet_name, numeric, df, hashes=None, version=None):
+    """Replace the cached frame with a complete one loaded elsewhere (a published snapshot).
+
+    The version moves on (to `version` if that is newer) and sessions showing the old
+    frame are sent the rows that changed. Pass the row hashes the snapshot was written
+    with (row_hashes) so the frame is not hashed again here.
+    """
+    key = (spreadsheet_name, worksheet_name, numeric)
+    with _frames_lock:
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+    with load_lock:
+        return _adopt_full(key, df, hashes, version)
+
+def peek_df(spreadsheet_name, worksheet_name=None, numeric=False):
+    # Last known frame (possibly past its TTL) without touching the network
+    cached = _last.get((spreadsheet_name, worksheet_name, numeric))
+    return cached["df"] if cached is not None else None
+
+def seed_df(spreadsheet_name, worksheet_name, numeric, df, hashes=None):
+    """Adopt a frame from elsewhere (e.g. a local snapshot) as the stale baseline.
+
+    The next load_sheet_df call then refreshes it incrementally instead of
+    downloading the whole worksheet.
+    """
+    key = (spreadsheet_name, worksheet_name, numeric)
+    with _frames_lock:
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+    with load_lock:
+        if key in _last:
+            return _last[key]["df"]
+        if hashes is None:
+            hashes = _frame_hashes(df, _number_columns(spreadsheet_name, worksheet_name))
+        _last[key] = {"df": df, "hashes": hashes, "version": 1}
+        return df
+
+def schema_report(spreadsheet_name, worksheet_name=None):
+    # Validation and memory figures from the last typed load of a worksheet
+    df = peek_df(spreadsheet_name, worksheet_name)
+    return df.attrs.get("schema_report") if df is not None else None
+
+def frame_version(spreadsheet_name, worksheet_name=None, numeric=False):
+    # Bumped whenever the cached frame's contents change; use it to key derived data
+    cached = _last.get((spreadsheet_name, worksheet_name, numeric))
+    return cached["version"] if cached is not None else 0
+
+def row_hashes(spreadsheet_name, worksheet_name=None, numeric=False, df=None):
+    """Per-row content hashes (uint64) of the cached frame, or of df if that is not it."""
+    cached = _last.get((spreadsheet_name, worksheet_name, numeric))
+    if cached is not None and (df is None or cached["df"] is df):
+        return cached["hashes"]
+    return None if df is None else _frame_hashes(df, _number_columns(spreadsheet_name, worksheet_name))
+
+def invalidate(spreadsheet_name, worksheet_name=None):
+    with _frames_lock:
+        for key in [k for k in _frames if k[:2] == (spreadsheet_name, worksheet_name)]:
+            del _frames[key]
+
+def load_grades_df(sheet_name="Grades3"):
+    return load_sheet_df(sheet_name, numeric=True)
+
 def append_grade_row(row_dict, sheet_name="Grades3"):
-    gc = gspread.service_account_from_dict(st.secrets["gcp_service_account"])
-    sh = gc.open(sheet_name)
-    worksheet = sh.sheet1
-    worksheet.append_row(list(row_dict.values()))
+    # Queued and sent in batches by a background thread; returns the queue entry id.
+    # The grade history logs the row once the flusher has committed it
+    from utils.term_locks import check_unlocked
+    from utils.write_queue import enqueue_row
+    check_unlocked(row_dict.get("Term"))
+    history = {
+        "book": f"{sheet_name}/sheet1",
+        "changes": [{"key": [row_dict.get(k) for k in ROW_KEY], "field": "Grade", "new": row_dict.get("Grade")}],
+        "source": "append_grade_row",
+    }
+    return enqueue_row(sheet_name, None, list(row_dict.values()), history=history)
+
+# --- Batched write-back ---
+
+def with_backoff(fn, *args, **kwargs):
+    # Every Sheets request goes through here, so this is where calls are counted
+    for attempt in range(MAX_ATTEMPTS):
+        metrics.count("sheets_api_calls")
+        try:
+            with metrics.span(f"sheets.{getattr(fn, '__name__', 'call')}"):
+                return fn(*args, **kwargs)
+        except APIError as e:
+            if e.code == 429:
+                metrics.count("sheets_quota_errors")
+            if e.code not in RETRYABLE_CODES or attempt == MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(BACKOFF_BASE * 2 ** attempt + random.uniform(0, 1))
+
+def cell_text(value):
+    # The sheet stores everything as text, so compare and write the way it would show
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def same_cell(a, b):
+    """Two cell texts hold the same value: equal text, or the same number ("87" and "87.0")."""
+    if a == b:
+        return True
+    try:
+        return float(a) == float(b)
+    except (TypeError, ValueError):
+        return False
+
+def diff_cells(base_df, edited_df, cols, sheet_columns, header_rows=1):
+    """List the (idx, col, row, col_number, value) cells where edited_df differs from base_df."""
+    changes = []
+    for col in cols:
+        col_number = sheet_columns.get_loc(col) + 1
+        before = base_df[col].map(cell_text)
+        after = edited_df.loc[base_df.index, col].map(cell_text)
+        for idx in before.index[before != after]:
+            changes.append((idx, col, idx + header_rows + 1, col_number, edited_df.at[idx, col]))
+    return changes
+
+def coalesce_ranges(changes):
+    """Group changed cells into rectangular A1 ranges for one batch_update call."""
+    by_row = {}
+    for idx, col, row, col_number, value in changes:
+        by_row.setdefault(row, {})[col_number] = (idx, col, value)
+
+    # Horizontal runs of adjacent columns within each row
+    runs = []
+    for row in sorted(by_row):
+        cells = by_row[row]
+        start = prev = None
+        for col_number in sorted(cells):
+            if start is None:
+                start = prev = col_number
+            elif col_number == prev + 1:
+                prev = col_number
+            else:
+                runs.append((row, start, prev))
+                start = prev = col_number
+        runs.append((row, start, prev))
+
+    # Stack runs with the same column span on consecutive rows into rectangles
+    blocks = []
+    for row, first, last in runs:
+        if blocks and blocks[-1]["cols"] == (first, last) and blocks[-1]["rows"][1] == row - 1:
+            blocks[-1]["rows"] = (blocks[-1]["rows"][0], row)
+        else:
+            blocks.append({"rows": (row, row), "cols": (first, last)})
+
+    ranges = []
+    for block in blocks:
+        (top, bottom), (first, last) = block["rows"], block["cols"]
+        cells, values = [], []
+        for row in range(top, bottom + 1):
+            line = []
+            for col_number in range(first, last + 1):
+                idx, col, value = by_row[row][col_number]
+                cells.append((idx, col))
+                line.append(cell_text(value))
+            values.append(line)
+        a1 = rowcol_to_a1(top, first)
+        if (bottom, last) != (top, first):
+            a1 += ":" + rowcol_to_a1(bottom, last)
+        ranges.append({"range": a1, "values": values, "cells": cells})
+    return ranges
+
+def batch_write_cells(worksheet, changes):
+    """Write changed cells in one batch_update; returns ({(idx, col): ok}, error)."""
+    if not changes:
+        return {}, None
+    ranges = coalesce_ranges(changes)
+    payload = [{"range": r["range"], "values": r["values"]} for r in ranges]
+    try:
+        with_backoff(
+            worksheet.batch_update, payload,
+            value_input_option=ValueInputOption.user_entered,
+        )
+        ok, error = True, None
+    except APIError as e:
+        ok, error = False, e
+    return {cell: ok for r in ranges for cell in r["cells"]}, error
+
+def _write_through(spreadsheet_name, worksheet_name, changes, statuses):
+    # Patch the cached text frame with the cells that reached the sheet, so the next
+    # read needs no download at all; parsed (numeric) copies are simply dropped
+    key = (spreadsheet_name, worksheet_name, False)
+    with _frames_lock:
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+        _frames.pop((spreadsheet_name, worksheet_name, True), None)
+    with load_lock:
+        cached = _last.get(key)
+        if cached is None:
+            return
+        df, hashes = cached["df"], _writable(cached)
+        cached["version"] += 1
+        deltas = {}
+        for idx, col, row, col_number, value in changes:
+            if statuses.get((idx, col)) and row - 2 < len(df):
+                set_cell(df, row - 2, df.columns[col_number - 1], cell_text(value))
+                delta = deltas.setdefault(row - 2, {"pos": row - 2, "kind": "update", "values": {}})
+                delta["values"][df.columns[col_number - 1]] = cell_text(value)
+        if deltas:
+            positions = sorted(deltas)
+            hashes[positions] = _frame_hashes(df.iloc[positions], _number_columns(spreadsheet_name, worksheet_name))
+        change_bus.publish(key, cached["version"], list(deltas.values()))
+
+def reload(spreadsheet_name, worksheet_name=None):
+    # Rows moved under the cache: positions can no longer be patched, so start over.
+    # The download comes first: if it fails, the cached frame and its version stay.
+    key = (spreadsheet_name, worksheet_name, False)
+    from utils.snapshot_store import ATTACHED, request_sync
+    if ATTACHED:
+        # The sync daemon owns Sheets reads: it refetches, and its next snapshot
+        # reaches this replica's frame as row deltas
+        request_sync()
+        return peek_df(*key)
+    with _frames_lock:
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+    with load_lock:
+        metrics.count("cache_misses")
+        with metrics.span("load_sheet_df"):
+            df = _fetch_df(spreadsheet_name, worksheet_name, False)
+        # Keep counting up, so data keyed on the old version is never mistaken for this one
+        version = frame_version(*key) + 1
+        _last[key] = {"df": df, "hashes": _frame_hashes(df, _number_columns(spreadsheet_name, worksheet_name)),
+                      "version": version}
+        with _frames_lock:
+            # A parsed (numeric) copy is always downloaded whole, so its baseline can stay
+            for k in [k for k in _frames if k[:2] == (spreadsheet_name, worksheet_name)]:
+                del _frames[k]
+            _frames[key] = df
+    change_bus.publish(key, version)
+    return df
+
+def update_cells(spreadsheet_name, worksheet_name, changes, header=None, write_through=True):
+    """Batch-write changes and keep the shared cache in step; returns ({(idx, col): ok}, error)."""
+    cached = _last.get((spreadsheet_name, worksheet_name, False))
+    if header is None and cached is not None:
+        header = list(cached["df"].columns)
+    writes = list(changes)
+    if header is not None and REV_COLUMN in header:
+        rev_col = header.index(REV_COLUMN) + 1
+        rows = {(idx, row) for idx, _, row, _, _ in changes}
+        writes += [(idx, REV_COLUMN, row, rev_col, uuid.uuid4().hex[:12]) for idx, row in rows]
+    statuses, error = batch_write_cells(get_worksheet(spreadsheet_name, worksheet_name), writes)
+    if statuses:
+        if write_through:
+            _write_through(spreadsheet_name, worksheet_name, writes, statuses)
+        else:
+            reload(spreadsheet_name, worksheet_name)
+    return {(idx, col): statuses[(idx, col)] for idx, col, *_ in changes}, error
+
+# --- Optimistic concurrency ---
+
+def _current_columns(worksheet, header, cols):
+    """Current values of `cols` (plus the header row) in one batch_get; falls back to all values."""
+    letters = [rowcol_to_a1(1, header.index(c) + 1).rstrip("0123456789") for c in cols]
+    head, *columns = with_backoff(worksheet.batch_get, ["1:1"] + [f"{l}2:{l}" for l in letters])
+    if head and _pad(head, len(header))[0] == header:
+        length = max((len(c) for c in columns), default=0)
+        data = {c: [r[0] if r else "" for r in col] + [""] * (length - len(col)) for c, col in zip(cols, columns)}
+        return header, pd.DataFrame(data)
+    # Columns were inserted or renamed since the frame was loaded
+    values = with_backoff(worksheet.get_all_values)
+    return values[0], pd.DataFrame(values[1:], columns=values[0])
+
+def update_cells_checked(spreadsheet_name, worksheet_name, base_df, changes, key_cols=ROW_KEY,
+                         actor=None, source=None):
+    """Write changes only where the sheet still holds the value they were based on.
+
+    Each change is located by its row key (not its cached position) in the live sheet.
+    Cells someone else changed since base_df was read, or that belong to a locked
+    term, are reported as conflicts and left alone; cells that already hold the new
+    value count as saved. Cells written are logged to the grade history under
+    `actor`. Returns ({(idx, col): ok}, error, conflicts).
+    """
+    from utils.grade_history import record_changes
+    from utils.term_locks import locked_mask
+
+    statuses, conflicts, writes = {}, [], []
+    # Rows of a locked term are never written, whatever the editor sent
+    locked = locked_mask(base_df)
+    for idx, col, row, _, value in changes:
+        if locked.at[idx]:
+            key = tuple(cell_text(base_df.at[idx, k]) for k in key_cols)
+            conflicts.append({"idx": idx, "col": col, "key": key, "yours": cell_text(value),
+                              "theirs": cell_text(base_df.at[idx, col]), "reason": "term is locked"})
+            statuses[(idx, col)] = False
+    changes = [c for c in changes if not locked.at[c[0]]]
+    if not changes:
+        return statuses, None, conflicts
+    worksheet = get_worksheet(spreadsheet_name, worksheet_name)
+    cols = list(dict.fromkeys(key_cols + [col for _, col, *_ in changes]))
+    header, current = _current_columns(worksheet, list(base_df.columns), cols)
+
+    positions, duplicates = {}, set()
+    if all(c in current.columns for c in key_cols):
+        for pos, key in enumerate(zip(*(current[c] for c in key_cols))):
+            if key in positions:
+                duplicates.add(key)
+            positions.setdefault(key, pos)
+
+    moved = header != list(base_df.columns)
+    for idx, col, row, _, value in changes:
+        key = tuple(cell_text(base_df.at[idx, k]) for k in key_cols)
+        before, mine = cell_text(base_df.at[idx, col]), cell_text(value)
+        pos = positions.get(key)
+        if pos is None or key in duplicates or col not in current.columns:
+            reason = "row not found" if pos is None else "row is ambiguous" if key in duplicates else "column removed"
+            conflicts.append({"idx": idx, "col": col, "key": key, "yours": mine, "theirs": None, "reason": reason})
+            statuses[(idx, col)] = False
+            continue
+        theirs = current.at[pos, col]
+        if same_cell(theirs, mine):
+            statuses[(idx, col)] = True  # already there, nothing to write
+        elif not same_cell(theirs, before):
+            conflicts.append({"idx": idx, "col": col, "key": key, "yours": mine, "theirs": theirs,
+                              "reason": "changed by someone else"})
+            statuses[(idx, col)] = False
+        else:
+            writes.append((idx, col, pos + 2, header.index(col) + 1, value))
+            moved |= pos + 2 != row
+
+    # Read before writing: the write-through patches the shared frame base_df may be
+    history = {
+        (idx, col): {"key": tuple(cell_text(base_df.at[idx, k]) for k in key_cols), "field": col,
+                     "old": cell_text(base_df.at[idx, col]), "new": cell_text(value)}
+        for idx, col, _, _, value in writes
+    }
+    written, error = update_cells(spreadsheet_name, worksheet_name, writes, header=header,
+                                  write_through=not moved)
+    statuses.update(written)
+    record_changes(f"{spreadsheet_name}/{worksheet_name}",
+                   [change for cell, change in history.items() if written.get(cell)],
+                   actor=actor, source=source)
+    if moved and not written:
+        reload(spreadsheet_name, worksheet_name)
+    elif conflicts and not moved:
+        # Pull the other writers' values into the cache so the editor shows the merged state
+        invalidate(spreadsheet_name, worksheet_name)
+    return statuses, error, conflicts
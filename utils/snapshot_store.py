@@ -0,0 +1,327 @@
+# utils/snapshot_store.py
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from gspread.exceptions import WorksheetNotFound
+
+from utils import metrics
+from utils.sheets_api import (
+    DATA_TTL, adopt_df, frame_version, load_sheet_df, load_sheet_dfs, peek_df, row_hashes, seed_df,
+)
+
+# Local read replica of the grade sheets, stored as uncompressed Arrow IPC files so
+# every worker process can memory-map the same pages. Each file has a JSON manifest
+# with a version stamp that is bumped on every write. The file also carries that
+# version and the per-row content hashes, so a process adopting it neither hashes
+# the rows again nor can pair the data with another write's manifest.
+SNAPSHOT_DIR = os.environ.get("GRADES_SNAPSHOT_DIR", os.path.join("data", "snapshots"))
+SYNC_INTERVAL = DATA_TTL  # seconds between background refreshes from Sheets
+
+# "local": this process reads Sheets itself and keeps its own snapshots current.
+# "attach": a sync daemon (python -m utils.sync_daemon) owns all Sheets reads and
+# appends, and this process only maps the snapshots it publishes. With the
+# snapshot directory on tmpfs (/dev/shm) every replica maps the same pages for the
+# cell data; each replica still builds its own category dictionaries, null masks,
+# indexes and derived frames, and copies a column the first time it writes to it.
+SYNC_MODE = os.environ.get("GRADES_SYNC_MODE", "local")
+ATTACHED = SYNC_MODE == "attach"
+ATTACH_CHECK = 1.0  # seconds between manifest checks for a newer snapshot
+ATTACH_TIMEOUT = 60  # seconds to wait for the daemon's first snapshot of a sheet
+ROW_HASH_COLUMN = "__row_hash"
+VERSION_KEY = b"snapshot_version"
+
+log = logging.getLogger(__name__)
+
+class SnapshotUnavailable(Exception):
+    pass
+
+_sources = {}  # key -> frame_version last written to disk
+_sync_lock = threading.Lock()
+_sync_wakeup = threading.Event()
+_sync_thread = None
+_attached = {}  # key -> (manifest version adopted, when it was last checked)
+_attach_lock = threading.Lock()
+_attach_locks = {}  # key -> lock held while that sheet's snapshot is read and adopted
+
+def snapshot_name(spreadsheet_name, worksheet_name=None, numeric=False):
+    name = f"{spreadsheet_name}__{worksheet_name or 'sheet1'}"
+    return name + "__numeric" if numeric else name
+
+def _paths(name):
+    base = os.path.join(SNAPSHOT_DIR, name)
+    return base + ".arrow", base + ".json"
+
+def control_path(*parts):
+    # Files the replicas and the sync daemon signal each other with
+    return os.path.join(SNAPSHOT_DIR, "control", *parts)
+
+def read_manifest(name):
+    _, manifest_path = _paths(name)
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _to_table(df):
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Parsed sheets can mix numbers and text in one column; store those as text
+        df = df.copy()
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].astype("string")
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+def write_snapshot(name, df, source=None, hashes=None):
+    """Publish df under name; hashes (row_hashes) are stored with it for adopt_df."""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    data_path, manifest_path = _paths(name)
+    previous = read_manifest(name) or {}
+    manifest = {
+        "version": previous.get("version", 0) + 1,
+        "synced_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "rows": len(df),
+        "source": source,
+        "row_hashes": ROW_HASH_COLUMN if hashes is not None else None,
+    }
+    # Write beside the target and rename, so readers never map a half-written file
+    table = _to_table(df)
+    if hashes is not None:
+        table = table.append_column(ROW_HASH_COLUMN, pa.array(hashes, type=pa.uint64()))
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), VERSION_KEY: str(manifest["version"]).encode()}
+    )
+    tmp_path = f"{data_path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, data_path)
+    with open(f"{manifest_path}.{os.getpid()}.tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(f"{manifest_path}.{os.getpid()}.tmp", manifest_path)
+    return manifest
+
+def read_snapshot_table(name):
+    data_path, _ = _paths(name)
+    if not os.path.exists(data_path):
+        return None
+    with pa.memory_map(data_path, "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+def _column_array(table, col):
+    column = table.column(col)
+    return column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+
+def _to_frame(table):
+    # Categorical codes and text keep pointing into the mapped file; only the
+    # category dictionaries and the grades' null masks are built in this process
+    df = table.to_pandas(split_blocks=True, types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+    for col in df.columns[df.dtypes == "Float64"]:
+        values = _column_array(table, col)
+        data = np.frombuffer(values.buffers()[1], dtype=np.float64, count=len(values), offset=values.offset * 8)
+        mask = values.is_null().to_numpy(zero_copy_only=False)
+        df[col] = pd.arrays.FloatingArray(data, mask)
+    return df
+
+def read_snapshot_frame(name):
+    """(frame, row hashes or None, version) of the published snapshot, or None.
+
+    The frame is built over the memory-mapped file without copying its data, so its
+    columns are read-only until written (utils.schema.set_cell copies a column first).
+    """
+    table = read_snapshot_table(name)
+    if table is None:
+        return None
+    version = int((table.schema.metadata or {}).get(VERSION_KEY, 0))
+    hashes = None
+    if ROW_HASH_COLUMN in table.column_names:
+        hashes = _column_array(table, ROW_HASH_COLUMN).to_numpy()
+        table = table.drop_columns([ROW_HASH_COLUMN])
+    return _to_frame(table), hashes, version
+
+def read_snapshot(name):
+    snapshot = read_snapshot_frame(name)
+    return snapshot[0] if snapshot is not None else None
+
+# --- Background sync from Sheets ---
+
+def _sync_once():
+    # Worksheets of the same spreadsheet are refreshed together
+    groups = {}
+    for key in list(_sources):
+        groups.setdefault((key[0], key[2]), []).append(key[1])
+    for (spreadsheet_name, numeric), worksheet_names in groups.items():
+        try:
+            frames = load_sheet_dfs(spreadsheet_name, worksheet_names, numeric)
+        except Exception:
+            # Sheets being down is exactly when the replica has to keep serving
+            log.exception("Snapshot sync failed for %s %s", spreadsheet_name, worksheet_names)
+            continue
+        for worksheet_name, df in frames.items():
+            key = (spreadsheet_name, worksheet_name, numeric)
+            try:
+                version = frame_version(*key)
+                if version != _sources[key]:
+                    write_snapshot(snapshot_name(*key), df, source=list(key), hashes=row_hashes(*key, df=df))
+                    _sources[key] = version
+            except Exception:
+                log.exception("Snapshot sync failed for %s", key)
+
+def _sync_loop():
+    while True:
+        _sync_once()
+        _sync_wakeup.wait(SYNC_INTERVAL)
+        _sync_wakeup.clear()
+
+def request_sync():
+    if ATTACHED:
+        # The daemon watches this file's mtime
+        os.makedirs(control_path(), exist_ok=True)
+        with open(control_path("sync.request"), "w") as f:
+            f.write(str(os.getpid()))
+    else:
+        _sync_wakeup.set()
+
+def ensure_sync_thread():
+    global _sync_thread
+    with _sync_lock:
+        if _sync_thread is None or not _sync_thread.is_alive():
+            _sync_thread = threading.Thread(target=_sync_loop, name="snapshot-sync", daemon=True)
+            _sync_thread.start()
+
+def _local_df(key):
+    # From memory or the snapshot on disk; None when neither has the frame yet
+    df = peek_df(*key)
+    if df is not None:
+        metrics.count("cache_hits")
+        return df
+    with metrics.span("read_snapshot"):
+        snapshot = read_snapshot_frame(snapshot_name(*key))
+    if snapshot is None:
+        return None
+    df, hashes, _ = snapshot
+    return seed_df(*key, df, hashes)
+
+def _want(key):
+    # Ask the daemon to publish a sheet it does not sync yet
+    path = control_path("wanted", snapshot_name(*key) + ".json")
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.{os.getpid()}.tmp", "w") as f:
+            json.dump(list(key), f)
+        os.replace(f"{path}.{os.getpid()}.tmp", path)
+        request_sync()
+
+def wanted_keys():
+    """Sheets replicas have asked the daemon for, as (spreadsheet, worksheet, numeric) keys."""
+    try:
+        names = os.listdir(control_path("wanted"))
+    except FileNotFoundError:
+        return []
+    keys = []
+    for name in names:
+        if name.endswith(".json"):
+            with open(control_path("wanted", name)) as f:
+                keys.append(tuple(json.load(f)))
+    return keys
+
+def mark_missing(key, missing=True):
+    # Published by the daemon so replicas fail like a local WorksheetNotFound would
+    path = control_path("missing", snapshot_name(*key))
+    if missing:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "w").close()
+    elif os.path.exists(path):
+        os.remove(path)
+
+def _await_manifest(key, name):
+    # The daemon's first snapshot of a sheet; waited for without holding any lock
+    deadline = time.monotonic() + ATTACH_TIMEOUT
+    manifest = read_manifest(name)
+    while manifest is None:
+        if os.path.exists(control_path("missing", name)):
+            raise WorksheetNotFound(key[1])
+        _want(key)
+        if time.monotonic() > deadline:
+            raise SnapshotUnavailable(f"The sync daemon has not published {name} yet.")
+        time.sleep(0.2)
+        manifest = read_manifest(name)
+    return manifest
+
+def _attach(key):
+    """Attach mode: the daemon's latest snapshot of key, re-read when its manifest moves."""
+    name = snapshot_name(*key)
+    df, seen = peek_df(*key), _attached.get(key)
+    if df is not None and seen is not None and time.monotonic() - seen[1] < ATTACH_CHECK:
+        metrics.count("cache_hits")
+        return df
+    manifest = read_manifest(name) if df is not None else _await_manifest(key, name)
+    if manifest is None:
+        return df  # the daemon is rewriting its directory; keep serving what we have
+    with _attach_lock:
+        lock = _attach_locks.setdefault(key, threading.Lock())
+    # One session per sheet reads the new snapshot; sessions on other sheets go on
+    with lock:
+        df, seen = peek_df(*key), _attached.get(key)
+        if df is None or seen is None or manifest["version"] != seen[0]:
+            metrics.count("cache_misses")
+            with metrics.span("read_snapshot"):
+                snapshot = read_snapshot_frame(name)
+            if snapshot is None:
+                raise SnapshotUnavailable(f"The snapshot of {name} disappeared while it was read.")
+            df, hashes, version = snapshot
+            # The file's own version: the manifest may already describe a newer write
+            version = version or manifest["version"]
+            df = adopt_df(*key, df, hashes, version)
+        else:
+            metrics.count("cache_hits")
+            version = seen[0]
+        _attached[key] = (version, time.monotonic())
+        return df
+
+def _track(key):
+    with _sync_lock:
+        if key not in _sources:
+            # A frame seeded from disk is already on disk; one fetched from Sheets is not
+            _sources[key] = frame_version(*key) if read_manifest(snapshot_name(*key)) else None
+
+def load_replica_df(spreadsheet_name, worksheet_name=None, numeric=False):
+    """Grade frame served from memory or the local snapshot; Sheets is only read in the background.
+
+    Only the very first start without any snapshot on disk waits for Sheets. In attach
+    mode the frame is the sync daemon's latest snapshot and Sheets is never read here.
+    """
+    key = (spreadsheet_name, worksheet_name, numeric)
+    if ATTACHED:
+        return _attach(key)
+    df = _local_df(key)
+    if df is None:
+        df = load_sheet_df(*key)
+    _track(key)
+    ensure_sync_thread()
+    return df
+
+def load_replica_dfs(spreadsheet_name, worksheet_names, numeric=False):
+    """load_replica_df for several worksheets of one spreadsheet: {worksheet_name: frame}.
+
+    Worksheets with no local copy are fetched from Sheets together (load_sheet_dfs),
+    so a cold start costs about one round trip however many sheets a page reads.
+    """
+    if ATTACHED:
+        return {name: _attach((spreadsheet_name, name, numeric)) for name in worksheet_names}
+    frames = {name: _local_df((spreadsheet_name, name, numeric)) for name in worksheet_names}
+    missing = [name for name, df in frames.items() if df is None]
+    if missing:
+        frames.update(load_sheet_dfs(spreadsheet_name, missing, numeric))
+    for name in worksheet_names:
+        _track((spreadsheet_name, name, numeric))
+    ensure_sync_thread()
+    return frames
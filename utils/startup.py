@@ -0,0 +1,32 @@
+# utils/startup.py
+
+import logging
+import threading
+
+from utils import metrics
+
+# Work that would otherwise make the first visitor wait (reading the local replica,
+# building lookup indexes, importing slow modules) is started in a background
+# thread by the first page run of the process, while that page draws its shell.
+log = logging.getLogger(__name__)
+
+_started = set()
+_started_lock = threading.Lock()
+
+def warm_in_background(name, fn, *args):
+    """Run fn(*args) once per process in a daemon thread; False if it already ran."""
+    with _started_lock:
+        if name in _started:
+            return False
+        _started.add(name)
+
+    def run():
+        try:
+            with metrics.span(f"warm.{name}"):
+                fn(*args)
+        except Exception:
+            # Warming is only an optimization; the page loads the data itself if needed
+            log.exception("Cache warm-up %r failed", name)
+
+    threading.Thread(target=run, name=f"warm-{name}", daemon=True).start()
+    return True
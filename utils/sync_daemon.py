@@ -0,0 +1,80 @@
+# utils/sync_daemon.py
+
+import logging
+import os
+import sys
+import time
+
+from gspread.exceptions import WorksheetNotFound
+
+from utils import sheets_api, snapshot_store, write_queue
+
+# The one process that talks to Google Sheets when the app runs as several
+# Streamlit replicas (see start.sh). It keeps the snapshots of every sheet the
+# replicas read current, publishes them to the shared snapshot directory and
+# sends the rows they queue for appending. Run with: python -m utils.sync_daemon
+SHEETS = [
+    ("Grades3", "Sheet2", False),
+    ("Grades3", "Sheet7", False),
+    ("Grades3", "Students", False),
+    ("Grades2", None, True),
+]
+POLL_INTERVAL = 0.5  # seconds between checks for replica requests
+RETRY_INTERVAL = 60  # seconds before a sheet that failed to load is tried again
+
+log = logging.getLogger("sync_daemon")
+
+def _publish(key):
+    # Seeds from the last snapshot when there is one, then the sync thread keeps it current
+    try:
+        snapshot_store.load_replica_df(*key)
+    except WorksheetNotFound:
+        log.warning("Worksheet %s does not exist", key)
+        snapshot_store.mark_missing(key)
+        return False
+    except Exception:
+        log.exception("Could not load %s", key)
+        return False
+    snapshot_store.mark_missing(key, False)
+    log.info("Publishing %s", key)
+    return True
+
+def run():
+    if snapshot_store.ATTACHED:
+        sys.exit("The sync daemon reads Sheets itself; unset GRADES_SYNC_MODE=attach for it.")
+    os.makedirs(snapshot_store.SNAPSHOT_DIR, exist_ok=True)
+    write_queue.ensure_flusher()
+    published, failed = set(), {}
+    request_path = snapshot_store.control_path("sync.request")
+    last_request, queued = None, 0
+    while True:
+        now = time.monotonic()
+        for key in dict.fromkeys(SHEETS + snapshot_store.wanted_keys()):
+            if key in published or now - failed.get(key, -RETRY_INTERVAL) < RETRY_INTERVAL:
+                continue
+            if _publish(key):
+                published.add(key)
+                failed.pop(key, None)
+                snapshot_store.request_sync()  # write the first snapshot straight away
+            else:
+                failed[key] = now
+        try:
+            requested = os.stat(request_path).st_mtime_ns
+        except FileNotFoundError:
+            requested = None
+        if requested != last_request:
+            # A replica saved grades: refresh from Sheets now instead of at the next interval
+            last_request = requested
+            for spreadsheet_name, worksheet_name, _ in published:
+                sheets_api.invalidate(spreadsheet_name, worksheet_name)
+            snapshot_store.request_sync()
+        pending = write_queue.pending_count()
+        if pending > queued:
+            # New rows from a replica; failed ones are retried on the flusher's own schedule
+            write_queue.request_flush()
+        queued = pending
+        time.sleep(POLL_INTERVAL)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    run()
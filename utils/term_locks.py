@@ -0,0 +1,135 @@
+# utils/term_locks.py
+
+import json
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+from cachetools import LRUCache
+
+from utils.analytics import group_summary, grade_bands, numeric_grades, student_summary, term_column
+
+# Terms an admin has finalized. Locking a term freezes its rows together with the
+# per-student and per-subject summaries as Parquet files that never change while
+# the lock holds, so reads of a finished term (report cards, rankings, history)
+# come from those files instead of the live sheet. locks.json lists the locked
+# terms; editors and save paths refuse changes to rows of a locked term.
+LOCKS_DIR = os.path.join("data", "term_locks")
+LOCKS_FILE = os.path.join(LOCKS_DIR, "locks.json")
+ARTIFACTS = ("rows", "students", "subjects")
+
+class TermLockedError(Exception):
+    pass
+
+_state = {"mtime": None, "locks": {}}
+_state_lock = threading.Lock()
+_frozen = LRUCache(maxsize=32)  # (term, locked_at, artifact) -> DataFrame
+_frozen_lock = threading.Lock()
+
+def _slug(term):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", str(term)).strip("_") or "term"
+
+def _artifact_path(term, artifact):
+    return os.path.join(LOCKS_DIR, f"{_slug(term)}.{artifact}.parquet")
+
+def _write_atomic(path, write):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    root, ext = os.path.splitext(path)
+    tmp = f"{root}.{os.getpid()}.tmp{ext}"
+    write(tmp)
+    os.replace(tmp, path)
+
+def locked_terms():
+    """{term: {"locked_at", "locked_by", "rows"}}; re-read only when the file changes."""
+    try:
+        mtime = os.stat(LOCKS_FILE).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    with _state_lock:
+        if mtime != _state["mtime"]:
+            if mtime is None:
+                locks = {}
+            else:
+                with open(LOCKS_FILE) as f:
+                    locks = json.load(f)
+            _state.update(mtime=mtime, locks=locks)
+        return dict(_state["locks"])
+
+def is_locked(term):
+    return str(term) in locked_terms()
+
+def check_unlocked(term):
+    if term is not None and is_locked(term):
+        raise TermLockedError(f"{term} is locked; its grades can no longer be changed.")
+
+def locked_mask(df):
+    """Boolean Series: rows of df that belong to a locked term."""
+    term = term_column(df)
+    locks = locked_terms()
+    if term is None or not locks:
+        return pd.Series(False, index=df.index)
+    return df[term].astype(str).isin(locks)
+
+def _save_locks(locks):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(locks, f, indent=2)
+    _write_atomic(LOCKS_FILE, write)
+
+def term_summaries(rows):
+    frame = rows.assign(_grade=numeric_grades(rows)).dropna(subset=["_grade"])
+    frame["_band"] = grade_bands(frame["_grade"])
+    subjects = group_summary(frame, ["Subject"]) if "Subject" in frame.columns else pd.DataFrame()
+    return {"students": student_summary(rows), "subjects": subjects}
+
+def lock_term(df, term, locked_by=None):
+    """Freeze `term`'s rows and summaries, then mark it locked. Returns the lock entry."""
+    term_col = term_column(df)
+    rows = df[df[term_col].astype(str) == str(term)].reset_index(names="_pos")
+    artifacts = {"rows": rows, **term_summaries(rows)}
+    # Artifacts first: a term is only listed as locked once its files are complete
+    for name, frame in artifacts.items():
+        _write_atomic(_artifact_path(term, name), lambda tmp, frame=frame: frame.to_parquet(tmp, index=False))
+    with _state_lock:
+        _state["mtime"] = None  # force a re-read below
+    locks = locked_terms()
+    locks[str(term)] = {"locked_at": time.time(), "locked_by": locked_by, "rows": len(rows)}
+    _save_locks(locks)
+    return locks[str(term)]
+
+def unlock_term(term):
+    locks = locked_terms()
+    if locks.pop(str(term), None) is None:
+        return False
+    _save_locks(locks)
+    for name in ARTIFACTS:
+        try:
+            os.remove(_artifact_path(term, name))
+        except FileNotFoundError:
+            pass
+    return True
+
+def frozen(term, artifact="rows"):
+    """A locked term's frozen rows, students or subjects frame (None if not locked)."""
+    info = locked_terms().get(str(term))
+    if info is None:
+        return None
+    key = (str(term), info["locked_at"], artifact)
+    with _frozen_lock:
+        df = _frozen.get(key)
+    if df is None:
+        # Immutable while the lock holds, so it is read from disk once per process
+        df = pd.read_parquet(_artifact_path(term, artifact))
+        with _frozen_lock:
+            _frozen[key] = df
+    return df
+
+def term_rows(df, term):
+    """Rows of one term: the frozen copy when it is locked, otherwise the live slice."""
+    rows = frozen(term, "rows")
+    if rows is not None:
+        return rows.drop(columns="_pos")
+    term_col = term_column(df)
+    return df[df[term_col].astype(str) == str(term)]
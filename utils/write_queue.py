@@ -0,0 +1,208 @@
+# utils/write_queue.py
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from gspread.exceptions import APIError, SpreadsheetNotFound, WorksheetNotFound
+from gspread.utils import ValueInputOption
+
+from utils.grade_history import record_changes
+from utils.sheets_api import get_worksheet, invalidate, with_backoff
+from utils.snapshot_store import ATTACHED
+
+# Row appends are queued here and sent by one background thread as a single
+# append_rows call per worksheet. The queue lives in SQLite on local disk, so
+# entries that were accepted survive a restart and are sent afterwards. Replicas in
+# attach mode only queue rows; the sync daemon's flusher sends them. A row whose
+# append fails is retried with exponential backoff; after MAX_ATTEMPTS, or straight
+# away when the error cannot go away by itself (a missing worksheet), it is marked
+# 'failed' and no longer claimed, so it cannot crowd out rows that can be sent.
+# A row may carry the grade-history entries it makes; they are logged once the row
+# is committed, never for a row that is still queued or has failed.
+QUEUE_PATH = os.path.join("data", "write_queue.db")
+FLUSH_INTERVAL = 0.3  # seconds to wait for more rows before sending
+BATCH_SIZE = 50  # send straight away once this many rows are pending
+MAX_BATCH = 500  # rows per append_rows call
+CLAIM_TIMEOUT = 120  # seconds before rows claimed by a dead process are retried
+KEEP_COMMITTED = 86400  # seconds committed rows stay visible to entry_status
+RETRY_BASE = 5  # seconds before the first retry of a failed row, doubled per attempt
+RETRY_MAX = 600  # longest wait between retries
+MAX_ATTEMPTS = 8
+PERMANENT_CODES = {400, 403, 404}  # Sheets answers that a retry will not change
+
+log = logging.getLogger(__name__)
+
+_local = threading.local()
+_wakeup = threading.Event()
+_flusher_lock = threading.Lock()
+_flusher = None
+
+def _conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(QUEUE_PATH) or ".", exist_ok=True)
+        conn = _local.conn = sqlite3.connect(QUEUE_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS appends ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, spreadsheet TEXT, worksheet TEXT, row TEXT,"
+                " status TEXT DEFAULT 'pending', claimed_at REAL, committed_at REAL, error TEXT)"
+            )
+            columns = {r[1] for r in conn.execute("PRAGMA table_info(appends)")}
+            if "attempts" not in columns:
+                # Queues created before retries were tracked per row
+                conn.execute("ALTER TABLE appends ADD COLUMN attempts INTEGER DEFAULT 0")
+                conn.execute("ALTER TABLE appends ADD COLUMN next_attempt REAL DEFAULT 0")
+            if "history" not in columns:
+                conn.execute("ALTER TABLE appends ADD COLUMN history TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_status ON appends (status, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_due ON appends (status, next_attempt)")
+    return conn
+
+def enqueue_row(spreadsheet_name, worksheet_name, row, history=None):
+    """Durably queue one row for appending; returns the entry id to poll with entry_status.
+
+    history is {"book", "changes", "actor", "source"} as taken by
+    grade_history.record_changes, logged when the row reaches the sheet.
+    """
+    with _conn() as conn:
+        cur = conn.execute(
+            "INSERT INTO appends (spreadsheet, worksheet, row, history) VALUES (?, ?, ?, ?)",
+            (spreadsheet_name, worksheet_name, json.dumps(row, default=str),
+             json.dumps(history, default=str) if history else None),
+        )
+    ensure_flusher()
+    request_flush()
+    return cur.lastrowid
+
+def entry_status(ids):
+    """{id: (status, error)} where status is 'pending', 'sending', 'committed' or 'failed'."""
+    if not ids:
+        return {}
+    rows = _conn().execute(
+        f"SELECT id, status, error FROM appends WHERE id IN ({', '.join('?' * len(ids))})", list(ids)
+    ).fetchall()
+    return {i: (status, error) for i, status, error in rows}
+
+def pending_count():
+    return _conn().execute("SELECT COUNT(*) FROM appends WHERE status IN ('pending', 'sending')").fetchone()[0]
+
+def next_due():
+    """When the earliest pending row may be sent (epoch seconds); None if nothing is pending."""
+    return _conn().execute("SELECT MIN(next_attempt) FROM appends WHERE status = 'pending'").fetchone()[0]
+
+def _claim():
+    conn = _conn()
+    now = time.time()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        # Rows left in 'sending' by a crashed process go out again (at-least-once)
+        conn.execute(
+            "UPDATE appends SET status = 'pending' WHERE status = 'sending' AND claimed_at < ?",
+            (now - CLAIM_TIMEOUT,),
+        )
+        conn.execute("DELETE FROM appends WHERE status = 'committed' AND committed_at < ?", (now - KEEP_COMMITTED,))
+        # Rows still backing off after a failed attempt wait for their turn
+        rows = conn.execute(
+            "SELECT id, spreadsheet, worksheet, row, history FROM appends"
+            " WHERE status = 'pending' AND next_attempt <= ? ORDER BY id LIMIT ?",
+            (now, MAX_BATCH),
+        ).fetchall()
+        conn.executemany(
+            "UPDATE appends SET status = 'sending', claimed_at = ? WHERE id = ?", [(now, r[0]) for r in rows]
+        )
+    return rows
+
+def _permanent(error):
+    if isinstance(error, (WorksheetNotFound, SpreadsheetNotFound)):
+        return True
+    return isinstance(error, APIError) and error.code in PERMANENT_CODES
+
+def _fail(ids, error):
+    # Back off per row: 5 s, 10 s, 20 s ... up to RETRY_MAX, then give up
+    now, permanent = time.time(), _permanent(error)
+    with _conn() as conn:
+        conn.executemany(
+            "UPDATE appends SET attempts = attempts + 1, error = ?,"
+            " status = CASE WHEN ? OR attempts + 1 >= ? THEN 'failed' ELSE 'pending' END,"
+            " next_attempt = ? + MIN(?, ? * (1 << attempts)) WHERE id = ?",
+            [(str(error), permanent, MAX_ATTEMPTS, now, RETRY_MAX, RETRY_BASE, i) for i in ids],
+        )
+
+def flush():
+    """Send everything pending; one append_rows call per worksheet. Returns rows committed."""
+    rows = _claim()
+    batches = {}
+    for entry_id, spreadsheet_name, worksheet_name, row, history in rows:
+        batches.setdefault((spreadsheet_name, worksheet_name), []).append(
+            (entry_id, json.loads(row), json.loads(history) if history else None)
+        )
+    committed = 0
+    for (spreadsheet_name, worksheet_name), entries in batches.items():
+        ids = [i for i, _, _ in entries]
+        try:
+            worksheet = get_worksheet(spreadsheet_name, worksheet_name)
+            with_backoff(worksheet.append_rows, [r for _, r, _ in entries],
+                         value_input_option=ValueInputOption.user_entered)
+        except Exception as e:
+            # Quota, network or auth trouble: the rows back off and are tried again
+            _fail(ids, e)
+            log.warning("Append to %s/%s failed: %s", spreadsheet_name, worksheet_name, e)
+            continue
+        with _conn() as conn:
+            conn.executemany(
+                "UPDATE appends SET status = 'committed', committed_at = ?, error = NULL WHERE id = ?",
+                [(time.time(), i) for i in ids],
+            )
+        invalidate(spreadsheet_name, worksheet_name)
+        committed += len(entries)
+        _record_history([history for _, _, history in entries if history])
+    return committed
+
+def _record_history(histories):
+    # One log write per book and writer for the whole batch. The rows are in the
+    # sheet already, so a log failure must not send them again
+    groups = {}
+    for history in histories:
+        group = (history["book"], history.get("actor"), history.get("source"))
+        groups.setdefault(group, []).extend(history["changes"])
+    for (book, actor, source), changes in groups.items():
+        try:
+            record_changes(book, changes, actor=actor, source=source)
+        except Exception:
+            log.exception("Could not log grade history for %s", book)
+
+def _flush_loop():
+    while True:
+        # Sleep until woken by a new row or until the next failed row is due again
+        due = next_due()
+        _wakeup.wait(timeout=CLAIM_TIMEOUT if due is None else min(CLAIM_TIMEOUT, max(due - time.time(), 0)))
+        _wakeup.clear()
+        # Give concurrent submissions a moment to join the same batch
+        deadline = time.time() + FLUSH_INTERVAL
+        while time.time() < deadline and pending_count() < BATCH_SIZE:
+            time.sleep(0.05)
+        try:
+            while flush():
+                pass
+        except Exception:
+            log.exception("Write queue flush failed")
+            time.sleep(FLUSH_INTERVAL)
+
+def request_flush():
+    _wakeup.set()
+
+def ensure_flusher():
+    global _flusher
+    if ATTACHED:
+        return
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flush_loop, name="write-queue", daemon=True)
+            _flusher.start()
+            _wakeup.set()  # send anything queued before the last shutdown